@@ -0,0 +1,52 @@
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+from ophyd.hkl.calc import CalcE6C
+from ophyd.hkl.util import Lattice
+from ophyd.hkl import parity
+
+
+def setup_e6c():
+    '''E6C set up as in the SPEC session of hkl_data/spec_session.txt'''
+    calc = CalcE6C(engine='hkl')
+    calc.wavelength = 1.33  # nm
+
+    for name, value in (('phi', 0.0), ('chi', -90.0), ('mu', 0.0)):
+        axis = calc[name]
+        axis.limits = (value, value)
+        axis.value = value
+        axis.fit = False
+
+    lattice = Lattice(a=3.78, b=3.78, c=13.28, alpha=90, beta=90, gamma=90)
+    sample = calc.new_sample('sample0', lattice=lattice)
+    r1 = sample.add_reflection(0, 0, 2,
+                               position=calc.Position(mu=0.0, omega=71.04,
+                                                      chi=-90.0, phi=0.0,
+                                                      gamma=-1.65,
+                                                      delta=136.7))
+    r2 = sample.add_reflection(1, 0, 1,
+                               position=calc.Position(mu=0.0, omega=158.22,
+                                                      chi=-90.0, phi=0.0,
+                                                      gamma=1.7, delta=164.94))
+    sample.compute_UB(r1, r2)
+    return calc
+
+
+def test():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'hkl_data')
+    reference = parity.load_reference(path, axis_map=parity.spec_sixc_axes)
+
+    calc = setup_e6c()
+    print('UB (SPEC, 1/angstrom):\n', reference.UB)
+    print('UB (hkl, 1/nm):\n', np.array(calc.sample.UB))
+
+    results = parity.check_parity(calc, reference, repeat=3)
+    print(parity.format_results(results))
+
+
+if __name__ == '__main__':
+    test()
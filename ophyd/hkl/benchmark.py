@@ -0,0 +1,225 @@
+'''
+:mod:`ophyd.hkl.benchmark` - Calculation benchmarks
+===================================================
+
+.. module:: ophyd.hkl.benchmark
+   :synopsis: Timing of calculations for all diffractometer types, engines
+       and modes, with JSON output for trend tracking
+
+Run with ``python -m ophyd.hkl.benchmark [-o results.json]``.
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+
+import numpy as np
+
+from .. import __version__
+from . import util
+from .calc import CalcRecip
+from .util import Lattice
+
+logger = logging.getLogger(__name__)
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def _stats(times, **info):
+    '''Summary record of a list of timings, in seconds'''
+    times = np.asarray(times, dtype=float)
+    record = dict(info)
+    record['num'] = len(times)
+    if len(times):
+        record['mean'] = float(times.mean())
+        for pct, value in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+            record['p{}'.format(pct)] = float(value)
+    return record
+
+
+def _timed(fcn, *args):
+    t0 = time.perf_counter()
+    result = fcn(*args)
+    return result, time.perf_counter() - t0
+
+
+def _random_positions(calc, num_points, rs, span=60.0):
+    '''Random physical positions within the axis limits, in user units'''
+    positions = []
+    for name in calc.physical_axis_names:
+        low, high = calc[name].limits
+        low, high = max(low, -span), min(high, span)
+        if low > high:
+            low = high
+        positions.append(rs.uniform(low, high, num_points))
+    return np.column_stack(positions)
+
+
+def bench_construction(dtype, repeat=10):
+    '''Time the construction of a calculator'''
+    times = [_timed(CalcRecip, dtype)[1] for i in range(repeat)]
+    return _stats(times, dtype=dtype, benchmark='construct')
+
+
+def bench_engine_mode(calc, engine, mode, num_points=100, seed=0):
+    '''Time inverse and forward calculations with one engine and mode
+
+    Forward targets are the inverse of random physical positions, so that
+    they are reachable.
+    '''
+    calc.engine.mode = mode
+    rs = np.random.RandomState(seed)
+    real = _random_positions(calc, num_points, rs)
+    info = dict(dtype=calc._dtype, engine=engine, mode=mode)
+
+    inverse_times = []
+    pseudo = []
+    for pos in real.tolist():
+        try:
+            result, elapsed = _timed(calc.inverse, pos)
+        except Exception as ex:
+            logger.debug('Inverse failed (%s)', ex)
+            continue
+        inverse_times.append(elapsed)
+        pseudo.append(list(result))
+
+    forward_times = []
+    num_solutions = []
+    failed = 0
+    for pos in pseudo:
+        try:
+            solutions, elapsed = _timed(calc.forward, pos)
+        except Exception as ex:
+            logger.debug('Forward failed (%s)', ex)
+            failed += 1
+            continue
+        forward_times.append(elapsed)
+        num_solutions.append(len(solutions))
+
+    records = [_stats(inverse_times, benchmark='inverse',
+                      failed=num_points - len(inverse_times), **info),
+               _stats(forward_times, benchmark='forward', failed=failed,
+                      **info)]
+    if num_solutions:
+        records[-1]['solutions_mean'] = float(np.mean(num_solutions))
+        records[-1]['solutions_max'] = int(np.max(num_solutions))
+    return records
+
+
+def bench_samples(dtype, repeat=100):
+    '''Time engine list initialization, sample switching and UB computation'''
+    calc = CalcRecip(dtype)
+    lattice = Lattice(a=3.78, b=3.78, c=13.28, alpha=90, beta=90, gamma=90)
+    other = calc.new_sample('other', lattice=lattice, select=False)
+    main = calc.sample
+
+    def init():
+        calc._engine_list.init(calc._geometry, calc._detector,
+                               calc.sample.hkl_sample)
+
+    init_times = [_timed(init)[1] for i in range(repeat)]
+
+    switch_times = []
+    for i in range(repeat):
+        switch_times.append(_timed(setattr, calc, 'sample', other)[1])
+        switch_times.append(_timed(setattr, calc, 'sample', main)[1])
+
+    rs = np.random.RandomState(0)
+    ub_times = []
+    for i in range(repeat):
+        positions = _random_positions(calc, 2, rs)
+        main.clear_reflections()
+        r1 = main.add_reflection(0, 0, 1, position=positions[0].tolist())
+        r2 = main.add_reflection(1, 0, 0, position=positions[1].tolist())
+        try:
+            ub_times.append(_timed(main.compute_UB, r1, r2)[1])
+        except Exception as ex:
+            logger.debug('UB computation failed (%s)', ex)
+
+    return [_stats(init_times, dtype=dtype, benchmark='engine_list_init'),
+            _stats(switch_times, dtype=dtype, benchmark='sample_switch'),
+            _stats(ub_times, dtype=dtype, benchmark='compute_UB')]
+
+
+def run_benchmarks(dtypes=None, num_points=100, repeat=10, seed=0):
+    '''Run all benchmarks
+
+    Parameters
+    ----------
+    dtypes : sequence of str, optional
+        Diffractometer types (defaults to all of `util.diffractometer_types`)
+    num_points : int, optional
+        Number of positions per engine and mode
+    repeat : int, optional
+        Number of repetitions of the construction and sample benchmarks
+    seed : int, optional
+        Random seed for the positions
+
+    Returns
+    -------
+    dict
+        JSON-serializable results, with version and platform information
+    '''
+    if dtypes is None:
+        dtypes = util.diffractometer_types
+
+    records = []
+    for dtype in dtypes:
+        logger.info('Benchmarking %s', dtype)
+        records.append(bench_construction(dtype, repeat=repeat))
+        records.extend(bench_samples(dtype, repeat=repeat))
+
+        engines = sorted(CalcRecip(dtype).engines)
+        for engine in engines:
+            calc = CalcRecip(dtype, engine=engine)
+            for mode in calc.engine.modes:
+                try:
+                    records.extend(bench_engine_mode(calc, engine, mode,
+                                                     num_points=num_points,
+                                                     seed=seed))
+                except Exception as ex:
+                    logger.warning('%s %s %s failed: %s', dtype, engine,
+                                   mode, ex)
+                    records.append(dict(dtype=dtype, engine=engine,
+                                        mode=mode, benchmark='error',
+                                        error=str(ex)))
+
+    return {'ophyd_version': __version__,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'num_points': num_points,
+            'results': records,
+            }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark hkl calculations')
+    parser.add_argument('-o', '--output', help='JSON output file (default: '
+                        'standard output)')
+    parser.add_argument('-t', '--type', action='append', dest='dtypes',
+                        help='Diffractometer type (may be repeated; default: '
+                        'all)')
+    parser.add_argument('-n', '--num-points', type=int, default=100,
+                        help='Positions per engine and mode')
+    parser.add_argument('-r', '--repeat', type=int, default=10,
+                        help='Repetitions of the other benchmarks')
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(dtypes=args.dtypes, num_points=args.num_points,
+                             repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+'''
+:mod:`ophyd.hkl.cache` - Calculation caches
+===========================================
+
+.. module:: ophyd.hkl.cache
+   :synopsis: Caching of reciprocal space calculation results
+'''
+
+import logging
+from collections import (OrderedDict, namedtuple)
+from threading import RLock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class ForwardCache(object):
+    '''Bounded least-recently-used cache of forward calculation results
+
+    Entries are keyed on the pseudo position, quantized to `resolution`, and
+    optionally on the real position the calculation starts from, quantized to
+    `origin_resolution`. The hkl library seeds its solvers with the current
+    real position and orders the solutions by distance to it, so the same
+    pseudo position reached from elsewhere may give different results.
+
+    The cache holds results for a single calculation context at a time: when
+    looked up with a different context fingerprint (any hashable summary of
+    the calculation state, such as `CalcRecip.state_version` with the
+    wavelength), all entries are dropped.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of cached positions
+    resolution : float, optional
+        Pseudo positions closer than this are considered equal
+    origin_resolution : float, optional
+        Starting real positions closer than this are considered equal
+    '''
+    def __init__(self, maxsize=128, resolution=1e-9, origin_resolution=1e-4):
+        if maxsize <= 0:
+            raise ValueError('Cache size must be positive')
+
+        self.maxsize = int(maxsize)
+        self.resolution = float(resolution)
+        self.origin_resolution = float(origin_resolution)
+        self._cache = OrderedDict()
+        self._fingerprint = None
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _quantize(values, resolution):
+        scaled = np.round(np.asarray(values, dtype=float) / resolution)
+        return tuple(scaled.astype(np.int64).tolist())
+
+    def _key(self, position, origin):
+        key = self._quantize(position, self.resolution)
+        if origin is None:
+            return key
+        return (key, self._quantize(origin, self.origin_resolution))
+
+    def _check_context(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._cache:
+                logger.debug('Calculation context changed; dropping %d '
+                             'cached results', len(self._cache))
+            self._cache.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, fingerprint, position, origin=None):
+        '''Get a cached result, or None if not cached
+
+        Parameters
+        ----------
+        fingerprint : hashable
+            The calculation context fingerprint
+        position : sequence of float
+            The pseudo position
+        origin : sequence of float, optional
+            The real position the calculation starts from
+        '''
+        key = self._key(position, origin)
+        with self._lock:
+            self._check_context(fingerprint)
+            try:
+                result = self._cache[key]
+            except KeyError:
+                self._misses += 1
+                return None
+
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, fingerprint, position, result, origin=None):
+        '''Cache a result
+
+        Parameters
+        ----------
+        fingerprint : hashable
+            The calculation context fingerprint
+        position : sequence of float
+            The pseudo position
+        result : object
+            The forward calculation result. It should not be modified after
+            caching.
+        origin : sequence of float, optional
+            The real position the calculation starts from
+        '''
+        key = self._key(position, origin)
+        with self._lock:
+            self._check_context(fingerprint)
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        '''Clear all cached results and reset the counters'''
+        with self._lock:
+            self._cache.clear()
+            self._fingerprint = None
+            self._hits = 0
+            self._misses = 0
+
+    def info(self):
+        '''Cache statistics'''
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize,
+                             len(self._cache))
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               ', '.join('{}={!r}'.format(k, v) for k, v in
+                                         self.info()._asdict().items()))
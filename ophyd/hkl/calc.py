@@ -1,5 +1,5 @@
 import logging
-from collections import (OrderedDict, namedtuple)
+from collections import OrderedDict
 from threading import RLock
 
 import numpy as np
@@ -7,8 +7,11 @@ import numpy as np
 from .engine import (Engine, Parameter)
 from .sample import HklSample
 from . import util
-from .util import hkl_module
-from .context import UsingEngine
+from .util import (hkl_module, GLib)
+from .context import (UsingEngine, TemporaryGeometry)
+from .cache import ForwardCache
+from .geometry import NumpyInverse
+from . import paths
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,7 @@ class CalcRecip(object):
                  degrees=True, units='user',
                  lock_engine=False):
 
+        self._dtype = dtype
         self._engine = None  # set below with property
         self._detector = util.new_detector()
         self._degrees = bool(degrees)
@@ -31,15 +35,25 @@ class CalcRecip(object):
         self._lock_engine = bool(lock_engine)
         self._lock = RLock()
         self._axis_name_map = None
+        self._forward_cache = None
+        self._numpy_inverse = None
+        self._engines = None
+        self._engine_lists = {}
+        self._engine_context = None
+        self._state_version = 0
+        self._clear_axis_cache()
 
         try:
-            self._factory = hkl_module.factories()[dtype]
+            self._factory = util.factories()[dtype]
         except KeyError:
             types = ', '.join(util.diffractometer_types)
             raise ValueError('Invalid diffractometer type {!r}; choose from: {}'
                              ''.format(dtype, types))
 
-        self._geometry = self._factory.create_new_geometry()
+        self._geometry = util.new_geometry(dtype)
+        # the wavelength as last set, unaffected by temporary changes made
+        # during calculations
+        self._wavelength = self._geometry.wavelength_get(self._units)
         self._engine_list = self._factory.create_new_engine_list()
 
         if sample is not None:
@@ -52,13 +66,23 @@ class CalcRecip(object):
 
         self.engine = engine
 
+    def _clear_axis_cache(self):
+        '''Clear cached axis names and classes
+
+        Required when the geometry is replaced or the axis names are re-mapped
+        '''
+        self._physical_names = None
+        self._axis_lookup = None
+        self._position_class = None
+
     @property
     def Position(self):
         '''Dynamically-generated physical motor position class'''
-        # I know, I know, could be done more cleanly...
-        name = 'Pos{}'.format(self.__class__.__name__)
-        return util.get_position_tuple(self.physical_axis_names,
-                                       class_name=name)
+        if self._position_class is None:
+            name = 'Pos{}'.format(self.__class__.__name__)
+            self._position_class = util.get_position_tuple(
+                self.physical_axis_names, class_name=name)
+        return self._position_class
 
     @property
     def wavelength(self):
@@ -69,6 +93,7 @@ class CalcRecip(object):
     @wavelength.setter
     def wavelength(self, wavelength):
         self._geometry.wavelength_set(wavelength, self._units)
+        self._wavelength = wavelength
 
     @property
     def energy(self):
@@ -100,13 +125,13 @@ class CalcRecip(object):
         if isinstance(engine, hkl_module.Engine):
             self._engine = engine
         else:
-            engines = self.engines
             try:
-                self._engine = engines[engine]
+                self._engine = self._get_engines()[engine]
             except KeyError:
                 raise ValueError('Unknown engine name or type')
 
         self._re_init()
+        self._state_changed()
 
     def _get_sample(self, name):
         if isinstance(name, hkl_module.Sample):
@@ -146,6 +171,7 @@ class CalcRecip(object):
 
         self._sample = sample
         self._re_init()
+        self._state_changed()
 
     def add_sample(self, sample, select=True):
         '''Add an HklSample
@@ -172,6 +198,7 @@ class CalcRecip(object):
         if select:
             self._sample = sample
             self._re_init()
+            self._state_changed()
 
         return sample
 
@@ -201,14 +228,66 @@ class CalcRecip(object):
         if self._geometry is None or self._detector is None or self._sample is None:
             raise ValueError('Not all parameters set (geometry, detector, sample)')
             # pass
-        else:
+
+        context = self._select_engine_list(self._sample)
+        version = self._sample.version
+        if context.version != version:
             self._engine_list.init(self._geometry, self._detector,
                                    self._sample.hkl_sample)
+            context.version = version
+
+    def _select_engine_list(self, sample):
+        '''Switch to the engine list dedicated to a sample
+
+        Each sample keeps its own engine list, initialized against the shared
+        geometry and detector, so that switching samples only requires
+        re-initialization if the sample changed in the meantime. The mode and
+        parameters of the current engine carry over to the new list.
+        '''
+        context = self._engine_lists.get(id(sample))
+        if context is None:
+            if self._engine_context is None:
+                # the first sample adopts the engine list created on init
+                context = _EngineListContext(self._engine_list)
+                context.engines = self._engines
+            else:
+                engine_list = self._factory.create_new_engine_list()
+                context = _EngineListContext(engine_list)
+            self._engine_lists[id(sample)] = context
+
+        if context is self._engine_context:
+            return context
+
+        old_engine = self._engine
+        self._engine_context = context
+        self._engine_list = context.engine_list
+        self._engines = context.engines
+
+        if isinstance(old_engine, Engine):
+            engine = self._get_engines()[old_engine.name]
+            if engine is not old_engine:
+                old, new = old_engine.engine, engine.engine
+                new.current_mode_set(old.current_mode_get())
+                parameters = old.parameters_values_get(self._units)
+                if parameters:
+                    new.parameters_values_set(parameters, self._units)
+            self._engine = engine
+
+        return context
+
+    def _get_engines(self):
+        '''Engine wrappers by name, created once per engine list'''
+        if self._engines is None:
+            self._engines = dict((engine.name_get(),
+                                  Engine(self, engine, self._engine_list))
+                                 for engine in self._engine_list.engines_get())
+            if self._engine_context is not None:
+                self._engine_context.engines = self._engines
+        return self._engines
 
     @property
     def engines(self):
-        return dict((engine.name_get(), Engine(self, engine, self._engine_list))
-                    for engine in self._engine_list.engines_get())
+        return dict(self._get_engines())
 
     @property
     def parameters(self):
@@ -216,10 +295,14 @@ class CalcRecip(object):
 
     @property
     def physical_axis_names(self):
-        if self._axis_name_map:
-            return list(self._axis_name_map.values())
-        else:
-            return self._geometry.axis_names_get()
+        if self._physical_names is None:
+            if self._axis_name_map:
+                names = self._axis_name_map.values()
+            else:
+                names = self._geometry.axis_names_get()
+            self._physical_names = tuple(names)
+
+        return list(self._physical_names)
 
     @physical_axis_names.setter
     def physical_axis_names(self, axis_name_map):
@@ -236,6 +319,9 @@ class CalcRecip(object):
         for k, v in axis_name_map.items():
             self._axis_name_map[k] = v
 
+        self._clear_axis_cache()
+        self._state_changed()
+
     @property
     def physical_positions(self):
         return self._geometry.axis_values_get(self._units)
@@ -276,52 +362,419 @@ class CalcRecip(object):
         return self._engine.update()
 
     def _get_parameter(self, param):
-        return Parameter(param, units=self._unit_name)
+        return Parameter(param, units=self._unit_name,
+                         on_change=self._state_changed)
 
     @property
     def units(self):
         '''The units used for calculations'''
         return self._unit_name
 
-    def __getitem__(self, axis):
-        if axis in self.physical_axis_names:
+    @property
+    def _physical_lookup(self):
+        '''Physical axis name to hkl library axis name'''
+        if self._axis_lookup is None:
             if self._axis_name_map:
-                for k, v in self._axis_name_map.items():
-                    if axis == v:
-                        param = self._get_parameter(self._geometry.axis_get(k))
-                        # cannot set Parameter.name, so these are as
-                        # provided from below
-                        #param.name = axis
-                        return param
-
-            return self._get_parameter(self._geometry.axis_get(axis))
+                self._axis_lookup = dict((v, k) for k, v in
+                                         self._axis_name_map.items())
+            else:
+                self._axis_lookup = dict((name, name) for name in
+                                         self.physical_axis_names)
+        return self._axis_lookup
+
+    def __getitem__(self, axis):
+        lookup = self._physical_lookup
+        if axis in lookup:
+            # cannot set Parameter.name, so re-mapped axes are named as
+            # provided from below
+            return self._get_parameter(self._geometry.axis_get(lookup[axis]))
         elif axis in self.pseudo_axis_names:
             return self._engine[axis]
 
     def __setitem__(self, axis, value):
-        if axis in self.physical_axis_names:
+        if axis in self._physical_lookup:
             param = self[axis]
             param.value = value
         elif axis in self.pseudo_axis_names:
             self._engine[axis] = value
 
+    def _state_changed(self):
+        '''Record a change to the calculation state (see `state_version`)'''
+        self._state_version += 1
+
+    @property
+    def state_version(self):
+        '''A token which changes whenever the calculation state does
+
+        Unlike `context_fingerprint`, this is cheap to get. It covers the
+        sample and its UB matrix, the engine and its mode, axis limits, the
+        axis name map and the forward cache and vectorized inverse settings,
+        as changed through this class. The wavelength and physical positions
+        change often and are not included, and changes made directly on the
+        hkl library objects (such as engine parameter values) are not
+        tracked.
+        '''
+        return (self._state_version, id(self._sample), self._sample.version)
+
+    def context_fingerprint(self):
+        '''A hashable summary of everything affecting forward calculations
+
+        This covers the sample and its UB matrix, the wavelength, the engine,
+        its mode and parameters, the axis limits and name map, and the
+        positions of the axes which the current mode does not write (these
+        are held fixed during the calculation).
+        '''
+        engine = self.engine
+        hkl_engine = engine.engine
+        geometry = self._geometry
+        units = self._units
+
+        axis_names = geometry.axis_names_get()
+        written = hkl_engine.axis_names_get(
+            hkl_module.EngineAxisNamesGet.WRITE)
+        fixed = tuple((name, value) for name, value in
+                      zip(axis_names, geometry.axis_values_get(units))
+                      if name not in written)
+        limits = tuple(tuple(geometry.axis_get(name).min_max_get(units))
+                       for name in axis_names)
+
+        axis_name_map = None
+        if self._axis_name_map:
+            axis_name_map = tuple(self._axis_name_map.items())
+
+        return (self._sample.name,
+                tuple(self._sample.UB.flatten().tolist()),
+                self.wavelength,
+                engine.name,
+                engine.mode,
+                tuple(hkl_engine.parameters_values_get(units)),
+                limits,
+                fixed,
+                axis_name_map,
+                )
+
+    @property
+    def forward_cache(self):
+        '''The forward calculation cache, or None if disabled'''
+        return self._forward_cache
+
+    def enable_forward_cache(self, maxsize=128, resolution=1e-9,
+                             origin_resolution=1e-4):
+        '''Cache forward calculation results
+
+        Results are keyed on the pseudo position and the physical positions
+        the calculation starts from, which determine the solutions found and
+        their order. They are dropped automatically when the wavelength or
+        the calculation state changes (see `state_version`). Clear the cache
+        after changes which that does not track, such as engine parameter
+        values set on the hkl library objects.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of cached pseudo positions
+        resolution : float, optional
+            Pseudo positions closer than this are considered equal
+        origin_resolution : float, optional
+            Physical positions closer than this are considered equal
+        '''
+        self._forward_cache = ForwardCache(
+            maxsize=maxsize, resolution=resolution,
+            origin_resolution=origin_resolution)
+        self._state_changed()
+        return self._forward_cache
+
+    def disable_forward_cache(self):
+        '''Stop caching forward calculation results'''
+        self._forward_cache = None
+        self._state_changed()
+
     def forward(self, position, engine=None):
         '''Forward-calculate a position from pseudo to real space'''
 
-        with UsingEngine(self, engine):
+        with self._lock, UsingEngine(self, engine):
             if self.engine is None:
                 raise ValueError('Engine unset')
 
+            cache = self._forward_cache
+            if cache is not None:
+                # counters rather than context_fingerprint, which takes
+                # many library calls; the starting position in the key
+                # covers the axes held fixed
+                fingerprint = (self.state_version, self._wavelength)
+                origin = self._geometry.axis_values_get(self._units)
+                solutions = cache.get(fingerprint, position, origin=origin)
+                if solutions is not None:
+                    return solutions
+
             self.engine.pseudo_positions = position
-            return self.engine.solutions
+            solutions = self.engine.solutions
+
+            if cache is not None:
+                cache.put(fingerprint, position, solutions, origin=origin)
+
+            return solutions
+
+    def forward_many(self, pseudo, engine=None, max_solutions=None,
+                     wavelength=None):
+        '''Forward-calculate many positions from pseudo to real space
+
+        Solutions are written directly into a preallocated array, skipping the
+        per-point engine switching and Position creation of `forward`.
+
+        Parameters
+        ----------
+        pseudo : array_like
+            Pseudo positions, shape (N, num_pseudo)
+        engine : str, optional
+            Engine to use for the calculation (defaults to the current one)
+        max_solutions : int, optional
+            Number of solutions to keep per point. If unspecified, the
+            solution axis grows to fit the point with the most solutions.
+        wavelength : array_like, optional
+            Wavelength of each point, shape (N, ). The wavelength is restored
+            afterward.
+
+        Returns
+        -------
+        solutions : ndarray
+            Real positions, shape (N, max_solutions, num_real). Unused
+            solution slots are filled with NaN.
+        num_solutions : ndarray
+            Number of valid solutions for each point, shape (N, ). Points
+            which could not be solved have no solutions. The validity mask of
+            `solutions` is
+            ``np.arange(max_solutions) < num_solutions[:, None]``
+        '''
+        pseudo = np.atleast_2d(np.asarray(pseudo, dtype=float))
+
+        with self._lock, UsingEngine(self, engine):
+            if self.engine is None:
+                raise ValueError('Engine unset')
+
+            num_pseudo = len(self.pseudo_axis_names)
+            if pseudo.ndim != 2 or pseudo.shape[1] != num_pseudo:
+                raise ValueError('Expected pseudo positions of shape (N, {})'
+                                 ''.format(num_pseudo))
+
+            num_real = len(self._geometry.axis_names_get())
+            if max_solutions is None:
+                width = 1
+            else:
+                width = int(max_solutions)
+
+            solutions = np.full((len(pseudo), width, num_real), np.nan)
+            num_solutions = np.zeros(len(pseudo), dtype=int)
+
+            hkl_engine = self.engine.engine
+            units = self._units
+            if wavelength is not None:
+                wavelength = np.broadcast_to(np.asarray(wavelength,
+                                                        dtype=float),
+                                             (len(pseudo), )).tolist()
+                initial_wavelength = self._geometry.wavelength_get(units)
+
+            try:
+                for i, values in enumerate(pseudo.tolist()):
+                    if wavelength is not None:
+                        self._geometry.wavelength_set(wavelength[i], units)
+
+                    try:
+                        geometry_list = hkl_engine.pseudo_axis_values_set(
+                            values, units)
+                    except GLib.GError as ex:
+                        logger.debug('Forward calculation failed for %s (%s)',
+                                     values, ex)
+                        continue
+
+                    items = geometry_list.items()
+                    if max_solutions is None and len(items) > width:
+                        grow = np.full((len(pseudo), len(items) - width,
+                                        num_real), np.nan)
+                        solutions = np.concatenate((solutions, grow), axis=1)
+                        width = len(items)
+
+                    count = min(len(items), width)
+                    for j in range(count):
+                        geometry = items[j].geometry_get()
+                        solutions[i, j, :] = geometry.axis_values_get(units)
+
+                    num_solutions[i] = count
+            finally:
+                if wavelength is not None:
+                    self._geometry.wavelength_set(initial_wavelength, units)
+
+        return solutions, num_solutions
+
+    @property
+    def numpy_inverse(self):
+        '''The vectorized inverse calculation, or None if disabled'''
+        return self._numpy_inverse
+
+    def enable_numpy_inverse(self, validate=True, tolerance=1e-6):
+        '''Use the vectorized NumPy inverse calculation
+
+        Only available for the hkl engine of the standard geometries (see
+        `geometry.geometries`). With it enabled, `inverse` no longer updates
+        the pseudo positions of the engine. While another engine is in use,
+        inverse calculations fall back to the hkl library.
+
+        Parameters
+        ----------
+        validate : bool, optional
+            Compare against the hkl library before enabling
+        tolerance : float, optional
+            Maximum allowed absolute deviation in h, k or l when validating
+        '''
+        inverse = NumpyInverse(self)
+        if validate:
+            inverse.validate(tolerance=tolerance)
+
+        self._numpy_inverse = inverse
+        self._state_changed()
+        return inverse
+
+    def disable_numpy_inverse(self):
+        '''Use the hkl library for inverse calculations'''
+        self._numpy_inverse = None
+        self._state_changed()
+
+    def _get_numpy_inverse(self):
+        '''The vectorized inverse, if enabled and valid for the engine'''
+        inverse = self._numpy_inverse
+        if inverse is None or self._engine.name != 'hkl':
+            return None
+        return inverse
 
     def inverse(self, real):
         with self._lock:
+            numpy_inverse = self._get_numpy_inverse()
+            if numpy_inverse is not None:
+                # keep the geometry in sync for forward calculations, but
+                # skip the update of all engines
+                self._geometry.axis_values_set(real, self._units)
+                return list(numpy_inverse(real))
+
             engine = self.engine
             self.physical_positions = real
             # self.update()  # done implicitly in setter
             return self.pseudo_positions
 
+    def inverse_many(self, real):
+        '''Inverse-calculate many positions from real to pseudo space
+
+        The physical positions of the geometry are restored after the
+        calculation.
+
+        Parameters
+        ----------
+        real : array_like
+            Real positions, shape (N, num_real)
+
+        Returns
+        -------
+        pseudo : ndarray
+            Pseudo positions, shape (N, num_pseudo)
+        '''
+        numpy_inverse = self._get_numpy_inverse()
+        if numpy_inverse is not None:
+            return numpy_inverse(np.atleast_2d(real))
+
+        return self._hkl_inverse_many(real)
+
+    def _hkl_inverse_many(self, real):
+        '''Inverse-calculate many positions with the hkl library'''
+        real = np.atleast_2d(np.asarray(real, dtype=float))
+
+        with self._lock:
+            if self.engine is None:
+                raise ValueError('Engine unset')
+
+            geometry = self._geometry
+            num_real = len(geometry.axis_names_get())
+            if real.ndim != 2 or real.shape[1] != num_real:
+                raise ValueError('Expected real positions of shape (N, {})'
+                                 ''.format(num_real))
+
+            pseudo = np.zeros((len(real), len(self.pseudo_axis_names)))
+
+            hkl_engine = self.engine.engine
+            engine_list = self._engine_list
+            units = self._units
+            initial = geometry.axis_values_get(units)
+            try:
+                for i, values in enumerate(real.tolist()):
+                    geometry.axis_values_set(values, units)
+                    engine_list.get()
+                    pseudo[i, :] = hkl_engine.pseudo_axis_values_get(units)
+            finally:
+                geometry.axis_values_set(initial, units)
+                engine_list.get()
+
+        return pseudo
+
+    def iter_inverse_many(self, chunks):
+        '''Inverse-calculate real positions chunk-by-chunk
+
+        Only one chunk is held in memory at a time, so arbitrarily long
+        recordings can be converted from a generator.
+
+        Parameters
+        ----------
+        chunks : iterable of array_like
+            Real positions, each of shape (M, num_real)
+
+        Yields
+        ------
+        pseudo : ndarray
+            Pseudo positions for each chunk, shape (M, num_pseudo)
+        '''
+        for chunk in chunks:
+            yield self.inverse_many(chunk)
+
+    def iter_path(self, path_type='linear', chunk_size=1000, **kwargs):
+        '''Generate the pseudo positions of a path in chunks
+
+        See `paths.path_generators` for the path types and their arguments.
+        Arc and radial paths of the hkl engine default to the B matrix of
+        the current sample as their metric.
+
+        Parameters
+        ----------
+        path_type : str or callable, optional
+            The path type, or a path generator function
+        chunk_size : int, optional
+            Maximum number of positions per chunk
+
+        Yields
+        ------
+        ndarray
+            Pseudo positions, shape (M, num_pseudo)
+        '''
+        if path_type in ('arc', 'radial') and self.engine.name == 'hkl':
+            kwargs.setdefault('metric', self.sample.B)
+
+        return paths.iter_path(path_type, len(self.pseudo_axis_names),
+                               chunk_size=chunk_size, **kwargs)
+
+    def iter_forward_many(self, chunks, engine=None, max_solutions=None):
+        '''Forward-calculate pseudo positions chunk-by-chunk
+
+        Parameters
+        ----------
+        chunks : iterable of array_like
+            Pseudo positions, each of shape (M, num_pseudo), such as from
+            `iter_path`
+
+        Yields
+        ------
+        solutions, num_solutions : ndarray
+            As in `forward_many`, for each chunk
+        '''
+        for chunk in chunks:
+            yield self.forward_many(chunk, engine=engine,
+                                    max_solutions=max_solutions)
+
     def calc_linear_path(self, start, end, n, num_params=0, **kwargs):
         # start = [h1, k1, l1]
         # end   = [h2, k2, l2]
@@ -360,9 +813,9 @@ class CalcRecip(object):
                 if positions.shape[0] == 1 and positions.size == num_params:
                     # [[h, k, l], ]
                     return [positions[0]]
-                elif positions.shape[0] == num_params:
+                elif positions.shape[1] == num_params:
                     # [[h, k, l], [h, k, l], ...]
-                    return [positions[i, :] for i in range(num_params)]
+                    return [positions[i, :] for i in range(len(positions))]
 
         raise ValueError('Invalid set of %s positions' %
                          ', '.join(self.pseudo_axis_names))
@@ -375,6 +828,132 @@ class CalcRecip(object):
                                      path_type=path_type, **kwargs):
                 yield self.forward(pos, engine=None, **kwargs)
 
+    def get_state(self):
+        '''The calculator state as a JSON-serializable dictionary
+
+        Includes the diffractometer type, engine with its mode and parameters,
+        wavelength, axis positions and limits, the physical axis name map and
+        the state of all samples. Restore with `from_state`.
+        '''
+        engine = self.engine
+        geometry = self._geometry
+        units = self._units
+
+        limits = {}
+        for name in geometry.axis_names_get():
+            param = self._get_parameter(geometry.axis_get(name))
+            limits[name] = list(param.limits)
+
+        axis_name_map = None
+        if self._axis_name_map:
+            axis_name_map = [list(item)
+                             for item in self._axis_name_map.items()]
+
+        return {'dtype': self._dtype,
+                'units': self._unit_name,
+                'lock_engine': self._lock_engine,
+                'engine': engine.name,
+                'mode': engine.mode,
+                'parameters': list(engine.engine.parameters_values_get(units)),
+                'wavelength': self.wavelength,
+                'positions': list(geometry.axis_values_get(units)),
+                'limits': limits,
+                'axis_name_map': axis_name_map,
+                'sample': self.sample_name,
+                'samples': [sample.get_state()
+                            for sample in self._samples.values()],
+                }
+
+    @classmethod
+    def from_state(cls, state):
+        '''Create a calculator from a state dictionary
+
+        Parameters
+        ----------
+        state : dict
+            Calculator state, as returned by `get_state`
+        '''
+        samples = OrderedDict((sample['name'], sample)
+                              for sample in state['samples'])
+        current = samples[state['sample']]
+        kwargs = dict(engine=state['engine'], sample=current['name'],
+                      lattice=current['lattice'], units=state['units'],
+                      lock_engine=state['lock_engine'])
+
+        if cls is CalcRecip:
+            calc = cls(state['dtype'], **kwargs)
+        else:
+            calc = cls(**kwargs)
+            if calc._dtype != state['dtype']:
+                raise ValueError('State is for diffractometer type {!r}, not '
+                                 '{!r}'.format(state['dtype'], calc._dtype))
+
+        for name, sample_state in samples.items():
+            if name == current['name']:
+                calc.sample._apply_state(sample_state)
+            else:
+                sample = HklSample.from_state(calc, sample_state,
+                                              units=calc._unit_name)
+                calc.add_sample(sample, select=False)
+
+        geometry = calc._geometry
+        units = calc._units
+        for name, limits in state['limits'].items():
+            calc._get_parameter(geometry.axis_get(name)).limits = limits
+
+        calc.wavelength = state['wavelength']
+        geometry.axis_values_set(state['positions'], units)
+
+        engine = calc.engine
+        engine.mode = state['mode']
+        if state['parameters']:
+            engine.engine.parameters_values_set(state['parameters'], units)
+
+        if state['axis_name_map'] is not None:
+            calc.physical_axis_names = OrderedDict(state['axis_name_map'])
+
+        calc.update()
+        return calc
+
+    def copy(self):
+        '''An independent calculator with the same state'''
+        return self.from_state(self.get_state())
+
+    def forward_energies(self, pseudo, energies, engine=None,
+                         max_solutions=None):
+        '''Forward-calculate a fixed pseudo position over a range of energies
+
+        The energy, physical positions and pseudo positions of this
+        calculator are restored afterward.
+
+        Parameters
+        ----------
+        pseudo : array_like
+            Pseudo position, shape (num_pseudo, )
+        energies : array_like
+            Energies in keV, shape (N, )
+        engine : str, optional
+            Engine to use for the calculation (defaults to the current one)
+        max_solutions : int, optional
+            Number of solutions to keep per point
+
+        Returns
+        -------
+        solutions, num_solutions : ndarray
+            As in `forward_many`, with one point per energy
+        '''
+        energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        pseudo = np.asarray(pseudo, dtype=float).reshape(1, -1)
+        points = np.repeat(pseudo, len(energies), axis=0)
+
+        with self._lock, TemporaryGeometry(self):
+            return self.forward_many(points, engine=engine,
+                                     max_solutions=max_solutions,
+                                     wavelength=NM_KEV / energies)
+
+    def __reduce__(self):
+        return (_calc_from_state, (self.__class__, self.get_state()))
+
     def _repr_info(self):
         repr = ['engine={!r}'.format(self.engine.name),
                 'detector={!r}'.format(self._detector),
@@ -394,6 +973,20 @@ class CalcRecip(object):
                                ', '.join(info))
 
 
+class _EngineListContext(object):
+    '''An engine list and its wrappers, initialized for one sample'''
+    def __init__(self, engine_list):
+        self.engine_list = engine_list
+        self.engines = None
+        # sample version at the last initialization
+        self.version = None
+
+
+def _calc_from_state(cls, state):
+    '''Unpickle a calculator'''
+    return cls.from_state(state)
+
+
 class CalcE4CH(CalcRecip):
     def __init__(self, **kwargs):
         super().__init__('E4CH', **kwargs)
@@ -1,3 +1,6 @@
+from . import util
+
+
 class UsingEngine(object):
     """Context manager that uses a calculation engine temporarily"""
     def __init__(self, calc, engine):
@@ -16,14 +19,26 @@ class UsingEngine(object):
 
 
 class TemporaryGeometry(object):
-    """Context manager that restores physical geometry after a block of code"""
+    """Context manager that restores physical geometry after a block of code
+
+    The axis positions and wavelength are restored in place, as the engine
+    lists of the calculation class refer to its geometry.
+    """
 
     def __init__(self, calc):
         self.calc = calc
 
     def __enter__(self):
-        self.geometry = self.calc._geometry.copy()
+        geometry = self.calc._geometry
+        units = util.units['default']
+        self.positions = geometry.axis_values_get(units)
+        self.wavelength = geometry.wavelength_get(units)
 
     def __exit__(self, type_, value, traceback):
-        self.calc._geometry = self.geometry
-        self.calc._re_init()
+        calc = self.calc
+        geometry = calc._geometry
+        units = util.units['default']
+        geometry.wavelength_set(self.wavelength, units)
+        geometry.axis_values_set(self.positions, units)
+        if calc.engine is not None:
+            calc.update()
@@ -0,0 +1,212 @@
+'''
+:mod:`ophyd.hkl.detector` - Area detector reciprocal space mapping
+==================================================================
+
+.. module:: ophyd.hkl.detector
+   :synopsis: Vectorized conversion of area detector pixels to hkl
+'''
+
+import logging
+
+import numpy as np
+
+from . import geometry
+from . import util
+from .geometry import TAU
+
+logger = logging.getLogger(__name__)
+
+
+class PixelMapper(object):
+    '''Map the pixels of an area detector frame to (h, k, l)
+
+    The detector is described in the frame of the detector arm at zero
+    angles, where the beam scattered along +x hits the point of normal
+    incidence, `center`. The direction of every pixel is computed once; each
+    frame then only requires a 3x3 matrix built from its diffractometer
+    angles, UB and wavelength.
+
+    Parameters
+    ----------
+    dtype : str
+        Diffractometer type, one of `geometry.geometries`
+    shape : (int, int)
+        Frame shape, (rows, columns)
+    distance : float
+        Distance from the sample to the detector, in the units of
+        `pixel_size`
+    pixel_size : float or (float, float)
+        Pixel size, (along rows, along columns)
+    center : (float, float), optional
+        Pixel (row, column) of normal incidence. Defaults to the center of
+        the frame.
+    row_direction : sequence of float, optional
+        Direction of increasing row index at zero angles. Defaults to down,
+        (0, 0, -1).
+    column_direction : sequence of float, optional
+        Direction of increasing column index at zero angles. Defaults to the
+        right as seen from the sample, (0, -1, 0).
+    '''
+    def __init__(self, dtype, shape, distance, pixel_size, center=None,
+                 row_direction=(0., 0., -1.), column_direction=(0., -1., 0.)):
+        if dtype not in geometry.geometries:
+            raise ValueError('No vectorized geometry for {!r}; choose from: {}'
+                             ''.format(dtype,
+                                       ', '.join(sorted(geometry.geometries))))
+
+        self._dtype = dtype
+        self._shape = tuple(int(num) for num in shape)
+        if len(self._shape) != 2:
+            raise ValueError('Frame shape must be (rows, columns)')
+
+        rows, columns = self._shape
+        if center is None:
+            center = ((rows - 1) / 2.0, (columns - 1) / 2.0)
+
+        self.distance = float(distance)
+        self.pixel_size = tuple(np.broadcast_to(pixel_size, (2, )).tolist())
+        self.center = tuple(float(c) for c in center)
+        self.row_direction = _unit(row_direction)
+        self.column_direction = _unit(column_direction)
+        self._directions = self._pixel_directions()
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def shape(self):
+        '''Frame shape, (rows, columns)'''
+        return self._shape
+
+    @property
+    def directions(self):
+        '''Unit vectors from the sample to each pixel at zero angles
+
+        Shape (rows * columns, 3)
+        '''
+        return self._directions
+
+    def _pixel_directions(self):
+        rows, columns = self._shape
+        row_offset = (np.arange(rows) - self.center[0]) * self.pixel_size[0]
+        col_offset = (np.arange(columns) - self.center[1]) * self.pixel_size[1]
+
+        pos = np.empty((rows, columns, 3))
+        pos[...] = self.distance * np.array([1., 0., 0.])
+        pos += row_offset[:, np.newaxis, np.newaxis] * self.row_direction
+        pos += col_offset[np.newaxis, :, np.newaxis] * self.column_direction
+
+        pos = pos.reshape(-1, 3)
+        pos /= np.linalg.norm(pos, axis=1, keepdims=True)
+        pos.flags.writeable = False
+        return pos
+
+    def frame_matrices(self, real, UB, wavelength, degrees=True):
+        '''Per-frame transformation of pixel directions to hkl
+
+        hkl = M n - offset, where M = k UB^-1 R_s^T R_d and
+        offset = k UB^-1 R_s^T x.
+
+        Parameters
+        ----------
+        real : array_like
+            Real positions in hkl library axis order, shape (F, num_real)
+        UB : array_like
+            The UB matrix, shape (3, 3)
+        wavelength : float or array_like
+            Wavelength, in the length units of UB. May be given per frame.
+        degrees : bool, optional
+            Positions are in degrees (otherwise radians)
+
+        Returns
+        -------
+        M : ndarray
+            shape (F, 3, 3)
+        offset : ndarray
+            shape (F, 3)
+        '''
+        sample_rot = geometry.sample_rotation(self._dtype, real,
+                                              degrees=degrees)
+        detector_rot = geometry.detector_rotation(self._dtype, real,
+                                                  degrees=degrees)
+        num_frames = len(sample_rot)
+        k = np.broadcast_to(TAU / np.asarray(wavelength, dtype=float),
+                            (num_frames, ))
+
+        # UB^-1 R_s^T, scaled by k
+        to_hkl = np.matmul(np.linalg.inv(np.asarray(UB, dtype=float)),
+                           np.swapaxes(sample_rot, 1, 2))
+        to_hkl *= k[:, np.newaxis, np.newaxis]
+        return np.matmul(to_hkl, detector_rot), to_hkl[:, :, 0]
+
+    def hkl(self, real, UB, wavelength, degrees=True):
+        '''Calculate h, k and l for every pixel of one or more frames
+
+        Parameters
+        ----------
+        real : array_like
+            Real positions in hkl library axis order, shape (num_real, ) for a
+            single frame or (F, num_real) for a batch
+        UB : array_like
+            The UB matrix, shape (3, 3)
+        wavelength : float or array_like
+            Wavelength, in the length units of UB. May be given per frame.
+        degrees : bool, optional
+            Positions are in degrees (otherwise radians)
+
+        Returns
+        -------
+        h, k, l : ndarray
+            Each with the frame shape, (rows, columns), or (F, rows, columns)
+            for a batch
+        '''
+        real = np.asarray(real, dtype=float)
+        single = (real.ndim == 1)
+
+        mat, offset = self.frame_matrices(real, UB, wavelength,
+                                          degrees=degrees)
+        hkl = np.einsum('fij,pj->ifp', mat, self._directions)
+        hkl -= offset.T[:, :, np.newaxis]
+
+        hkl = hkl.reshape((3, len(mat)) + self._shape)
+        if single:
+            hkl = hkl[:, 0]
+        return hkl[0], hkl[1], hkl[2]
+
+    def calc_hkl(self, calc, real=None):
+        '''Calculate h, k and l with the UB and wavelength of a calculator
+
+        Parameters
+        ----------
+        calc : CalcRecip
+            The calculator, of the same diffractometer type
+        real : array_like, optional
+            Real positions in the units of the calculator, shape
+            (num_real, ) or (F, num_real). Defaults to the current position.
+
+        Returns
+        -------
+        h, k, l : ndarray
+            See `hkl`
+        '''
+        if calc._dtype != self._dtype:
+            raise ValueError('Calculator type {!r} does not match the mapper '
+                             'type {!r}'.format(calc._dtype, self._dtype))
+        if real is None:
+            real = calc.physical_positions
+
+        wavelength = calc._geometry.wavelength_get(util.units['default'])
+        return self.hkl(real, calc.sample.UB, wavelength,
+                        degrees=(calc.units == 'user'))
+
+    def __repr__(self):
+        return ('{}({!r}, shape={!r}, distance={!r}, pixel_size={!r}, '
+                'center={!r})'.format(self.__class__.__name__, self._dtype,
+                                      self._shape, self.distance,
+                                      self.pixel_size, self.center))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=float).reshape(3)
+    return vector / np.linalg.norm(vector)
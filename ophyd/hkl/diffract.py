@@ -1,6 +1,14 @@
 import logging
+import threading
+
+import numpy as np
+
 from . import calc
+from . import selection
+from .pool import CalcPool
+from .reachability import ReachabilityMap
 from .. import (Signal, PseudoPositioner)
+from ..utils import DisconnectedError
 
 
 logger = logging.getLogger(__name__)
@@ -11,7 +19,8 @@ class Diffractometer(PseudoPositioner):
 
     def __init__(self, prefix, calc_kw=None, decision_fcn=None,
                  energy_signal=None, energy=8.0, calc_inst=None,
-                 **kwargs):
+                 forward_cache=None, numpy_inverse=False,
+                 energy_update_interval=None, thread_safe=False, **kwargs):
         if calc_inst is not None:
             if not isinstance(calc_inst, self.calc_class):
                 raise ValueError('Calculation instance must be derived from '
@@ -37,6 +46,24 @@ class Diffractometer(PseudoPositioner):
 
         self._decision_fcn = decision_fcn
 
+        if numpy_inverse:
+            self._calc.enable_numpy_inverse()
+
+        # energy updates are coalesced if an update interval (in seconds) is
+        # set, with the most recent energy applied when the interval elapses
+        # or before the next calculation
+        self._energy_interval = energy_update_interval
+        self._energy_lock = threading.Lock()
+        self._pending_energy = None
+        self._energy_timer = None
+
+        self._calc_pool = None
+        if thread_safe:
+            self._calc_pool = CalcPool(self._calc)
+
+        if forward_cache:
+            self._calc.enable_forward_cache(maxsize=forward_cache)
+
         super().__init__(prefix, **kwargs)
 
         if energy_signal is None:
@@ -72,8 +99,44 @@ class Diffractometer(PseudoPositioner):
         energy = value
 
         logger.debug('{.name} energy changed: {}'.format(self, value))
-        self._calc.energy = energy
-        self._update_position()
+        if self._energy_interval is None:
+            self._set_calc_energy(energy)
+            self._update_position()
+            return
+
+        with self._energy_lock:
+            self._pending_energy = energy
+            if self._energy_timer is None:
+                timer = threading.Timer(self._energy_interval,
+                                        self._apply_pending_energy)
+                timer.daemon = True
+                self._energy_timer = timer
+                timer.start()
+
+    def _set_calc_energy(self, energy):
+        # not in the middle of a calculation on another thread
+        with self._calc._lock:
+            self._calc.energy = energy
+
+    def _apply_pending_energy(self):
+        '''Apply the most recent coalesced energy update, if any'''
+        with self._energy_lock:
+            energy = self._pending_energy
+            timer = self._energy_timer
+            self._pending_energy = None
+            self._energy_timer = None
+
+        if timer is not None:
+            # applied before the interval elapsed; the timer has nothing left
+            # to do
+            timer.cancel()
+
+        if energy is not None:
+            self._set_calc_energy(energy)
+            try:
+                self._update_position()
+            except DisconnectedError:
+                pass
 
     @property
     def calc(self):
@@ -83,23 +146,238 @@ class Diffractometer(PseudoPositioner):
     def engine(self):
         return self._calc.engine
 
-    # TODO so these calculations change the internal state of the hkl
-    # calculation class, which is probably not a good thing -- it becomes a
-    # problem when someone uses these functions outside of move()
+    # Calculations change the internal state of the hkl calculation class.
+    # With thread_safe set, they run on per-thread copies of it instead, so
+    # that callback threads and the scan thread do not interfere. The copies
+    # start from the current positions of the real positioners.
+
+    def _get_calc(self):
+        '''The calculator to use on the current thread'''
+        if self._calc_pool is not None:
+            real = self.real_position
+            if None in real:
+                real = None
+            return self._calc_pool.get(real=real)
+        return self._calc
+
+    @property
+    def forward_cache(self):
+        '''The cache of forward solutions, or None if disabled
+
+        Only the solutions are cached; a solution is selected from them on
+        every call, as the decision function may depend on the current
+        position.
+        '''
+        return self._calc.forward_cache
 
     def forward(self, pseudo):
-        solutions = self._calc.forward(pseudo)
+        self._apply_pending_energy()
+        solutions = self._get_calc().forward(pseudo)
         logger.debug('pseudo to real: {}'.format(solutions))
 
         if self._decision_fcn is not None:
-            return self._decision_fcn(position, solutions)
+            return self._decision_fcn(pseudo, solutions)
         else:
             return solutions[0]
 
+    def forward_many(self, pseudo, strategy=None, unsolved='raise',
+                     **kwargs):
+        '''Forward-calculate an array of pseudo positions
+
+        All solutions are calculated in bulk, and one is selected per point.
+        By default the selection matches `forward`: the decision function if
+        one is set, otherwise the first solution, and points without a
+        solution raise ValueError. `check_many` relies on this. A vectorized
+        strategy from `selection.selection_strategies` ('first', 'nearest',
+        'min_travel' or 'weighted'), or a function with the same signature,
+        may be given instead. Keyword arguments, such as `start`, `weights`
+        or `metric`, are passed to the strategy.
+
+        Parameters
+        ----------
+        pseudo : array_like
+            Pseudo positions, shape (N, num_pseudo)
+        strategy : str or callable, optional
+            Solution selection strategy
+        unsolved : {'raise', 'nan'}, optional
+            Raise ValueError if any point has no solution, as `forward` does,
+            or set the real position of such points to NaN
+
+        Returns
+        -------
+        real : ndarray
+            Real positions, shape (N, num_real)
+        '''
+        if unsolved not in ('raise', 'nan'):
+            raise ValueError('Unknown unsolved option {!r}; choose from: '
+                             'raise, nan'.format(unsolved))
+
+        self._apply_pending_energy()
+        pseudo = np.atleast_2d(np.asarray(pseudo, dtype=float))
+        calc = self._get_calc()
+        solutions, num_solutions = calc.forward_many(pseudo)
+        if strategy is None and self._decision_fcn is not None:
+            real = self._decide_many(calc, pseudo, solutions, num_solutions)
+            solved = num_solutions > 0
+        else:
+            real, index = selection.select_solutions(
+                solutions, num_solutions, strategy=strategy or 'first',
+                **kwargs)
+            solved = index >= 0
+
+        failed = np.nonzero(~solved)[0]
+        if len(failed) and unsolved == 'raise':
+            raise ValueError('Calculation failed for {} of {} pseudo '
+                             'positions (first: {} at index {})'
+                             ''.format(len(failed), len(pseudo),
+                                       pseudo[failed[0]].tolist(),
+                                       failed[0]))
+        return real
+
+    def _decide_many(self, calc, pseudo, solutions, num_solutions):
+        '''Select solutions with the decision function, point by point'''
+        Position = calc.Position
+        real = np.full((len(pseudo), solutions.shape[2]), np.nan)
+        for i, count in enumerate(num_solutions.tolist()):
+            if count:
+                choices = tuple(Position(*sol) for sol in
+                                solutions[i, :count].tolist())
+                real[i] = self._decision_fcn(
+                    self.PseudoPosition(*pseudo[i]), choices)
+        return real
+
+    def iter_forward_path(self, path_type='linear', strategy='nearest',
+                          strategy_kw=None, chunk_size=1000, **kwargs):
+        '''Forward-calculate a path chunk-by-chunk
+
+        Pseudo positions are generated in chunks (see `CalcRecip.iter_path`)
+        and each chunk is solved in bulk. The 'nearest' and 'min_travel'
+        selections continue from the last position of the previous chunk.
+
+        Parameters
+        ----------
+        path_type : str or callable, optional
+            The path type, or a path generator function
+        strategy : str or callable, optional
+            Solution selection strategy (see `forward_many`)
+        strategy_kw : dict, optional
+            Keyword arguments for the selection strategy
+        chunk_size : int, optional
+            Maximum number of positions per chunk
+
+        Keyword arguments are passed to the path generator.
+
+        Yields
+        ------
+        pseudo : ndarray
+            Pseudo positions, shape (M, num_pseudo)
+        real : ndarray
+            Real positions, shape (M, num_real). NaN where no solution was
+            found.
+        '''
+        self._apply_pending_energy()
+        calc = self._get_calc()
+        strategy_kw = dict(strategy_kw or {})
+        # strategies which follow on from a starting position
+        continuous = strategy in ('nearest', 'min_travel')
+        for pseudo in calc.iter_path(path_type, chunk_size=chunk_size,
+                                     **kwargs):
+            solutions, num_solutions = calc.forward_many(pseudo)
+            real, index = selection.select_solutions(
+                solutions, num_solutions, strategy=strategy, **strategy_kw)
+            solved = np.nonzero(index >= 0)[0]
+            if continuous and len(solved):
+                strategy_kw['start'] = real[solved[-1]]
+            yield pseudo, real
+
+    def plan_energy_scan(self, pseudo, energies, strategy='nearest',
+                         **kwargs):
+        '''Real positions for a fixed pseudo position over a range of energies
+
+        All energies are solved in one batch, after which the calculator
+        energy is restored; the energy signal is not modified. One
+        solution per energy is selected with a strategy from
+        `selection.selection_strategies`; keyword arguments are passed to it.
+
+        Parameters
+        ----------
+        pseudo : sequence of float
+            Pseudo position, such as (h, k, l)
+        energies : array_like
+            Energies in keV, shape (N, )
+        strategy : str or callable, optional
+            Solution selection strategy
+
+        Returns
+        -------
+        real : ndarray
+            Real positions, shape (N, num_real). NaN where unreachable.
+        reachable : ndarray
+            Mask of the energies with a solution, shape (N, )
+        '''
+        solutions, num_solutions = self._calc.forward_energies(pseudo,
+                                                               energies)
+        real, index = selection.select_solutions(solutions, num_solutions,
+                                                 strategy=strategy, **kwargs)
+        return real, index >= 0
+
+    def _real_axis_limits(self):
+        '''Current limits of the real positioners, by axis name'''
+        # keyed by name, as the positioners need not be in the order of the
+        # calculation axes
+        return dict(zip(self.RealPosition._fields,
+                        [real.limits for real in self._real]))
+
+    def reachability_map(self, lower, upper, shape, **kwargs):
+        '''Precompute the reachability of a grid of pseudo positions
+
+        Solutions must lie within the limits of the real positioners as well
+        as those of the calculation engine. The positioner limits are read
+        again whenever the map is checked, so changing them marks the map
+        stale. Keyword arguments are passed to `ReachabilityMap`.
+
+        Parameters
+        ----------
+        lower : sequence of float
+            Lower bound of each pseudo axis
+        upper : sequence of float
+            Upper bound of each pseudo axis
+        shape : int or sequence of int
+            Number of grid points along each pseudo axis
+
+        Returns
+        -------
+        ReachabilityMap
+        '''
+        kwargs.setdefault('real_limits', self._real_axis_limits)
+        reach = ReachabilityMap(self._calc, lower, upper, shape, **kwargs)
+        reach.build()
+        return reach
+
     def inverse(self, real):
-        pseudo = self._calc.inverse(real)
+        self._apply_pending_energy()
+        pseudo = self._get_calc().inverse(real)
         return self.PseudoPosition(*pseudo)
 
+    def inverse_many(self, real):
+        '''Inverse-calculate an array of real positions, shape (N, num_real)
+
+        Returns
+        -------
+        pseudo : ndarray
+            Pseudo positions, shape (N, num_pseudo)
+        '''
+        self._apply_pending_energy()
+        return self._get_calc().inverse_many(real)
+
+    def iter_inverse_many(self, chunks):
+        '''Inverse-calculate real positions from an iterable of chunks
+
+        Yields one (M, num_pseudo) array per chunk.
+        '''
+        self._apply_pending_energy()
+        return self._get_calc().iter_inverse_many(chunks)
+
 
 class E4CH(Diffractometer):
     calc_class = calc.CalcE4CH
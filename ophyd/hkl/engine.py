@@ -11,10 +11,12 @@ logger = logging.getLogger(__name__)
 
 
 class Parameter(object):
-    def __init__(self, param, units='user'):
+    def __init__(self, param, units='user', on_change=None):
         self._param = param
         self._unit_name = units
         self._units = util.units[units]
+        # called after the limits or fit flag are changed
+        self._on_change = on_change
 
     @property
     def hkl_parameter(self):
@@ -55,6 +57,8 @@ class Parameter(object):
     @fit.setter
     def fit(self, fit):
         self._param.fit_set(int(fit))
+        if self._on_change is not None:
+            self._on_change()
 
     @property
     def limits(self):
@@ -64,6 +68,8 @@ class Parameter(object):
     def limits(self, lims):
         low, high = lims
         self._param.min_max_set(low, high, self._units)
+        if self._on_change is not None:
+            self._on_change()
 
     def _repr_info(self):
         repr = ['name={!r}'.format(self.name),
@@ -132,6 +138,7 @@ class Engine(object):
         self._calc = calc
         self._engine = engine
         self._engine_list = engine_list
+        self._pseudo_axis_names = None
 
     @property
     def name(self):
@@ -149,7 +156,9 @@ class Engine(object):
                              'choose from: %s' % (mode, ', '.join(self.modes))
                              )
 
-        return self._engine.current_mode_set(mode)
+        ret = self._engine.current_mode_set(mode)
+        self._calc._state_changed()
+        return ret
 
     @property
     def modes(self):
@@ -174,7 +183,10 @@ class Engine(object):
 
     @property
     def pseudo_axis_names(self):
-        return self._engine.pseudo_axis_names_get()
+        if self._pseudo_axis_names is None:
+            self._pseudo_axis_names = tuple(
+                self._engine.pseudo_axis_names_get())
+        return list(self._pseudo_axis_names)
 
     @property
     def pseudo_axes(self):
@@ -0,0 +1,297 @@
+'''
+:mod:`ophyd.hkl.geometry` - Vectorized diffractometer geometry
+==============================================================
+
+.. module:: ophyd.hkl.geometry
+   :synopsis: NumPy implementations of standard diffractometer geometries
+'''
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from . import util
+
+logger = logging.getLogger(__name__)
+
+
+TAU = 2 * np.pi
+# Kappa axis tilt for the kappa geometries
+KAPPA_ALPHA = np.radians(50.0)
+
+Axis = namedtuple('Axis', 'name vector holder')
+
+_X = (1., 0., 0.)
+_MY = (0., -1., 0.)
+_Z = (0., 0., 1.)
+_KAPPA = (0., -np.cos(KAPPA_ALPHA), -np.sin(KAPPA_ALPHA))
+
+# Axes of the standard geometries, in hkl library order. Each rotates its
+# holder (the sample or the detector) about `vector` in the laboratory frame,
+# where the incident beam travels along +x.
+geometries = {
+    'E4CV': (Axis('omega', _MY, 'sample'),
+             Axis('chi', _X, 'sample'),
+             Axis('phi', _MY, 'sample'),
+             Axis('tth', _MY, 'detector'),
+             ),
+    'E4CH': (Axis('omega', _Z, 'sample'),
+             Axis('chi', _X, 'sample'),
+             Axis('phi', _Z, 'sample'),
+             Axis('tth', _Z, 'detector'),
+             ),
+    'K4CV': (Axis('komega', _MY, 'sample'),
+             Axis('kappa', _KAPPA, 'sample'),
+             Axis('kphi', _MY, 'sample'),
+             Axis('tth', _MY, 'detector'),
+             ),
+    'E6C': (Axis('mu', _Z, 'sample'),
+            Axis('omega', _MY, 'sample'),
+            Axis('chi', _X, 'sample'),
+            Axis('phi', _MY, 'sample'),
+            Axis('gamma', _Z, 'detector'),
+            Axis('delta', _MY, 'detector'),
+            ),
+    'K6C': (Axis('mu', _Z, 'sample'),
+            Axis('komega', _MY, 'sample'),
+            Axis('kappa', _KAPPA, 'sample'),
+            Axis('kphi', _MY, 'sample'),
+            Axis('gamma', _Z, 'detector'),
+            Axis('delta', _MY, 'detector'),
+            ),
+}
+
+
+def rotation_matrices(vector, angles):
+    '''Right-handed rotation matrices about an axis
+
+    Parameters
+    ----------
+    vector : sequence of float
+        Rotation axis
+    angles : array_like
+        Rotation angles in radians, shape (N, )
+
+    Returns
+    -------
+    ndarray
+        Rotation matrices, shape (N, 3, 3)
+    '''
+    x, y, z = np.asarray(vector, dtype=float) / np.linalg.norm(vector)
+    angles = np.asarray(angles, dtype=float)
+    c = np.cos(angles)
+    s = np.sin(angles)
+    t = 1.0 - c
+
+    rot = np.empty(angles.shape + (3, 3))
+    rot[..., 0, 0] = t * x * x + c
+    rot[..., 0, 1] = t * x * y - s * z
+    rot[..., 0, 2] = t * x * z + s * y
+    rot[..., 1, 0] = t * x * y + s * z
+    rot[..., 1, 1] = t * y * y + c
+    rot[..., 1, 2] = t * y * z - s * x
+    rot[..., 2, 0] = t * x * z - s * y
+    rot[..., 2, 1] = t * y * z + s * x
+    rot[..., 2, 2] = t * z * z + c
+    return rot
+
+
+def _holder_rotation(axes, real, holder):
+    rot = np.broadcast_to(np.eye(3), (len(real), 3, 3))
+    for idx, axis in enumerate(axes):
+        if axis.holder == holder:
+            rot = np.matmul(rot, rotation_matrices(axis.vector, real[:, idx]))
+    return rot
+
+
+def _check_real(dtype, real, degrees):
+    try:
+        axes = geometries[dtype]
+    except KeyError:
+        raise ValueError('No vectorized geometry for {!r}; choose from: {}'
+                         ''.format(dtype, ', '.join(sorted(geometries))))
+
+    real = np.atleast_2d(np.asarray(real, dtype=float))
+    if real.ndim != 2 or real.shape[1] != len(axes):
+        raise ValueError('Expected real positions of shape (N, {})'
+                         ''.format(len(axes)))
+
+    if degrees:
+        real = np.radians(real)
+
+    return axes, real
+
+
+def sample_rotation(dtype, real, degrees=True):
+    '''Rotation of the sample holder, from sample to laboratory frame
+
+    Parameters
+    ----------
+    dtype : str
+        Diffractometer type
+    real : array_like
+        Real positions in hkl library axis order, shape (N, num_real)
+    degrees : bool, optional
+        Positions are in degrees (otherwise radians)
+
+    Returns
+    -------
+    ndarray
+        Rotation matrices, shape (N, 3, 3)
+    '''
+    axes, real = _check_real(dtype, real, degrees)
+    return _holder_rotation(axes, real, 'sample')
+
+
+def detector_rotation(dtype, real, degrees=True):
+    '''Rotation of the detector holder in the laboratory frame
+
+    See `sample_rotation` for parameters.
+    '''
+    axes, real = _check_real(dtype, real, degrees)
+    return _holder_rotation(axes, real, 'detector')
+
+
+def sample_q(dtype, real, wavelength, degrees=True):
+    '''Scattering vectors in the sample frame
+
+    Parameters
+    ----------
+    dtype : str
+        Diffractometer type
+    real : array_like
+        Real positions in hkl library axis order, shape (N, num_real)
+    wavelength : float or array_like
+        Wavelength, in the length units of the UB matrix. May be given per
+        point, shape (N, ).
+    degrees : bool, optional
+        Positions are in degrees (otherwise radians)
+
+    Returns
+    -------
+    ndarray
+        Q = kf - ki rotated into the sample frame, shape (N, 3)
+    '''
+    axes, real = _check_real(dtype, real, degrees)
+    k = (TAU / np.asarray(wavelength, dtype=float)).reshape(-1, 1)
+
+    ki = k * np.array([1., 0., 0.])
+    kf = k * _holder_rotation(axes, real, 'detector')[:, :, 0]
+    q_lab = kf - ki
+
+    sample_rot = _holder_rotation(axes, real, 'sample')
+    # R^T q for each point
+    return np.einsum('nji,nj->ni', sample_rot, q_lab)
+
+
+def inverse_hkl(dtype, real, UB, wavelength, degrees=True):
+    '''Calculate hkl from real positions
+
+    Parameters
+    ----------
+    dtype : str
+        Diffractometer type
+    real : array_like
+        Real positions in hkl library axis order, shape (N, num_real)
+    UB : array_like
+        The UB matrix, shape (3, 3)
+    wavelength : float
+        Wavelength, in the length units of the UB matrix
+    degrees : bool, optional
+        Positions are in degrees (otherwise radians)
+
+    Returns
+    -------
+    ndarray
+        (h, k, l), shape (N, 3)
+    '''
+    q = sample_q(dtype, real, wavelength, degrees=degrees)
+    return np.linalg.solve(np.asarray(UB, dtype=float), q.T).T
+
+
+class NumpyInverse(object):
+    '''Vectorized inverse (real to hkl) calculation for a calculator
+
+    Only the hkl engine of the standard geometries (see `geometries`) is
+    supported. The UB matrix and wavelength are read from the calculator on
+    each call, so changes to either are always used.
+
+    Parameters
+    ----------
+    calc : CalcRecip
+        The calculator
+    '''
+    def __init__(self, calc):
+        if calc._dtype not in geometries:
+            raise ValueError('No vectorized geometry for {!r}; choose from: {}'
+                             ''.format(calc._dtype,
+                                       ', '.join(sorted(geometries))))
+        if calc.engine.name != 'hkl':
+            raise ValueError('Only the hkl engine is supported')
+
+        self._calc = calc
+        self._degrees = (calc.units == 'user')
+
+    @property
+    def calc(self):
+        return self._calc
+
+    def __call__(self, real):
+        '''Calculate hkl from real positions
+
+        Positions are of shape (N, num_real), or (num_real, ) for a single
+        position.
+        '''
+        real = np.asarray(real, dtype=float)
+        calc = self._calc
+        wavelength = calc._geometry.wavelength_get(util.units['default'])
+        hkl = inverse_hkl(calc._dtype, real, calc.sample.UB, wavelength,
+                          degrees=self._degrees)
+        if real.ndim == 1:
+            return hkl[0]
+        return hkl
+
+    def validate(self, real=None, tolerance=1e-6, num_points=20, seed=0):
+        '''Compare against the hkl library
+
+        Parameters
+        ----------
+        real : array_like, optional
+            Real positions to compare at, shape (N, num_real). Defaults to
+            `num_points` random positions.
+        tolerance : float, optional
+            Maximum allowed absolute deviation in h, k or l
+        num_points : int, optional
+            Number of random positions
+        seed : int, optional
+            Random seed for the positions
+
+        Returns
+        -------
+        float
+            The maximum absolute deviation
+
+        Raises
+        ------
+        ValueError
+            If the deviation exceeds the tolerance
+        '''
+        calc = self._calc
+        if real is None:
+            rs = np.random.RandomState(seed)
+            num_real = len(geometries[calc._dtype])
+            real = rs.uniform(-180., 180., size=(num_points, num_real))
+            if not self._degrees:
+                real = np.radians(real)
+
+        expected = calc._hkl_inverse_many(real)
+        deviation = np.max(np.abs(self(real) - expected))
+
+        logger.debug('Vectorized inverse deviation for %s: %g',
+                     calc._dtype, deviation)
+        if deviation > tolerance:
+            raise ValueError('Vectorized inverse deviates from the hkl '
+                             'library by {:g} (tolerance {:g})'
+                             ''.format(deviation, tolerance))
+        return deviation
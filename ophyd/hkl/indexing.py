@@ -0,0 +1,244 @@
+'''
+:mod:`ophyd.hkl.indexing` - Auto-indexing of measured peaks
+===========================================================
+
+.. module:: ophyd.hkl.indexing
+   :synopsis: Search for the UB matrix from peaks of unknown hkl
+'''
+
+import functools
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from . import reflections
+
+logger = logging.getLogger(__name__)
+
+
+IndexResult = namedtuple('IndexResult',
+                         'UB hkl indexed quality rms num_candidates')
+
+
+def _triads(v1, v2):
+    '''Orthonormal frames built from pairs of vectors, shape (M, 3, 3)'''
+    t1 = v1 / np.linalg.norm(v1, axis=-1, keepdims=True)
+    t3 = np.cross(v1, v2)
+    t3 /= np.linalg.norm(t3, axis=-1, keepdims=True)
+    t2 = np.cross(t3, t1)
+    return np.stack((t1, t2, t3), axis=-1)
+
+
+def busing_levy_UB(B, hkl1, hkl2, q1, q2):
+    '''UB matrices from pairs of reflections (Busing and Levy)
+
+    Parameters
+    ----------
+    B : array_like
+        The B matrix, shape (3, 3)
+    hkl1, hkl2 : array_like
+        Reflection indices, shape (M, 3)
+    q1, q2 : array_like
+        Measured scattering vectors in the sample frame, shape (M, 3) or (3, )
+
+    Returns
+    -------
+    UB : ndarray
+        shape (M, 3, 3)
+    '''
+    B = np.asarray(B, dtype=float)
+    hkl1 = np.atleast_2d(hkl1)
+    hkl2 = np.atleast_2d(hkl2)
+    q1 = np.broadcast_to(q1, hkl1.shape)
+    q2 = np.broadcast_to(q2, hkl2.shape)
+
+    t_crystal = _triads(np.dot(hkl1, B.T), np.dot(hkl2, B.T))
+    t_measured = _triads(q1, q2)
+    U = np.matmul(t_measured, np.swapaxes(t_crystal, 1, 2))
+    return np.matmul(U, B)
+
+
+def _angles(v1, v2):
+    '''Angles between all pairs of rows of v1 and v2, shape (M1, M2)'''
+    v1 = v1 / np.linalg.norm(v1, axis=-1, keepdims=True)
+    v2 = v2 / np.linalg.norm(v2, axis=-1, keepdims=True)
+    return np.arccos(np.clip(np.dot(v1, v2.T), -1.0, 1.0))
+
+
+def score_ub(UB, q, tolerance=0.1):
+    '''Score candidate UB matrices against measured peaks
+
+    Parameters
+    ----------
+    UB : array_like
+        Candidate UB matrices, shape (M, 3, 3)
+    q : array_like
+        Measured scattering vectors in the sample frame, shape (N, 3)
+    tolerance : float, optional
+        Maximum deviation of h, k and l from integers for a peak to count as
+        indexed
+
+    Returns
+    -------
+    num_indexed : ndarray
+        Number of indexed peaks per candidate, shape (M, )
+    rms : ndarray
+        rms deviation from integer hkl of the indexed peaks, shape (M, )
+    '''
+    UB = np.asarray(UB, dtype=float)
+    hkl = np.matmul(np.linalg.inv(UB), np.asarray(q, dtype=float).T)
+    deviation = np.abs(hkl - np.round(hkl)).max(axis=1)
+    indexed = deviation <= tolerance
+
+    num_indexed = indexed.sum(axis=1)
+    sum_sq = np.where(indexed, deviation ** 2, 0.0).sum(axis=1)
+    rms = np.sqrt(sum_sq / np.maximum(num_indexed, 1))
+    return num_indexed, rms
+
+
+def _score_chunk(UB, q=None, tolerance=None):
+    return score_ub(UB, q, tolerance=tolerance)
+
+
+def candidate_ub(q, B, q_tolerance=0.02, angle_tolerance=1.0,
+                 num_reference=3, table=None):
+    '''Candidate UB matrices from pairs of measured peaks
+
+    Each pair of the first `num_reference` peaks is matched against a table
+    of reflections by scattering vector length and by the angle between the
+    two peaks.
+
+    Parameters
+    ----------
+    q : array_like
+        Measured scattering vectors in the sample frame, shape (N, 3)
+    B : array_like
+        The B matrix, shape (3, 3)
+    q_tolerance : float, optional
+        Relative tolerance on scattering vector lengths
+    angle_tolerance : float, optional
+        Tolerance on the angle between peaks, in degrees
+    num_reference : int, optional
+        Number of peaks used to build candidate pairs
+    table : array_like, optional
+        Reflection table from `reflections.reflection_table`, or its hkl as
+        an array of shape (M, 3). Generated if not specified.
+
+    Returns
+    -------
+    UB : ndarray
+        shape (num_candidates, 3, 3)
+    '''
+    q = np.asarray(q, dtype=float)
+    B = np.asarray(B, dtype=float)
+    q_norm = np.linalg.norm(q, axis=1)
+
+    if table is None:
+        table = reflections.reflection_table(
+            B, q_max=q_norm.max() * (1.0 + q_tolerance))
+    table = reflections.hkl_array(table)
+
+    table_vec = np.dot(table, B.T)
+    table_norm = np.linalg.norm(table_vec, axis=1)
+    angle_tolerance = np.radians(angle_tolerance)
+
+    candidates = []
+    num_reference = min(num_reference, len(q))
+    for i in range(num_reference):
+        match_i = np.abs(table_norm - q_norm[i]) <= q_tolerance * q_norm[i]
+        for j in range(i + 1, num_reference):
+            measured = _angles(q[i:i + 1], q[j:j + 1])[0, 0]
+            if measured < angle_tolerance or \
+                    measured > np.pi - angle_tolerance:
+                # (anti-)parallel peaks do not define an orientation
+                continue
+
+            match_j = np.abs(table_norm - q_norm[j]) <= q_tolerance * q_norm[j]
+            hkl_i = table[match_i]
+            hkl_j = table[match_j]
+            if not len(hkl_i) or not len(hkl_j):
+                continue
+
+            angles = _angles(table_vec[match_i], table_vec[match_j])
+            idx_i, idx_j = np.nonzero(np.abs(angles - measured) <=
+                                      angle_tolerance)
+            if len(idx_i):
+                candidates.append(busing_levy_UB(B, hkl_i[idx_i],
+                                                 hkl_j[idx_j], q[i], q[j]))
+
+    if not candidates:
+        return np.zeros((0, 3, 3))
+    return np.concatenate(candidates)
+
+
+def auto_index(q, B, q_tolerance=0.02, angle_tolerance=1.0,
+               hkl_tolerance=0.1, num_reference=3, map_fcn=map,
+               chunk_size=1000, table=None):
+    '''Find the UB matrix indexing the most measured peaks
+
+    Parameters
+    ----------
+    q : array_like
+        Measured scattering vectors in the sample frame, shape (N, 3)
+    B : array_like
+        The B matrix, shape (3, 3)
+    q_tolerance : float, optional
+        Relative tolerance on scattering vector lengths
+    angle_tolerance : float, optional
+        Tolerance on the angle between peaks, in degrees
+    hkl_tolerance : float, optional
+        Maximum deviation of h, k and l from integers for a peak to count as
+        indexed
+    num_reference : int, optional
+        Number of peaks used to build candidate pairs
+    map_fcn : callable, optional
+        ``map``-like function used to score chunks of candidates, such as
+        the ``map`` method of a process pool
+    chunk_size : int, optional
+        Number of candidates scored per call
+    table : array_like, optional
+        Reflection table from `reflections.reflection_table`, or its hkl as
+        an array of shape (M, 3). Generated if not specified.
+
+    Returns
+    -------
+    IndexResult
+        The best UB matrix, the fractional hkl of every peak with it, the
+        mask of indexed peaks, the fraction of peaks indexed (quality), the
+        rms deviation from integer hkl of the indexed peaks and the number of
+        candidates scored
+
+    Raises
+    ------
+    ValueError
+        If no candidate UB matrix could be found
+    '''
+    q = np.asarray(q, dtype=float)
+    if len(q) < 2:
+        raise ValueError('At least two peaks are required for indexing')
+
+    UB = candidate_ub(q, B, q_tolerance=q_tolerance,
+                      angle_tolerance=angle_tolerance,
+                      num_reference=num_reference, table=table)
+    if not len(UB):
+        raise ValueError('No candidate orientations found; check the lattice '
+                         'and tolerances')
+
+    chunks = [UB[i:i + chunk_size] for i in range(0, len(UB), chunk_size)]
+    score = functools.partial(_score_chunk, q=q, tolerance=hkl_tolerance)
+    results = list(map_fcn(score, chunks))
+    num_indexed = np.concatenate([num for num, rms in results])
+    rms = np.concatenate([rms for num, rms in results])
+
+    # most peaks indexed, then lowest deviation
+    best = np.lexsort((rms, -num_indexed))[0]
+    best_ub = UB[best]
+    hkl = np.linalg.solve(best_ub, q.T).T
+    indexed = np.abs(hkl - np.round(hkl)).max(axis=1) <= hkl_tolerance
+
+    logger.debug('Indexed %d of %d peaks from %d candidates (rms=%g)',
+                 num_indexed[best], len(q), len(UB), rms[best])
+    return IndexResult(UB=best_ub, hkl=hkl, indexed=indexed,
+                       quality=float(num_indexed[best]) / len(q),
+                       rms=float(rms[best]), num_candidates=len(UB))
@@ -0,0 +1,191 @@
+'''
+:mod:`ophyd.hkl.parallel` - Parallel reciprocal space calculations
+==================================================================
+
+.. module:: ophyd.hkl.parallel
+   :synopsis: Process-pool forward/inverse calculations
+'''
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The calculator rebuilt in each worker process
+_worker_calc = None
+
+
+def _init_worker(state):
+    from .calc import CalcRecip
+
+    global _worker_calc
+    _worker_calc = CalcRecip.from_state(state)
+
+
+def _forward_chunk(args):
+    pseudo, max_solutions = args
+    return _worker_calc.forward_many(pseudo, max_solutions=max_solutions)
+
+
+def _inverse_chunk(real):
+    return _worker_calc.inverse_many(real)
+
+
+class ParallelCalc(object):
+    '''Forward and inverse calculations split over a pool of processes
+
+    The state of the calculator (see `CalcRecip.get_state`) is captured at
+    creation time and used to rebuild an equivalent calculator in each worker
+    process. Later changes to the calculator are not seen by the workers.
+
+    Parameters
+    ----------
+    calc : CalcRecip
+        The configured calculator
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    chunk_size : int, optional
+        Number of points calculated per task
+    '''
+    def __init__(self, calc, processes=None, chunk_size=1000):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        self._state = calc.get_state()
+        self._num_real = len(calc.physical_axis_names)
+        self._num_pseudo = len(calc.pseudo_axis_names)
+        self._processes = int(processes)
+        self.chunk_size = int(chunk_size)
+        self._pool = None
+        self._cancel = threading.Event()
+
+    @property
+    def processes(self):
+        '''Number of worker processes'''
+        return self._processes
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._processes,
+                                              initializer=_init_worker,
+                                              initargs=(self._state, ))
+        return self._pool
+
+    def close(self):
+        '''Shut down the worker processes'''
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def cancel(self):
+        '''Cancel the calculation in progress
+
+        The calculation stops at the next completed chunk, raising
+        `CancelledError` in the calling thread.
+        '''
+        self._cancel.set()
+
+    def _run(self, fcn, tasks, sizes, progress):
+        self._cancel.clear()
+        total = sum(sizes)
+        done = 0
+
+        results = []
+        for size, result in zip(sizes, self._get_pool().imap(fcn, tasks)):
+            if self._cancel.is_set():
+                # outstanding tasks cannot be recalled from the pool
+                self.close()
+                raise CancelledError('Calculation cancelled after {} of {} '
+                                     'points'.format(done, total))
+
+            results.append(result)
+            done += size
+            if progress is not None:
+                progress(done, total)
+
+        return results
+
+    def _split(self, values):
+        return [values[i:i + self.chunk_size]
+                for i in range(0, len(values), self.chunk_size)]
+
+    def forward_many(self, pseudo, max_solutions=None, progress=None):
+        '''Forward-calculate many positions from pseudo to real space
+
+        See `CalcRecip.forward_many` for details.
+
+        Parameters
+        ----------
+        pseudo : array_like
+            Pseudo positions, shape (N, num_pseudo)
+        max_solutions : int, optional
+            Number of solutions to keep per point
+        progress : callable, optional
+            Called as ``progress(done, total)`` as each chunk completes
+
+        Returns
+        -------
+        solutions : ndarray
+            Real positions, shape (N, max_solutions, num_real)
+        num_solutions : ndarray
+            Number of valid solutions for each point, shape (N, )
+        '''
+        pseudo = np.atleast_2d(np.asarray(pseudo, dtype=float))
+        chunks = self._split(pseudo)
+        tasks = [(chunk, max_solutions) for chunk in chunks]
+        results = self._run(_forward_chunk, tasks,
+                            [len(chunk) for chunk in chunks], progress)
+
+        if not results:
+            width = max_solutions or 1
+            return (np.zeros((0, width, self._num_real)),
+                    np.zeros(0, dtype=int))
+
+        # chunks may have found differing maximum numbers of solutions
+        width = max(solutions.shape[1] for solutions, count in results)
+        solutions = np.full((len(pseudo), width, self._num_real), np.nan)
+        num_solutions = np.zeros(len(pseudo), dtype=int)
+
+        start = 0
+        for chunk_solutions, chunk_count in results:
+            end = start + len(chunk_count)
+            solutions[start:end, :chunk_solutions.shape[1]] = chunk_solutions
+            num_solutions[start:end] = chunk_count
+            start = end
+
+        return solutions, num_solutions
+
+    def inverse_many(self, real, progress=None):
+        '''Inverse-calculate many positions from real to pseudo space
+
+        Parameters
+        ----------
+        real : array_like
+            Real positions, shape (N, num_real)
+        progress : callable, optional
+            Called as ``progress(done, total)`` as each chunk completes
+
+        Returns
+        -------
+        pseudo : ndarray
+            Pseudo positions, shape (N, num_pseudo)
+        '''
+        real = np.atleast_2d(np.asarray(real, dtype=float))
+        chunks = self._split(real)
+        results = self._run(_inverse_chunk, chunks,
+                            [len(chunk) for chunk in chunks], progress)
+        if not results:
+            return np.zeros((0, self._num_pseudo))
+
+        return np.concatenate(results)
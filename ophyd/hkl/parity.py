@@ -0,0 +1,244 @@
+'''
+:mod:`ophyd.hkl.parity` - Reference data comparison
+===================================================
+
+.. module:: ophyd.hkl.parity
+   :synopsis: Accuracy and throughput of calculations against reference
+       sessions, such as those recorded with SPEC
+'''
+
+import logging
+import os
+import re
+import time
+from collections import (OrderedDict, namedtuple)
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+ReferenceSession = namedtuple('ReferenceSession',
+                              'hkl axis_names positions UB')
+
+ParityResult = namedtuple('ParityResult',
+                          'operation axis_names max_deviation mean_deviation '
+                          'num_points num_failed points_per_second')
+
+# SPEC six-circle (SIXC) motor names to hkl library E6C axis names
+spec_sixc_axes = {'Delta': 'delta',
+                  'Theta': 'omega',
+                  'Chi': 'chi',
+                  'Phi': 'phi',
+                  'Mu': 'mu',
+                  'Gamma': 'gamma',
+                  }
+
+
+def _read_table(fname):
+    '''Read a whitespace-separated table with a header line of names'''
+    with open(fname, 'rt') as f:
+        lines = [line.strip() for line in f]
+
+    lines = [line for line in lines if line and not line.startswith('#')]
+    names = lines[0].split()
+    data = np.array([[float(value) for value in line.split()]
+                     for line in lines[1:]], dtype=float)
+    return names, data.reshape(-1, len(names))
+
+
+def _read_spec_ub(fname):
+    '''Read a UB matrix printed by SPEC (``p UB``)'''
+    values = {}
+    with open(fname, 'rt') as f:
+        for line in f:
+            match = re.match(r'\s*UB\["(\d)"\]\s*=\s*(\S+)', line)
+            if match:
+                values[int(match.group(1))] = float(match.group(2))
+
+    if sorted(values) != list(range(9)):
+        return None
+    return np.array([values[i] for i in range(9)]).reshape(3, 3)
+
+
+def load_reference(path, hkl_file='hkl.txt', motors_file='motors.txt',
+                   ub_file='ub.txt', axis_map=None):
+    '''Load a reference session of hkl and motor positions
+
+    Parameters
+    ----------
+    path : str
+        Directory of the session files (such as ``examples/hkl_data``)
+    hkl_file : str, optional
+        Table with h, k and l columns
+    motors_file : str, optional
+        Table of motor positions, one column per motor, with one row for each
+        row of `hkl_file`
+    ub_file : str, optional
+        SPEC UB matrix printout. Optional.
+    axis_map : dict, optional
+        Map of motor names to physical axis names, such as `spec_sixc_axes`
+
+    Returns
+    -------
+    ReferenceSession
+    '''
+    names, hkl = _read_table(os.path.join(path, hkl_file))
+    lower = [name.lower() for name in names]
+    hkl = np.column_stack([hkl[:, lower.index(name)] for name in 'hkl'])
+
+    axis_names, positions = _read_table(os.path.join(path, motors_file))
+    if axis_map is not None:
+        axis_names = [axis_map.get(name, name) for name in axis_names]
+
+    if len(positions) != len(hkl):
+        raise ValueError('Number of hkl ({}) and motor positions ({}) differ'
+                         ''.format(len(hkl), len(positions)))
+
+    UB = None
+    ub_file = os.path.join(path, ub_file) if ub_file else None
+    if ub_file and os.path.exists(ub_file):
+        UB = _read_spec_ub(ub_file)
+
+    return ReferenceSession(hkl=hkl, axis_names=axis_names,
+                            positions=positions, UB=UB)
+
+
+def _result(operation, axis_names, deviation, elapsed):
+    deviation = np.abs(np.asarray(deviation, dtype=float))
+    failed = np.isnan(deviation).any(axis=1)
+    ok = deviation[~failed]
+    if len(ok):
+        max_dev = ok.max(axis=0)
+        mean_dev = ok.mean(axis=0)
+    else:
+        max_dev = mean_dev = np.full(len(axis_names), np.nan)
+
+    rate = len(deviation) / elapsed if elapsed > 0 else np.inf
+    return ParityResult(operation=operation, axis_names=list(axis_names),
+                        max_deviation=OrderedDict(zip(axis_names,
+                                                      max_dev.tolist())),
+                        mean_deviation=OrderedDict(zip(axis_names,
+                                                       mean_dev.tolist())),
+                        num_points=len(deviation),
+                        num_failed=int(failed.sum()),
+                        points_per_second=rate)
+
+
+def _nearest_solution(solutions, reference):
+    '''The solution nearest to the reference position, per point'''
+    solutions = np.asarray(solutions, dtype=float)
+    distance = np.abs(solutions - reference[:, np.newaxis, :]).max(axis=2)
+    distance[np.isnan(distance)] = np.inf
+    best = np.argmin(distance, axis=1)
+    nearest = solutions[np.arange(len(solutions)), best]
+    nearest[np.isinf(distance.min(axis=1))] = np.nan
+    return nearest
+
+
+def check_parity(calc, reference, single=True, batched=True, repeat=1):
+    '''Compare forward and inverse calculations against a reference session
+
+    The calculator must be set up (sample, UB, wavelength, mode and limits)
+    as in the reference session. Forward solutions are compared using the
+    solution nearest to the reference position. The positions of the
+    calculator are restored afterward.
+
+    Parameters
+    ----------
+    calc : CalcRecip
+        The calculator
+    reference : ReferenceSession
+        Reference data, from `load_reference`
+    single : bool, optional
+        Run the point-by-point `forward` and `inverse`
+    batched : bool, optional
+        Run `forward_many` and `inverse_many`
+    repeat : int, optional
+        Number of times each operation is repeated for timing
+
+    Returns
+    -------
+    list of ParityResult
+        Per-axis maximum and mean absolute deviation, number of points, of
+        points without a result, and throughput for each operation
+    '''
+    axis_names = calc.physical_axis_names
+    try:
+        order = [reference.axis_names.index(name) for name in axis_names]
+    except ValueError:
+        raise ValueError('Reference axes {} do not match the calculator axes '
+                         '{}'.format(reference.axis_names, axis_names))
+
+    real = reference.positions[:, order]
+    hkl = reference.hkl
+    pseudo_names = calc.pseudo_axis_names
+    repeat = max(int(repeat), 1)
+
+    def timed(fcn, *args):
+        t0 = time.perf_counter()
+        for i in range(repeat):
+            result = fcn(*args)
+        return result, (time.perf_counter() - t0) / repeat
+
+    def single_inverse(real):
+        return np.array([calc.inverse(pos) for pos in real.tolist()])
+
+    def single_forward(pseudo):
+        solutions = []
+        for pos in pseudo.tolist():
+            try:
+                solutions.append([list(sol) for sol in calc.forward(pos)])
+            except ValueError:
+                solutions.append([])
+
+        width = max([len(sol) for sol in solutions] + [1])
+        result = np.full((len(pseudo), width, real.shape[1]), np.nan)
+        for i, sol in enumerate(solutions):
+            if sol:
+                result[i, :len(sol)] = sol
+        return result
+
+    results = []
+    initial = calc.physical_positions
+    try:
+        if single:
+            found, elapsed = timed(single_inverse, real)
+            results.append(_result('inverse', pseudo_names, found - hkl,
+                                   elapsed))
+        if batched:
+            found, elapsed = timed(calc.inverse_many, real)
+            results.append(_result('inverse_many', pseudo_names, found - hkl,
+                                   elapsed))
+        if single:
+            found, elapsed = timed(single_forward, hkl)
+            results.append(_result('forward', axis_names,
+                                   _nearest_solution(found, real) - real,
+                                   elapsed))
+        if batched:
+            (found, _), elapsed = timed(calc.forward_many, hkl)
+            results.append(_result('forward_many', axis_names,
+                                   _nearest_solution(found, real) - real,
+                                   elapsed))
+    finally:
+        calc.physical_positions = initial
+
+    for result in results:
+        logger.debug('%s: %d points, %.1f points/s, max deviation %s',
+                     result.operation, result.num_points,
+                     result.points_per_second, dict(result.max_deviation))
+    return results
+
+
+def format_results(results):
+    '''Format parity results as a text table'''
+    lines = []
+    for result in results:
+        lines.append('{} ({} points, {} failed, {:.1f} points/s)'
+                     ''.format(result.operation, result.num_points,
+                               result.num_failed, result.points_per_second))
+        for name in result.axis_names:
+            lines.append('    {:>10s}  max {:12.6g}  mean {:12.6g}'
+                         ''.format(name, result.max_deviation[name],
+                                   result.mean_deviation[name]))
+    return '\n'.join(lines)
@@ -0,0 +1,242 @@
+'''
+:mod:`ophyd.hkl.paths` - Streaming pseudo-axis trajectories
+===========================================================
+
+.. module:: ophyd.hkl.paths
+   :synopsis: Generators of pseudo positions along paths, in fixed-size
+       chunks suitable for batched forward calculations
+'''
+
+import logging
+
+import numpy as np
+
+from .geometry import rotation_matrices
+
+logger = logging.getLogger(__name__)
+
+
+path_generators = {}
+
+
+def register_path(name, fcn=None):
+    '''Register a path generator
+
+    A generator is called as ``fcn(num_params, chunk_size, **kwargs)`` and
+    yields arrays of pseudo positions of shape (M, num_params), M <=
+    chunk_size. May be used as a decorator.
+    '''
+    def wrapper(fcn):
+        path_generators[name] = fcn
+        return fcn
+
+    if fcn is None:
+        return wrapper
+    return wrapper(fcn)
+
+
+def _chunks(num_points, chunk_size):
+    '''Index ranges of the chunks of a path'''
+    chunk_size = max(int(chunk_size), 1)
+    for lo in range(0, num_points, chunk_size):
+        yield np.arange(lo, min(lo + chunk_size, num_points))
+
+
+def _vector(value, num_params, name):
+    value = np.asarray(value, dtype=float).reshape(-1)
+    if value.size != num_params:
+        raise ValueError('Expected {} values for {}, got {}'
+                         ''.format(num_params, name, value.size))
+    return value
+
+
+@register_path('linear')
+def linear_path(num_params, chunk_size, start=None, end=None, n=100):
+    '''Evenly spaced points from start to end, inclusive (n + 1 points)'''
+    start = _vector(start, num_params, 'start')
+    end = _vector(end, num_params, 'end')
+    step = (end - start) / max(n, 1)
+    for idx in _chunks(n + 1, chunk_size):
+        yield start + idx[:, np.newaxis] * step
+
+
+@register_path('mesh')
+def mesh_path(num_params, chunk_size, start=None, end=None, shape=None,
+              snake=True):
+    '''A grid from start to end, with the first axis varying slowest
+
+    Parameters
+    ----------
+    start, end : sequence of float
+        Grid corners
+    shape : int or sequence of int
+        Number of points along each axis (1 to hold an axis at start)
+    snake : bool, optional
+        Reverse the direction of each axis on every other pass, so that
+        consecutive points are always neighbors
+    '''
+    start = _vector(start, num_params, 'start')
+    end = _vector(end, num_params, 'end')
+    shape = np.broadcast_to(np.asarray(shape, dtype=int),
+                            (num_params, )).copy()
+    if np.any(shape < 1):
+        raise ValueError('Mesh shape must be positive')
+
+    step = np.where(shape > 1, (end - start) / np.maximum(shape - 1, 1), 0.0)
+    # number of points per step of each axis
+    strides = np.cumprod(shape[::-1])[::-1]
+    strides = np.append(strides[1:], 1)
+
+    for idx in _chunks(int(np.prod(shape)), chunk_size):
+        digits = (idx[:, np.newaxis] // strides) % shape
+        if snake:
+            # an axis runs backward if the pass of the slower axes is odd
+            passes = idx[:, np.newaxis] // (strides * shape)
+            digits = np.where(passes % 2 == 1, shape - 1 - digits, digits)
+        yield start + digits * step
+
+
+def _metric(metric, num_params):
+    if metric is None:
+        return np.eye(num_params)
+    return np.asarray(metric, dtype=float).reshape(num_params, num_params)
+
+
+@register_path('arc')
+def arc_path(num_params, chunk_size, start=None, axis=None, angle=None,
+             n=100, center=None, metric=None, degrees=True):
+    '''Rotation of a position about an axis, such as an azimuthal scan about Q
+
+    Parameters
+    ----------
+    start : sequence of float
+        Starting position (h, k, l)
+    axis : sequence of float
+        Rotation axis, in the same coordinates as `start`
+    angle : float
+        Total rotation angle
+    n : int, optional
+        Number of steps (n + 1 points)
+    center : sequence of float, optional
+        Center of rotation (defaults to the origin)
+    metric : array_like, optional
+        Matrix to Cartesian coordinates, such as the B matrix for hkl.
+        Defaults to the identity.
+    degrees : bool, optional
+        Angle is in degrees (otherwise radians)
+    '''
+    if num_params != 3:
+        raise ValueError('Arc paths require three pseudo axes')
+
+    start = _vector(start, 3, 'start')
+    if center is None:
+        center = np.zeros(3)
+    center = _vector(center, 3, 'center')
+    metric = _metric(metric, 3)
+    inv_metric = np.linalg.inv(metric)
+
+    axis = np.dot(metric, _vector(axis, 3, 'axis'))
+    radius = np.dot(metric, start - center)
+    angle = float(angle)
+    if degrees:
+        angle = np.radians(angle)
+
+    for idx in _chunks(n + 1, chunk_size):
+        rot = rotation_matrices(axis, idx * (angle / max(n, 1)))
+        rotated = np.dot(rot, radius)
+        yield center + np.dot(rotated, inv_metric.T)
+
+
+@register_path('radial')
+def radial_path(num_params, chunk_size, direction=None, start=None,
+                end=None, n=100, metric=None):
+    '''Points along a direction from the origin, by scattering vector length
+
+    Parameters
+    ----------
+    direction : sequence of float
+        Direction of the path, such as (h, k, l)
+    start, end : float
+        Lengths |metric . position| at the ends of the path, such as |Q|
+    n : int, optional
+        Number of steps (n + 1 points)
+    metric : array_like, optional
+        Matrix to Cartesian coordinates, such as the B matrix for hkl.
+        Defaults to the identity.
+    '''
+    direction = _vector(direction, num_params, 'direction')
+    metric = _metric(metric, num_params)
+    unit = direction / np.linalg.norm(np.dot(metric, direction))
+
+    step = (float(end) - float(start)) / max(n, 1)
+    for idx in _chunks(n + 1, chunk_size):
+        lengths = float(start) + idx * step
+        yield lengths[:, np.newaxis] * unit
+
+
+@register_path('array')
+def array_path(num_params, chunk_size, positions=None):
+    '''Explicit positions, as an array of shape (N, num_params) or an
+    iterable of positions or of such arrays'''
+    chunk_size = max(int(chunk_size), 1)
+    if isinstance(positions, np.ndarray) or \
+            isinstance(positions, (list, tuple)):
+        positions = np.asarray(positions, dtype=float).reshape(-1, num_params)
+        for idx in _chunks(len(positions), chunk_size):
+            yield positions[idx[0]:idx[-1] + 1]
+        return
+
+    buffer = []
+    count = 0
+    for item in positions:
+        item = np.asarray(item, dtype=float).reshape(-1, num_params)
+        buffer.append(item)
+        count += len(item)
+        while count >= chunk_size:
+            merged = np.concatenate(buffer)
+            yield merged[:chunk_size]
+            buffer = [merged[chunk_size:]]
+            count = len(buffer[0])
+
+    if count:
+        yield np.concatenate(buffer)
+
+
+def iter_path(path_type, num_params, chunk_size=1000, **kwargs):
+    '''Generate the pseudo positions of a path in chunks
+
+    Parameters
+    ----------
+    path_type : str or callable
+        One of `path_generators`, or a generator function (see
+        `register_path`)
+    num_params : int
+        Number of pseudo axes
+    chunk_size : int, optional
+        Maximum number of positions per chunk
+
+    Keyword arguments are passed to the path generator.
+
+    Yields
+    ------
+    ndarray
+        Pseudo positions, shape (M, num_params)
+    '''
+    if callable(path_type):
+        fcn = path_type
+    else:
+        try:
+            fcn = path_generators[path_type]
+        except KeyError:
+            raise ValueError('Invalid path type {!r}; choose from: {}'
+                             ''.format(path_type,
+                                       ', '.join(sorted(path_generators))))
+
+    for chunk in fcn(num_params, chunk_size, **kwargs):
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.ndim != 2 or chunk.shape[1] != num_params:
+            raise ValueError('Path generator yielded positions of shape {}; '
+                             'expected (M, {})'.format(chunk.shape,
+                                                       num_params))
+        if len(chunk):
+            yield chunk
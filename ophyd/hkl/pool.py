@@ -0,0 +1,129 @@
+'''
+:mod:`ophyd.hkl.pool` - Per-thread calculators
+==============================================
+
+.. module:: ophyd.hkl.pool
+   :synopsis: Concurrent forward and inverse calculations on per-thread copies
+       of a calculator
+'''
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CalcPool(object):
+    '''Per-thread copies of a calculator
+
+    Calculations modify the geometry and engine state of a calculator, so
+    concurrent calls on one instance have to be serialized. Each thread using
+    the pool works on its own copy instead, so that forward and inverse
+    calculations depend only on their inputs and the state of the original
+    calculator.
+
+    A copy is re-created whenever the state of the original has changed
+    since it was made (see `CalcRecip.state_version`). Changes which that
+    does not track, such as engine parameter values set on the hkl library
+    objects, require a call to `invalidate`. The wavelength of the original
+    is written into the existing copy instead, as it changes with every
+    energy update. Physical positions are not part of the state either:
+    pass the current ones to `get` (or the calculation methods) so that the
+    copy starts from them, as the hkl library seeds its solvers with the
+    current position and holds the axes which the mode does not write fixed.
+
+    Each copy has its own forward cache, with the settings of the cache of
+    the original, if it has one.
+
+    Parameters
+    ----------
+    calc : CalcRecip
+        The original calculator
+    '''
+    def __init__(self, calc):
+        self._calc = calc
+        self._local = threading.local()
+        self._version = 0
+
+    @property
+    def calc(self):
+        '''The original calculator'''
+        return self._calc
+
+    def invalidate(self):
+        '''Re-create the copies of all threads on their next use'''
+        self._version += 1
+
+    def _copy(self):
+        '''Copy the original calculator'''
+        calc = self._calc
+        with calc._lock:
+            version = (self._version, calc.state_version)
+            clone = calc.copy()
+            cache = calc.forward_cache
+            if cache is not None:
+                clone.enable_forward_cache(
+                    maxsize=cache.maxsize, resolution=cache.resolution,
+                    origin_resolution=cache.origin_resolution)
+            if (calc.numpy_inverse is not None and
+                    clone.engine.name == 'hkl'):
+                clone.enable_numpy_inverse(validate=False)
+
+        return version, clone
+
+    def get(self, real=None):
+        '''The copy of the calculator for the current thread
+
+        Parameters
+        ----------
+        real : sequence of float, optional
+            The current physical positions, written into the copy
+        '''
+        calc = self._calc
+        local = self._local
+        clone = getattr(local, 'calc', None)
+        # read without locking the original; a change racing with the copy
+        # only causes another copy on the next call
+        version = (self._version, calc.state_version)
+        if clone is None or local.version != version:
+            logger.debug('Copying calculator for thread %s',
+                         threading.current_thread().name)
+            local.version, clone = self._copy()
+            local.calc = clone
+
+        wavelength = calc._wavelength
+        if real is not None or wavelength != clone._wavelength:
+            with clone._lock:
+                if wavelength != clone._wavelength:
+                    clone.wavelength = wavelength
+                if real is not None:
+                    clone._geometry.axis_values_set(list(real),
+                                                    clone._units)
+
+        return clone
+
+    def forward(self, pseudo, engine=None, real=None):
+        '''Forward-calculate a position from pseudo to real space
+
+        The calculation starts from the physical positions `real`, if given.
+        '''
+        return self.get(real=real).forward(pseudo, engine=engine)
+
+    def forward_many(self, pseudo, real=None, **kwargs):
+        '''Forward-calculate many positions (see `CalcRecip.forward_many`)'''
+        return self.get(real=real).forward_many(pseudo, **kwargs)
+
+    def inverse(self, real):
+        '''Inverse-calculate a position from real to pseudo space'''
+        return self.get().inverse(real)
+
+    def inverse_many(self, real):
+        '''Inverse-calculate many positions (see `CalcRecip.inverse_many`)'''
+        return self.get().inverse_many(real)
+
+    def iter_inverse_many(self, chunks):
+        '''Inverse-calculate chunks of positions on the current thread'''
+        return self.get().iter_inverse_many(chunks)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self._calc)
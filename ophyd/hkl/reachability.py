@@ -0,0 +1,224 @@
+'''
+:mod:`ophyd.hkl.reachability` - Reachability maps
+=================================================
+
+.. module:: ophyd.hkl.reachability
+   :synopsis: Precomputed solvability of pseudo positions on a grid
+'''
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ReachabilityMap(object):
+    '''Precomputed solvability of a coarse grid of pseudo positions
+
+    The grid is solved in bulk with `CalcRecip.forward_many`. A point is
+    reachable if the calculation finds a solution within the axis limits of
+    the calculator and, if given, within `real_limits`.
+
+    The map records the calculation context it was built for (see
+    `CalcRecip.context_fingerprint`) and the real limits. When limits, UB,
+    energy, mode or any other part of the context changes, the map is stale
+    and is rebuilt on the next query (or raises, if `auto_rebuild` is
+    unset).
+
+    Parameters
+    ----------
+    calc : CalcRecip
+        The calculator
+    lower : sequence of float
+        Lower bound of each pseudo axis
+    upper : sequence of float
+        Upper bound of each pseudo axis
+    shape : int or sequence of int
+        Number of grid points along each pseudo axis
+    real_limits : dict, sequence of (low, high) or callable, optional
+        Additional limits of the real axes, such as motor soft limits, keyed
+        by physical axis name (see `CalcRecip.physical_axis_names`). A
+        sequence is taken to be in physical axis order. Axes where
+        low == high are unlimited. A callable returning either is called
+        again on every staleness check, so that changed limits are picked
+        up.
+    auto_rebuild : bool, optional
+        Rebuild a stale map on query
+    '''
+    def __init__(self, calc, lower, upper, shape, real_limits=None,
+                 auto_rebuild=True):
+        num_pseudo = len(calc.pseudo_axis_names)
+        self._calc = calc
+        self._lower = np.asarray(lower, dtype=float).reshape(num_pseudo)
+        self._upper = np.asarray(upper, dtype=float).reshape(num_pseudo)
+        self._shape = tuple(np.broadcast_to(shape, (num_pseudo, )).tolist())
+        if any(num < 2 for num in self._shape):
+            raise ValueError('At least two grid points per axis are required')
+
+        self._step = (self._upper - self._lower) / (np.array(self._shape) - 1)
+        self._real_limits = real_limits
+        # check the limits now, rather than on the first query
+        self._get_real_limits()
+        self.auto_rebuild = bool(auto_rebuild)
+        self._reachable = None
+        self._fingerprint = None
+
+    def _get_real_limits(self):
+        '''Real limits as a list of (axis index, low, high)'''
+        real_limits = self._real_limits
+        if callable(real_limits):
+            real_limits = real_limits()
+        if real_limits is None:
+            return None
+
+        axis_names = self._calc.physical_axis_names
+        if not hasattr(real_limits, 'items'):
+            real_limits = list(real_limits)
+            if len(real_limits) != len(axis_names):
+                raise ValueError('Expected limits for {} real axes, got {}'
+                                 ''.format(len(axis_names),
+                                           len(real_limits)))
+            real_limits = zip(axis_names, real_limits)
+        else:
+            real_limits = real_limits.items()
+
+        limits = []
+        for name, (low, high) in real_limits:
+            try:
+                idx = axis_names.index(name)
+            except ValueError:
+                raise ValueError('Unknown real axis {!r}; choose from: {}'
+                                 ''.format(name, ', '.join(axis_names)))
+            if low != high:
+                limits.append((idx, float(low), float(high)))
+        return limits
+
+    def _get_fingerprint(self):
+        return (self._calc.context_fingerprint(), self._get_real_limits())
+
+    @property
+    def shape(self):
+        '''Grid shape'''
+        return self._shape
+
+    @property
+    def axes(self):
+        '''Grid coordinates along each pseudo axis'''
+        return [np.linspace(low, high, num) for low, high, num in
+                zip(self._lower, self._upper, self._shape)]
+
+    @property
+    def grid(self):
+        '''Grid points, shape (num_points, num_pseudo)'''
+        mesh = np.meshgrid(*self.axes, indexing='ij')
+        return np.stack(mesh, axis=-1).reshape(-1, len(self._shape))
+
+    @property
+    def reachable(self):
+        '''Reachability of each grid point, with the grid shape'''
+        self._check_stale()
+        return self._reachable
+
+    @property
+    def stale(self):
+        '''The calculation context or real limits have changed since the
+        map was built'''
+        return (self._reachable is None or
+                self._fingerprint != self._get_fingerprint())
+
+    def _check_stale(self):
+        if self.stale:
+            if not self.auto_rebuild:
+                raise RuntimeError('Reachability map is out of date; call '
+                                   'build()')
+            self.build()
+
+    def build(self):
+        '''Solve the grid and record the calculation context'''
+        calc = self._calc
+        fingerprint = self._get_fingerprint()
+        real_limits = fingerprint[1]
+        points = self.grid
+
+        if real_limits is None:
+            _, num_solutions = calc.forward_many(points, max_solutions=1)
+            reachable = num_solutions > 0
+        else:
+            solutions, num_solutions = calc.forward_many(points)
+            valid = (np.arange(solutions.shape[1]) <
+                     num_solutions[:, np.newaxis])
+            for idx, low, high in real_limits:
+                values = solutions[:, :, idx]
+                with np.errstate(invalid='ignore'):
+                    valid &= (values >= low) & (values <= high)
+            reachable = valid.any(axis=1)
+
+        self._reachable = reachable.reshape(self._shape)
+        self._fingerprint = fingerprint
+        logger.debug('Reachability map built: %d of %d points reachable',
+                     reachable.sum(), reachable.size)
+
+    def invalidate(self):
+        '''Force a rebuild on the next query'''
+        self._reachable = None
+
+    def query(self, points, method='nearest'):
+        '''Look up the reachability of pseudo positions
+
+        Points outside of the grid are unreachable.
+
+        Parameters
+        ----------
+        points : array_like
+            Pseudo positions, shape (N, num_pseudo) or (num_pseudo, )
+        method : {'nearest', 'all', 'any'}, optional
+            Use the nearest grid point, or require all (or any) of the grid
+            points of the enclosing cell to be reachable
+
+        Returns
+        -------
+        ndarray
+            Boolean mask, shape (N, ), or a bool for a single point
+        '''
+        reachable = self.reachable
+        points = np.asarray(points, dtype=float)
+        single = (points.ndim == 1)
+        points = np.atleast_2d(points)
+
+        scaled = (points - self._lower) / self._step
+        max_idx = np.array(self._shape) - 1
+        tolerance = 1e-9
+        inside = np.all((scaled >= -tolerance) &
+                        (scaled <= max_idx + tolerance), axis=1)
+
+        if method == 'nearest':
+            idx = np.clip(np.round(scaled).astype(int), 0, max_idx)
+            result = reachable[tuple(idx.T)]
+        elif method in ('all', 'any'):
+            low = np.clip(np.floor(scaled).astype(int), 0, max_idx)
+            high = np.clip(low + 1, 0, max_idx)
+            corners = []
+            for corner in np.ndindex(*((2, ) * len(self._shape))):
+                idx = np.where(np.array(corner, dtype=bool), high, low)
+                corners.append(reachable[tuple(idx.T)])
+            corners = np.array(corners)
+            result = corners.all(axis=0) if method == 'all' else \
+                corners.any(axis=0)
+        else:
+            raise ValueError('Unknown method {!r}; choose from: nearest, all, '
+                             'any'.format(method))
+
+        result &= inside
+        if single:
+            return bool(result[0])
+        return result
+
+    def check_path(self, points, method='nearest'):
+        '''True if every point of a trajectory is reachable'''
+        return bool(np.all(self.query(np.atleast_2d(points), method=method)))
+
+    def __repr__(self):
+        return ('{}(lower={!r}, upper={!r}, shape={!r})'
+                ''.format(self.__class__.__name__, self._lower.tolist(),
+                          self._upper.tolist(), self._shape))
@@ -0,0 +1,276 @@
+'''
+:mod:`ophyd.hkl.refine` - UB matrix and lattice refinement
+==========================================================
+
+.. module:: ophyd.hkl.refine
+   :synopsis: Least-squares refinement of the orientation and lattice of a
+       sample against many reflections
+'''
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from .geometry import (TAU, rotation_matrices)
+from .util import Lattice
+
+logger = logging.getLogger(__name__)
+
+
+LATTICE_PARAMETERS = Lattice._fields
+# Orientation (U matrix) rotations, plus the lattice parameters
+REFINE_PARAMETERS = ('U', ) + LATTICE_PARAMETERS
+
+Refinement = namedtuple('Refinement',
+                        'UB U B lattice rms iterations converged status')
+
+
+def _direct_matrix(lattice):
+    '''Direct lattice basis vectors (as columns) and their derivatives
+
+    Angles are in radians. Returns A and dA/dp for p in (a, b, c, alpha,
+    beta, gamma).
+    '''
+    a, b, c, alpha, beta, gamma = lattice
+    ca, cb, cg = np.cos((alpha, beta, gamma))
+    sa, sb, sg = np.sin((alpha, beta, gamma))
+
+    cx = cb
+    cy = (ca - cb * cg) / sg
+    cz = np.sqrt(1.0 - cx ** 2 - cy ** 2)
+
+    e_a = np.array([1., 0., 0.])
+    e_b = np.array([cg, sg, 0.])
+    e_c = np.array([cx, cy, cz])
+    A = np.column_stack((a * e_a, b * e_b, c * e_c))
+
+    dA = np.zeros((6, 3, 3))
+    dA[0, :, 0] = e_a
+    dA[1, :, 1] = e_b
+    dA[2, :, 2] = e_c
+
+    # alpha
+    dcy = -sa / sg
+    dA[3, :, 2] = c * np.array([0., dcy, -cy * dcy / cz])
+    # beta
+    dcx = -sb
+    dcy = sb * cg / sg
+    dA[4, :, 2] = c * np.array([dcx, dcy, -(cx * dcx + cy * dcy) / cz])
+    # gamma
+    dcy = (cb - ca * cg) / sg ** 2
+    dA[5, :, 1] = b * np.array([-sg, cg, 0.])
+    dA[5, :, 2] = c * np.array([0., dcy, -cy * dcy / cz])
+    return A, dA
+
+
+def lattice_B(lattice, degrees=True):
+    '''The B matrix of a lattice
+
+    B transforms hkl to the reciprocal lattice vector in an orthonormal frame
+    (including the factor of 2 pi, as in the hkl library). Its orientation may
+    differ from the hkl library B by a rotation.
+
+    Parameters
+    ----------
+    lattice : sequence of float
+        (a, b, c, alpha, beta, gamma)
+    degrees : bool, optional
+        Angles are in degrees (otherwise radians)
+    '''
+    lattice = _to_radians(lattice, degrees)
+    A, _ = _direct_matrix(lattice)
+    return TAU * np.linalg.inv(A).T
+
+
+def _to_radians(lattice, degrees):
+    lattice = np.asarray(lattice, dtype=float)
+    if degrees:
+        lattice = np.concatenate((lattice[:3], np.radians(lattice[3:])))
+    return lattice
+
+
+def _nearest_rotation(mat):
+    '''The rotation matrix nearest to mat'''
+    u, s, vt = np.linalg.svd(mat)
+    rot = np.dot(u, vt)
+    if np.linalg.det(rot) < 0:
+        u[:, -1] *= -1
+        rot = np.dot(u, vt)
+    return rot
+
+
+def _skew(vectors):
+    '''Cross-product matrices [v]x for each vector, shape (N, 3, 3)'''
+    x, y, z = vectors.T
+    zero = np.zeros_like(x)
+    return np.stack((np.stack((zero, -z, y), axis=-1),
+                     np.stack((z, zero, -x), axis=-1),
+                     np.stack((-y, x, zero), axis=-1)), axis=1)
+
+
+def refine_ub(hkl, q, lattice, U=None, UB=None,
+              refine=REFINE_PARAMETERS, weights=None, max_iter=50,
+              tolerance=1e-12, damping=1e-3):
+    '''Refine the orientation and lattice against many reflections
+
+    Minimizes sum(w * |U B h - q|^2) over the selected parameters with a
+    Levenberg-Marquardt iteration using analytic derivatives.
+
+    Parameters
+    ----------
+    hkl : array_like
+        Reflection indices, shape (N, 3)
+    q : array_like
+        Measured scattering vectors in the sample frame, shape (N, 3)
+    lattice : sequence of float
+        Starting lattice (a, b, c, alpha, beta, gamma), angles in degrees
+    U : array_like, optional
+        Starting orientation matrix, in the frame of `lattice_B`
+    UB : array_like, optional
+        Starting UB matrix, used to derive U if U is not specified. If
+        neither is given, U starts as the best rotation fit to the data.
+    refine : sequence of str, optional
+        Parameters to refine, from 'U' and the lattice parameter names
+    weights : array_like, optional
+        Weight of each reflection, shape (N, ) or (N, 3)
+    max_iter : int, optional
+        Maximum number of iterations
+    tolerance : float, optional
+        Stop when the relative change in the cost is below this
+    damping : float, optional
+        Initial Levenberg-Marquardt damping factor
+
+    Returns
+    -------
+    Refinement
+        The refined UB, U, B matrices and lattice (degrees), the weighted rms
+        residual, the number of iterations, whether it converged and the
+        reason it stopped: 'converged' (the cost change fell below the
+        tolerance, or the residual reached floating point precision),
+        'stalled' (no downhill step could be found) or 'max_iter'
+    '''
+    hkl = np.asarray(hkl, dtype=float).reshape(-1, 3)
+    q = np.asarray(q, dtype=float).reshape(-1, 3)
+    if len(hkl) != len(q):
+        raise ValueError('Number of hkl and q vectors differ')
+
+    unknown = set(refine) - set(REFINE_PARAMETERS)
+    if unknown:
+        raise ValueError('Unknown refinement parameters: {}; choose from: {}'
+                         ''.format(', '.join(sorted(unknown)),
+                                   ', '.join(REFINE_PARAMETERS)))
+
+    refine_u = 'U' in refine
+    lattice_idx = [LATTICE_PARAMETERS.index(name) for name in
+                   LATTICE_PARAMETERS if name in refine]
+    num_params = 3 * refine_u + len(lattice_idx)
+    if 3 * len(hkl) < num_params:
+        raise ValueError('Not enough reflections to refine {} parameters'
+                         ''.format(num_params))
+
+    if weights is None:
+        sqrt_w = np.ones((len(hkl), 1))
+    else:
+        sqrt_w = np.sqrt(np.asarray(weights, dtype=float))
+        sqrt_w = sqrt_w.reshape(len(hkl), -1)
+
+    params = _to_radians(lattice, True)
+
+    if U is None:
+        B = lattice_B(params, degrees=False)
+        if UB is not None:
+            U = np.dot(np.asarray(UB, dtype=float), np.linalg.inv(B))
+        else:
+            # best rotation taking B h onto q (Kabsch)
+            U = np.dot(q.T, np.dot(hkl, B.T))
+        U = _nearest_rotation(U)
+    U = np.asarray(U, dtype=float)
+
+    def evaluate(U, params, jacobian=True):
+        A, dA = _direct_matrix(params)
+        inv_A_T = np.linalg.inv(A).T
+        B = TAU * inv_A_T
+        bh = np.dot(hkl, B.T)
+        ubh = np.dot(bh, U.T)
+        resid = sqrt_w * (ubh - q)
+        if not jacobian:
+            return resid.ravel(), B
+
+        columns = []
+        if refine_u:
+            # d(R(d) v)/dd = -[v]x for a small rotation d applied to U
+            columns.append(-_skew(ubh))
+        for idx in lattice_idx:
+            dB = -np.dot(B, np.dot(dA[idx].T, inv_A_T))
+            columns.append(np.dot(hkl, np.dot(U, dB).T)[:, :, np.newaxis])
+
+        jac = np.concatenate(columns, axis=2) * sqrt_w[:, :, np.newaxis]
+        return resid.ravel(), B, jac.reshape(-1, num_params)
+
+    def step(U, params, delta):
+        U = U.copy()
+        params = params.copy()
+        if refine_u:
+            rot = delta[:3]
+            angle = np.linalg.norm(rot)
+            if angle > 0:
+                U = np.dot(rotation_matrices(rot, [angle])[0], U)
+            delta = delta[3:]
+        params[lattice_idx] += delta
+        return U, params
+
+    # cost of a residual at the floating point precision of the data
+    cost_floor = (np.finfo(float).eps ** 2 *
+                  np.sum((sqrt_w * q) ** 2) * 10.0)
+
+    resid, B, jac = evaluate(U, params)
+    cost = np.dot(resid, resid)
+    converged = (num_params == 0 or cost <= cost_floor)
+    status = 'converged' if converged else 'max_iter'
+    iteration = 0
+    while not converged and iteration < max_iter:
+        iteration += 1
+        grad = np.dot(jac.T, resid)
+        hess = np.dot(jac.T, jac)
+        diag = np.diag(np.diag(hess))
+
+        while True:
+            try:
+                delta = -np.linalg.solve(hess + damping * diag, grad)
+            except np.linalg.LinAlgError:
+                delta = -np.linalg.lstsq(hess + damping * diag, grad,
+                                         rcond=-1)[0]
+
+            new_U, new_params = step(U, params, delta)
+            new_resid, _ = evaluate(new_U, new_params, jacobian=False)
+            new_cost = np.dot(new_resid, new_resid)
+            if new_cost <= cost or damping > 1e10:
+                break
+            damping *= 10.0
+
+        if new_cost > cost:
+            # no downhill step could be found
+            status = 'stalled'
+            break
+
+        change = cost - new_cost
+        U, params = new_U, new_params
+        resid, B, jac = evaluate(U, params)
+        cost = np.dot(resid, resid)
+        damping = max(damping / 10.0, 1e-12)
+
+        if (change <= tolerance * max(cost, np.finfo(float).tiny) or
+                cost <= cost_floor):
+            converged = True
+            status = 'converged'
+
+    rms = np.sqrt(cost / max(len(resid), 1))
+    logger.debug('UB refinement finished after %d iterations (rms=%g, '
+                 'status=%s)', iteration, rms, status)
+
+    lattice = np.concatenate((params[:3], np.degrees(params[3:])))
+    lattice = Lattice(*lattice.tolist())
+    return Refinement(UB=np.dot(U, B), U=U, B=B, lattice=lattice, rms=rms,
+                      iterations=iteration, converged=converged,
+                      status=status)
@@ -0,0 +1,356 @@
+'''
+:mod:`ophyd.hkl.reflections` - Reflection tables
+================================================
+
+.. module:: ophyd.hkl.reflections
+   :synopsis: Enumeration of the reflections of a lattice within a Q or two
+       theta range
+'''
+
+import logging
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from . import parity
+from .geometry import TAU
+
+logger = logging.getLogger(__name__)
+
+
+reflection_dtype = np.dtype([('h', float), ('k', float), ('l', float),
+                             ('qx', float), ('qy', float), ('qz', float),
+                             ('q', float), ('d', float), ('two_theta', float),
+                             ('allowed', bool),
+                             ])
+
+# Reflection conditions for lattice centering
+_centering_conditions = {
+    'P': lambda h, k, l: np.ones(h.shape, dtype=bool),
+    'A': lambda h, k, l: (k + l) % 2 == 0,
+    'B': lambda h, k, l: (h + l) % 2 == 0,
+    'C': lambda h, k, l: (h + k) % 2 == 0,
+    'I': lambda h, k, l: (h + k + l) % 2 == 0,
+    'F': lambda h, k, l: (((h + k) % 2 == 0) & ((k + l) % 2 == 0)),
+    # rhombohedral, obverse setting on hexagonal axes
+    'R': lambda h, k, l: (-h + k + l) % 3 == 0,
+}
+
+centering_types = tuple(sorted(_centering_conditions))
+
+
+def centering_allowed(hkl, centering):
+    '''Mask of reflections allowed by the lattice centering
+
+    Parameters
+    ----------
+    hkl : array_like
+        Integer reflection indices, shape (N, 3)
+    centering : {'P', 'A', 'B', 'C', 'I', 'F', 'R'}
+        Lattice centering
+
+    Returns
+    -------
+    ndarray
+        Boolean mask, shape (N, )
+    '''
+    try:
+        condition = _centering_conditions[centering]
+    except KeyError:
+        raise ValueError('Unknown centering {!r}; choose from: {}'
+                         ''.format(centering, ', '.join(centering_types)))
+
+    h, k, l = np.round(np.asarray(hkl, dtype=float)).astype(int).T
+    return condition(h, k, l)
+
+
+def hkl_array(table):
+    '''Reflection indices of a table as an array of shape (N, 3)
+
+    Accepts either a table from `iter_reflections` or an hkl array.
+    '''
+    table = np.asarray(table)
+    if table.dtype.names:
+        return np.column_stack((table['h'], table['k'], table['l']))
+    return table.reshape(-1, 3).astype(float)
+
+
+def _q_limit(q_max, two_theta_max, wavelength, degrees):
+    limits = []
+    if q_max is not None:
+        limits.append(float(q_max))
+
+    if wavelength is not None:
+        k = TAU / wavelength
+        if two_theta_max is not None:
+            if degrees:
+                two_theta_max = np.radians(two_theta_max)
+            two_theta_max = min(two_theta_max, np.pi)
+            limits.append(2 * k * np.sin(two_theta_max / 2.0))
+        else:
+            # beyond back-scattering
+            limits.append(2 * k)
+    elif two_theta_max is not None:
+        raise ValueError('A wavelength is required to limit two theta')
+
+    if not limits:
+        raise ValueError('Either q_max, or a wavelength is required')
+    return min(limits)
+
+
+def iter_reflections(B, q_max=None, two_theta_max=None, wavelength=None,
+                     UB=None, centering=None, remove_extinct=False,
+                     degrees=True, chunk_size=100000):
+    '''Generate the reflections within a Q or two theta range in chunks
+
+    Reflections are enumerated in slabs of constant h, so that no more than
+    about `chunk_size` candidate indices are held in memory at once.
+
+    Parameters
+    ----------
+    B : array_like
+        The B matrix, shape (3, 3)
+    q_max : float, optional
+        Maximum scattering vector length
+    two_theta_max : float, optional
+        Maximum scattering angle (requires `wavelength`)
+    wavelength : float, optional
+        Wavelength, in the length units of B. Without a wavelength, two theta
+        is NaN. Otherwise, reflections are limited to those reachable.
+    UB : array_like, optional
+        If specified, Q vectors are UB h instead of B h
+    centering : {'P', 'A', 'B', 'C', 'I', 'F', 'R'}, optional
+        Lattice centering used to set the `allowed` field
+    remove_extinct : bool, optional
+        Drop reflections which are not allowed by the centering
+    degrees : bool, optional
+        Two theta is in degrees (otherwise radians)
+    chunk_size : int, optional
+        Approximate number of candidate indices per chunk
+
+    Yields
+    ------
+    table : ndarray
+        Structured array of dtype `reflection_dtype`
+    '''
+    B = np.asarray(B, dtype=float)
+    if UB is None:
+        UB = B
+    UB = np.asarray(UB, dtype=float)
+
+    q_max = _q_limit(q_max, two_theta_max, wavelength, degrees)
+
+    # h_i = a_i . (B h) / 2 pi, so |h_i| <= |a_i| q_max / 2 pi
+    direct = TAU * np.linalg.inv(B).T
+    limits = np.floor(np.linalg.norm(direct, axis=0) * q_max / TAU)
+    h_max, k_max, l_max = limits.astype(int)
+
+    k_range = np.arange(-k_max, k_max + 1)
+    l_range = np.arange(-l_max, l_max + 1)
+    plane = np.stack(np.meshgrid(k_range, l_range, indexing='ij'),
+                     axis=-1).reshape(-1, 2)
+    slabs = max(1, chunk_size // len(plane))
+
+    for h_start in range(-h_max, h_max + 1, slabs):
+        h_values = np.arange(h_start, min(h_start + slabs, h_max + 1))
+        hkl = np.empty((len(h_values) * len(plane), 3))
+        hkl[:, 0] = np.repeat(h_values, len(plane))
+        hkl[:, 1:] = np.tile(plane, (len(h_values), 1))
+
+        q_len = np.linalg.norm(np.dot(hkl, B.T), axis=1)
+        keep = (q_len <= q_max) & (q_len > 0)
+        if centering is not None:
+            allowed = centering_allowed(hkl, centering)
+            if remove_extinct:
+                keep &= allowed
+            allowed = allowed[keep]
+        else:
+            allowed = True
+
+        hkl = hkl[keep]
+        q_len = q_len[keep]
+        if not len(hkl):
+            continue
+
+        table = np.zeros(len(hkl), dtype=reflection_dtype)
+        table['h'], table['k'], table['l'] = hkl.T
+        table['qx'], table['qy'], table['qz'] = np.dot(hkl, UB.T).T
+        table['q'] = q_len
+        table['d'] = TAU / q_len
+        if wavelength is None:
+            table['two_theta'] = np.nan
+        else:
+            two_theta = 2 * np.arcsin(np.clip(q_len * wavelength / (2 * TAU),
+                                              0.0, 1.0))
+            if degrees:
+                two_theta = np.degrees(two_theta)
+            table['two_theta'] = two_theta
+        table['allowed'] = allowed
+        yield table
+
+
+def reflection_table(B, **kwargs):
+    '''All reflections within a Q or two theta range, sorted by Q
+
+    Keyword arguments are passed to `iter_reflections`.
+
+    Returns
+    -------
+    table : ndarray
+        Structured array of dtype `reflection_dtype`
+    '''
+    chunks = list(iter_reflections(B, **kwargs))
+    if not chunks:
+        return np.zeros(0, dtype=reflection_dtype)
+
+    table = np.concatenate(chunks)
+    return table[np.argsort(table['q'], kind='mergesort')]
+
+
+_hkl_columns = ('h', 'k', 'l')
+_wavelength_columns = ('wavelength', 'lambda')
+
+
+def read_reflections(fname, delimiter=None, scan=None):
+    '''Read a table of measured reflections
+
+    Text files have a header line naming the columns, followed by one
+    reflection per line. Columns are separated by commas (if the header
+    contains any, or the file name ends with .csv) or by whitespace, and
+    lines starting with # are ignored. The h, k and l columns are required;
+    a wavelength (or lambda) column is optional and the remaining columns are
+    motor positions.
+
+    SPEC data files (with ``#S`` scan and ``#L`` column label lines) are
+    read from one scan, whose columns are handled as above. The wavelength
+    is not read from the ``#G`` geometry lines.
+
+    A directory is read as a SPEC reference session, with hkl and motor
+    position tables (see `parity.load_reference`).
+
+    npz files contain an 'hkl' array of shape (N, 3), and optionally
+    'positions' of shape (N, num_real) with 'axis_names', and 'wavelength'.
+
+    Parameters
+    ----------
+    fname : str
+        The file or directory name
+    delimiter : str, optional
+        Column delimiter of text files, overriding the automatic choice
+    scan : int, optional
+        Scan number to read from a SPEC data file. Defaults to the last.
+
+    Returns
+    -------
+    hkl : ndarray
+        shape (N, 3)
+    positions : OrderedDict
+        Axis name to positions, shape (N, ), in file order
+    wavelength : ndarray or None
+        shape (N, ), if given in the file
+    '''
+    if os.path.isdir(fname):
+        session = parity.load_reference(fname)
+        positions = OrderedDict(zip(session.axis_names, session.positions.T))
+        return session.hkl, positions, None
+    elif os.path.splitext(fname)[1].lower() == '.npz':
+        return _read_npz(fname)
+
+    with open(fname, 'rt') as f:
+        lines = [line.strip() for line in f]
+
+    if any(line.startswith('#S ') for line in lines):
+        names, data = _read_spec_scan(fname, lines, scan)
+        return _split_columns(fname, names, data)
+
+    lines = [line for line in lines if line and not line.startswith('#')]
+    if not lines:
+        raise ValueError('No reflections found in {}'.format(fname))
+
+    header = lines[0]
+    if delimiter is None and (',' in header or
+                              fname.lower().endswith('.csv')):
+        delimiter = ','
+
+    names = [name.strip() for name in header.split(delimiter)]
+    data = np.array([[float(value) for value in line.split(delimiter)]
+                     for line in lines[1:]], dtype=float)
+    return _split_columns(fname, names, data.reshape(-1, len(names)))
+
+
+def _read_spec_scan(fname, lines, scan):
+    '''Column labels and data of one scan of a SPEC data file'''
+    scans = OrderedDict()
+    current = None
+    for line in lines:
+        if line.startswith('#S '):
+            current = scans[int(line.split()[1])] = [None, []]
+        elif current is None:
+            continue
+        elif line.startswith('#L '):
+            # labels may contain single spaces, such as "Two Theta"
+            current[0] = re.split(r'\s{2,}', line[3:].strip())
+        elif line and not line.startswith('#') and current[0] is not None:
+            current[1].append([float(value) for value in line.split()])
+
+    if scan is None:
+        scan = list(scans)[-1]
+    try:
+        names, rows = scans[scan]
+    except KeyError:
+        raise ValueError('Scan {} not found in {}'.format(scan, fname))
+
+    if names is None or not rows:
+        raise ValueError('No reflections found in scan {} of {}'
+                         ''.format(scan, fname))
+    return names, np.array(rows, dtype=float).reshape(-1, len(names))
+
+
+def _split_columns(fname, names, data):
+    '''Split a table into hkl, positions and wavelength by column name'''
+    lower = [name.lower() for name in names]
+    missing = [name for name in _hkl_columns if name not in lower]
+    if missing:
+        raise ValueError('Missing columns in {}: {}'
+                         ''.format(fname, ', '.join(missing)))
+
+    hkl = np.column_stack([data[:, lower.index(name)]
+                           for name in _hkl_columns])
+
+    wavelength = None
+    positions = OrderedDict()
+    for idx, name in enumerate(names):
+        if lower[idx] in _hkl_columns:
+            continue
+        elif lower[idx] in _wavelength_columns:
+            wavelength = data[:, idx]
+        else:
+            positions[name] = data[:, idx]
+
+    return hkl, positions, wavelength
+
+
+def _read_npz(fname):
+    with np.load(fname) as data:
+        hkl = np.asarray(data['hkl'], dtype=float).reshape(-1, 3)
+
+        positions = OrderedDict()
+        if 'positions' in data:
+            values = np.asarray(data['positions'], dtype=float)
+            values = values.reshape(len(hkl), -1)
+            if 'axis_names' in data:
+                names = [str(name) for name in data['axis_names']]
+            else:
+                names = ['axis{}'.format(i) for i in range(values.shape[1])]
+            for name, column in zip(names, values.T):
+                positions[name] = column
+
+        wavelength = None
+        if 'wavelength' in data:
+            wavelength = np.broadcast_to(np.asarray(data['wavelength'],
+                                                    dtype=float),
+                                         (len(hkl), )).copy()
+
+    return hkl, positions, wavelength
@@ -6,6 +6,10 @@ import numpy as np
 from .engine import Parameter
 from .util import hkl_module
 from . import util
+from . import geometry
+from . import indexing
+from . import reflections as refl_mod
+from . import refine as refine_mod
 from .util import Lattice
 from .context import TemporaryGeometry
 
@@ -87,6 +91,8 @@ class HklSample(object):
         self._calc = calc
         self._sample = sample
         self._sample_dict = calc._samples
+        self._cache = {}
+        self._version = 0
 
         self._unit_name = units
         try:
@@ -111,6 +117,27 @@ class HklSample(object):
             raise ValueError('Unsupported kwargs for HklSample: %s' %
                              tuple(kwargs.keys()))
 
+    def _invalidate(self):
+        '''Drop cached values after the sample has been modified'''
+        self._cache.clear()
+        self._version += 1
+
+    def _cached(self, key, fcn):
+        '''Get a cached value, calculating it with fcn() if necessary'''
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = fcn()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._cache[key] = value
+            return value
+
+    @property
+    def version(self):
+        '''Modification counter, incremented on every change to the sample'''
+        return self._version
+
     @property
     def hkl_calc(self):
         '''
@@ -153,10 +180,13 @@ class HklSample(object):
     @property
     def reciprocal(self):
         '''The reciprocal lattice'''
-        lattice = self._sample.lattice_get()
-        reciprocal = lattice.copy()
-        lattice.reciprocal(reciprocal)
-        return reciprocal.get(self._units)
+        def get_reciprocal():
+            lattice = self._sample.lattice_get()
+            reciprocal = lattice.copy()
+            lattice.reciprocal(reciprocal)
+            return reciprocal.get(self._units)
+
+        return self._cached('reciprocal', get_reciprocal)
 
     @property
     def lattice(self):
@@ -165,9 +195,11 @@ class HklSample(object):
         a, b, c [nm]
         alpha, beta, gamma [deg]
         '''
-        lattice = self._sample.lattice_get()
-        lattice = lattice.get(self._units)
-        return Lattice(*lattice)
+        def get_lattice():
+            lattice = self._sample.lattice_get()
+            return Lattice(*lattice.get(self._units))
+
+        return self._cached('lattice', get_lattice)
 
     @lattice.setter
     def lattice(self, lattice):
@@ -178,6 +210,7 @@ class HklSample(object):
 
         check_lattice(lattice)
         self._sample.lattice_set(lattice)
+        self._invalidate()
         # TODO: notes mention that lattice should not change, but is it alright
         #       if init() is called again? or should reflections be cleared,
         #       etc?
@@ -185,13 +218,22 @@ class HklSample(object):
     @property
     def U(self):
         '''
-        The crystal orientation matrix, U
+        The crystal orientation matrix, U (read-only array)
         '''
-        return util.to_numpy(self._sample.U_get())
+        return self._cached('U', lambda: util.to_numpy(self._sample.U_get()))
 
     @U.setter
     def U(self, new_u):
         self._sample.U_set(util.to_hkl(new_u))
+        self._invalidate()
+
+    @property
+    def B(self):
+        '''
+        The transition matrix of the reciprocal lattice in an orthonormal
+        system, B = U^-1 * UB (read-only array)
+        '''
+        return self._cached('B', lambda: np.dot(self.U.T, self.UB))
 
     def _get_parameter(self, param):
         return Parameter(param, units=self._unit_name)
@@ -226,12 +268,15 @@ class HklSample(object):
 
         If written to, the B matrix will be kept constant:
             U * B = UB -> U = UB * B^-1
+
+        The returned array is read-only.
         '''
-        return util.to_numpy(self._sample.UB_get())
+        return self._cached('UB', lambda: util.to_numpy(self._sample.UB_get()))
 
     @UB.setter
     def UB(self, new_ub):
         self._sample.UB_set(util.to_hkl(new_ub))
+        self._invalidate()
 
     def _create_reflection(self, h, k, l, detector=None):
         '''
@@ -259,7 +304,10 @@ class HklSample(object):
         r2 : HklReflection
             Reflection 2
         '''
-        return self._sample.compute_UB_busing_levy(r1, r2)
+        try:
+            return self._sample.compute_UB_busing_levy(r1, r2)
+        finally:
+            self._invalidate()
 
     @property
     def reflections(self):
@@ -267,13 +315,27 @@ class HklSample(object):
         All reflections for the current sample in the form:
             [(h, k, l), ...]
         '''
-        return [refl.hkl_get() for refl in self._sample.reflections_get()]
+        hkl = self._cached('reflections',
+                           lambda: [refl.hkl_get() for refl in
+                                    self._sample.reflections_get()])
+        return list(hkl)
 
     @reflections.setter
     def reflections(self, refls):
         self.clear_reflections()
-        for refl in refls:
-            self.add_reflection(*refl)
+        refls = [tuple(refl) for refl in refls]
+        if all(len(refl) == 3 for refl in refls):
+            self.add_reflections(refls)
+        elif all(len(refl) == 4 for refl in refls):
+            # as with add_reflection, no position means the current one
+            current = self._calc.physical_positions
+            positions = [current if refl[3] is None else refl[3]
+                         for refl in refls]
+            self.add_reflections([refl[:3] for refl in refls],
+                                 positions=positions)
+        else:
+            for refl in refls:
+                self.add_reflection(*refl)
 
     def add_reflection(self, h, k, l, position=None, detector=None, compute_ub=False):
         '''Add a reflection, optionally specifying the detector to use
@@ -310,19 +372,136 @@ class HklSample(object):
             if position is not None:
                 calc.physical_positions = position
             r2 = self._sample.add_reflection(calc._geometry, detector, h, k, l)
+            self._invalidate()
 
         if compute_ub:
             self.compute_UB(r1, r2)
 
         return r2
 
+    def add_reflections(self, hkl, positions=None, wavelength=None,
+                        detector=None, compute_ub=False):
+        '''Add many reflections at once
+
+        The geometry is saved and restored once for the whole set.
+
+        Parameters
+        ----------
+        hkl : array_like
+            Reflection indices, shape (N, 3)
+        positions : array_like, optional
+            Physical motor positions of each reflection, shape (N, num_real),
+            in the units of the calculation class. If not specified, the
+            current geometry is used for all reflections.
+        wavelength : float or array_like, optional
+            Wavelength of all reflections, or of each one, shape (N, ). If not
+            specified, the current wavelength is used.
+        detector : Hkl.Detector, optional
+            The detector
+        compute_ub : bool, optional
+            Calculate the UB matrix with the last two reflections
+
+        Returns
+        -------
+        list
+            The new reflections
+        '''
+        calc = self._calc
+        if detector is None:
+            detector = calc._detector
+
+        hkl = np.asarray(hkl, dtype=float).reshape(-1, 3)
+        if positions is not None:
+            positions = np.asarray(positions, dtype=float)
+            positions = positions.reshape(len(hkl), -1)
+        if wavelength is not None:
+            wavelength = np.broadcast_to(np.asarray(wavelength, dtype=float),
+                                         (len(hkl), ))
+
+        if compute_ub and len(self.reflections) + len(hkl) < 2:
+            raise RuntimeError('Cannot calculate the UB matrix with less than '
+                               'two reflections')
+
+        units = calc._units
+        geometry = calc._geometry
+        added = []
+        with TemporaryGeometry(calc):
+            try:
+                for i, (h, k, l) in enumerate(hkl.tolist()):
+                    if wavelength is not None:
+                        geometry.wavelength_set(wavelength[i], units)
+                    if positions is not None:
+                        geometry.axis_values_set(positions[i].tolist(), units)
+                    added.append(self._sample.add_reflection(
+                        geometry, detector, h, k, l))
+            finally:
+                self._invalidate()
+
+        if compute_ub:
+            refls = self._sample.reflections_get()
+            self.compute_UB(refls[-2], refls[-1])
+
+        return added
+
+    def load_reflections(self, fname, axis_map=None, compute_ub=False,
+                         **kwargs):
+        '''Add reflections from a text, CSV, SPEC or npz file
+
+        See `reflections.read_reflections` for the file formats. Position
+        columns are matched to the physical axes by name (ignoring case).
+
+        Parameters
+        ----------
+        fname : str
+            The file name
+        axis_map : dict, optional
+            Map of column names to physical axis names, for columns which are
+            named differently
+        compute_ub : bool, optional
+            Calculate the UB matrix with the last two reflections
+
+        Keyword arguments are passed to `reflections.read_reflections`.
+
+        Returns
+        -------
+        list
+            The new reflections
+        '''
+        hkl, columns, wavelength = refl_mod.read_reflections(fname, **kwargs)
+
+        positions = None
+        if columns:
+            if axis_map is None:
+                axis_map = {}
+            axis_map = dict((key.lower(), value.lower())
+                            for key, value in axis_map.items())
+            columns = dict((axis_map.get(name.lower(), name.lower()), values)
+                           for name, values in columns.items())
+
+            axis_names = self._calc.physical_axis_names
+            missing = [name for name in axis_names
+                       if name.lower() not in columns]
+            if missing:
+                raise ValueError('No column found for axes: {}'
+                                 ''.format(', '.join(missing)))
+
+            positions = np.column_stack([columns[name.lower()]
+                                         for name in axis_names])
+
+        return self.add_reflections(hkl, positions=positions,
+                                    wavelength=wavelength,
+                                    compute_ub=compute_ub)
+
     def remove_reflection(self, refl):
         '''Remove a specific reflection'''
         if not isinstance(refl, hkl_module.SampleReflection):
             index = self.reflections.index(refl)
             refl = self._sample.reflections_get()[index]
 
-        return self._sample.del_reflection(refl)
+        try:
+            return self._sample.del_reflection(refl)
+        finally:
+            self._invalidate()
 
     def clear_reflections(self):
         '''Clear all reflections for the current sample'''
@@ -330,9 +509,40 @@ class HklSample(object):
         for refl in reflections:
             self._sample.del_reflection(refl)
 
-    def _refl_matrix(self, fcn):
+        self._invalidate()
+
+    def _reflection_vectors(self):
+        '''Reflection hkl and measured Q (in the sample frame) arrays
+
+        Q is None if the geometry has no vectorized implementation.
+        '''
+        def get_vectors():
+            refls = self._sample.reflections_get()
+            hkl = np.array([refl.hkl_get() for refl in refls],
+                           dtype=float).reshape(-1, 3)
+
+            dtype = self._calc._dtype
+            if dtype not in geometry.geometries:
+                return hkl, None
+
+            units = self._calc._units
+            default_units = util.units['default']
+            geometries = [refl.geometry_get() for refl in refls]
+            if not geometries:
+                return hkl, np.zeros((0, 3))
+
+            real = [geo.axis_values_get(units) for geo in geometries]
+            wavelengths = [geo.wavelength_get(default_units)
+                           for geo in geometries]
+            q = geometry.sample_q(dtype, real, wavelengths,
+                                  degrees=(self._calc.units == 'user'))
+            return hkl, q
+
+        return self._cached('reflection_vectors', get_vectors)
+
+    def _refl_matrix(self, fcn, upper=False, start=0):
         '''
-        Get a reflection angle matrix
+        Get a reflection angle matrix from the hkl library, pair by pair
         '''
         sample = self._sample
         refl = sample.reflections_get()
@@ -340,24 +550,278 @@ class HklSample(object):
 
         for i, r1 in enumerate(refl):
             for j, r2 in enumerate(refl):
-                if i != j:
-                    refl_matrix[i, j] = fcn(r1, r2)
+                if i == j or (upper and j < i):
+                    continue
+                elif i < start and j < start:
+                    continue
+                refl_matrix[i, j] = fcn(r1, r2)
 
         return refl_matrix
 
+    def reflection_angles(self, measured=True, upper=False, start=0):
+        '''Angles between all pairs of reflections, in radians
+
+        Parameters
+        ----------
+        measured : bool, optional
+            Use the angles between the measured scattering vectors. If False,
+            use the theoretical angles between the reflection hkl vectors.
+        upper : bool, optional
+            Only calculate the upper triangle; the remainder is zero
+        start : int, optional
+            Only calculate pairs involving a reflection at index `start` or
+            later (e.g., the newly added reflections); the remainder is zero
+
+        Returns
+        -------
+        ndarray
+            Angle matrix, shape (num_reflections, num_reflections)
+        '''
+        hkl, q = self._reflection_vectors()
+        if measured:
+            if q is None:
+                fcn = self._sample.get_reflection_measured_angle
+                return self._refl_matrix(fcn, upper=upper, start=start)
+            vectors = q
+        else:
+            vectors = np.dot(hkl, self.B.T)
+
+        num = len(vectors)
+        angles = np.zeros((num, num))
+        if start >= num:
+            return angles
+
+        new = vectors[start:]
+        dot = np.dot(new, vectors.T)
+        cross = np.linalg.norm(np.cross(new[:, np.newaxis, :],
+                                        vectors[np.newaxis, :, :]), axis=2)
+        rows = np.arctan2(cross, dot)
+        rows[np.arange(num - start), np.arange(start, num)] = 0.0
+
+        angles[start:, :] = rows
+        angles[:, start:] = rows.T
+        if upper:
+            angles = np.triu(angles)
+        return angles
+
     @property
     def reflection_measured_angles(self):
-        return self._refl_matrix(self._sample.get_reflection_measured_angle)
+        return self.reflection_angles(measured=True)
 
     @property
     def reflection_theoretical_angles(self):
-        return self._refl_matrix(self._sample.get_reflection_theoretical_angle)
+        return self.reflection_angles(measured=False)
+
+    def refine(self, refine=refine_mod.REFINE_PARAMETERS, weights=None,
+               max_iter=50, tolerance=1e-12, apply=True):
+        '''Refine the orientation and lattice against all reflections
+
+        A least-squares fit of U and the lattice to the measured scattering
+        vectors of every reflection (see `refine.refine_ub`). Only available
+        for geometries in `geometry.geometries`.
+
+        Parameters
+        ----------
+        refine : sequence of str, optional
+            Parameters to refine, from 'U' and the lattice parameter names
+        weights : array_like, optional
+            Weight of each reflection, shape (num_reflections, )
+        max_iter : int, optional
+            Maximum number of iterations
+        tolerance : float, optional
+            Stop when the relative change in the cost is below this
+        apply : bool, optional
+            Write the refined lattice and UB matrix back into the sample
+
+        Returns
+        -------
+        refine.Refinement
+        '''
+        hkl, q = self._reflection_vectors()
+        if q is None:
+            raise ValueError('Refinement is not supported for the {!r} '
+                             'geometry'.format(self._calc._dtype))
+
+        lattice = self._sample.lattice_get().get(util.units['user'])
+        result = refine_mod.refine_ub(hkl, q, lattice, UB=self.UB,
+                                      refine=refine, weights=weights,
+                                      max_iter=max_iter, tolerance=tolerance)
+
+        if apply:
+            self.lattice = result.lattice
+            self.UB = result.UB
+
+        return result
+
+    def iter_reflections(self, q_max=None, two_theta_max=None,
+                         centering=None, remove_extinct=False, oriented=False,
+                         chunk_size=100000):
+        '''Generate the reflections of the sample in chunks
+
+        Reflections are limited to those reachable at the current wavelength,
+        and optionally to a maximum Q or two theta. See
+        `reflections.iter_reflections`.
+
+        Parameters
+        ----------
+        q_max : float, optional
+            Maximum scattering vector length
+        two_theta_max : float, optional
+            Maximum scattering angle
+        centering : {'P', 'A', 'B', 'C', 'I', 'F', 'R'}, optional
+            Lattice centering used to set the `allowed` field
+        remove_extinct : bool, optional
+            Drop reflections which are not allowed by the centering
+        oriented : bool, optional
+            Q vectors are UB h (otherwise B h)
+        chunk_size : int, optional
+            Approximate number of candidate indices per chunk
+
+        Yields
+        ------
+        table : ndarray
+            Structured array of dtype `reflections.reflection_dtype`
+        '''
+        wavelength = self._calc._geometry.wavelength_get(
+            util.units['default'])
+        return refl_mod.iter_reflections(
+            self.B, q_max=q_max, two_theta_max=two_theta_max,
+            wavelength=wavelength, UB=(self.UB if oriented else None),
+            centering=centering, remove_extinct=remove_extinct,
+            degrees=(self._unit_name == 'user'), chunk_size=chunk_size)
+
+    def reflection_table(self, **kwargs):
+        '''All reflections of the sample, sorted by Q
+
+        Keyword arguments are passed to `iter_reflections`.
+
+        Returns
+        -------
+        table : ndarray
+            Structured array of dtype `reflections.reflection_dtype`
+        '''
+        chunks = list(self.iter_reflections(**kwargs))
+        if not chunks:
+            return np.zeros(0, dtype=refl_mod.reflection_dtype)
+
+        table = np.concatenate(chunks)
+        return table[np.argsort(table['q'], kind='mergesort')]
+
+    def auto_index(self, positions, wavelength=None, apply=False, **kwargs):
+        '''Find the UB matrix from peaks of unknown hkl
+
+        Candidate orientations are built from pairs of peaks matched against
+        a table of reflections of the current lattice, and scored against
+        all peaks (see `indexing.auto_index`, which also takes the keyword
+        arguments). Only available for geometries in `geometry.geometries`.
+
+        Parameters
+        ----------
+        positions : array_like
+            Real positions of the peaks, shape (N, num_real)
+        wavelength : float or array_like, optional
+            Wavelength of the peaks, in nm. Defaults to the current
+            wavelength.
+        apply : bool, optional
+            Set the UB matrix of the sample to the best candidate
+
+        Returns
+        -------
+        indexing.IndexResult
+        '''
+        calc = self._calc
+        if calc._dtype not in geometry.geometries:
+            raise ValueError('Indexing is not supported for the {!r} '
+                             'geometry'.format(calc._dtype))
+
+        if wavelength is None:
+            wavelength = calc._geometry.wavelength_get(util.units['default'])
+
+        q = geometry.sample_q(calc._dtype, positions, wavelength,
+                              degrees=(calc.units == 'user'))
+        result = indexing.auto_index(q, self.B, **kwargs)
+
+        if apply:
+            self.UB = result.UB
+
+        return result
 
     def affine(self):
         '''
         Make the sample transform affine
         '''
-        return self._sample.affine()
+        try:
+            return self._sample.affine()
+        finally:
+            self._invalidate()
+
+    def get_state(self):
+        '''The sample state as a JSON-serializable dictionary
+
+        Includes the name, lattice, UB matrix and all reflections with the
+        geometry they were measured at. Restore with `from_state`.
+        '''
+        calc = self._calc
+        units = calc._units
+        user_units = util.units['user']
+
+        reflections = []
+        for refl in self._sample.reflections_get():
+            geometry = refl.geometry_get()
+            reflections.append(
+                {'hkl': list(refl.hkl_get()),
+                 'position': list(geometry.axis_values_get(units)),
+                 'wavelength': geometry.wavelength_get(units),
+                 })
+
+        lattice = self._sample.lattice_get().get(user_units)
+        return {'name': self.name,
+                'lattice': list(lattice),
+                'UB': self.UB.tolist(),
+                'reflections': reflections,
+                }
+
+    def _apply_state(self, state):
+        '''Apply a state from `get_state` to this sample'''
+        calc = self._calc
+        geometry_units = calc._units
+
+        self.lattice = state['lattice']
+        self.clear_reflections()
+        with TemporaryGeometry(calc):
+            detector = calc._detector
+            for refl in state['reflections']:
+                geometry = calc._geometry
+                geometry.wavelength_set(refl['wavelength'], geometry_units)
+                geometry.axis_values_set(refl['position'], geometry_units)
+                self._sample.add_reflection(geometry, detector,
+                                            *refl['hkl'])
+            self._invalidate()
+
+        self.UB = state['UB']
+
+    @classmethod
+    def from_state(cls, calc, state, units='user'):
+        '''Create a sample from a state dictionary
+
+        Parameters
+        ----------
+        calc : instance of CalcRecip
+            Reciprocal space calculation class
+        state : dict
+            Sample state, as returned by `get_state`
+        units : {'user', 'default'}
+            Units to use
+
+        Returns
+        -------
+        sample : HklSample
+            The new sample. It is not added to the calculation class.
+        '''
+        sample = cls(calc, sample=hkl_module.Sample.new(state['name']),
+                     units=units)
+        sample._apply_state(state)
+        return sample
 
     def _repr_info(self):
         repr = ['name={!r}'.format(self.name),
@@ -0,0 +1,346 @@
+'''
+:mod:`ophyd.hkl.selection` - Forward solution selection
+=======================================================
+
+.. module:: ophyd.hkl.selection
+   :synopsis: Vectorized selection of one real position per point from
+       batched forward calculation results
+'''
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _valid_mask(solutions, num_solutions):
+    return np.arange(solutions.shape[1]) < num_solutions[:, np.newaxis]
+
+
+def _distance(diff, weights, metric):
+    diff = np.abs(diff)
+    if weights is not None:
+        diff = diff * np.asarray(weights, dtype=float)
+    if metric == 'sum':
+        return diff.sum(axis=-1)
+    elif metric == 'max':
+        return diff.max(axis=-1)
+    raise ValueError('Unknown metric {!r}; choose from: sum, max'
+                     ''.format(metric))
+
+
+def transition_costs(solutions, weights=None, metric='sum'):
+    '''Cost of moving between each pair of solutions of consecutive points
+
+    Parameters
+    ----------
+    solutions : ndarray
+        Solutions, shape (N, S, num_real), NaN where unused
+    weights : array_like, optional
+        Per-axis weight of the motion, shape (num_real, )
+    metric : {'sum', 'max'}, optional
+        Combine the weighted per-axis motion by sum (axes moved in turn) or
+        maximum (axes moved together)
+
+    Returns
+    -------
+    ndarray
+        Cost, shape (N - 1, S, S), indexed by [point, from, to]. Infinite
+        where either solution is unused.
+    '''
+    if metric not in ('sum', 'max'):
+        raise ValueError('Unknown metric {!r}; choose from: sum, max'
+                         ''.format(metric))
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+
+    num, width, num_real = solutions.shape
+    cost = np.zeros((max(num - 1, 0), width, width))
+    diff = np.empty_like(cost)
+    # one axis at a time, to avoid a (N - 1, S, S, num_real) temporary
+    for axis in range(num_real):
+        values = solutions[:, :, axis]
+        np.subtract(values[1:, np.newaxis, :], values[:-1, :, np.newaxis],
+                    out=diff)
+        np.abs(diff, out=diff)
+        if weights is not None:
+            diff *= weights[axis]
+        if metric == 'sum':
+            cost += diff
+        else:
+            np.maximum(cost, diff, out=cost)
+
+    cost[np.isnan(cost)] = np.inf
+    return cost
+
+
+def _chunk_bounds(solutions, chunk_size):
+    '''Ranges of points whose transitions are handled at once
+
+    Transitions take S * S values per point, so chunks are sized to bound
+    the memory used rather than processing the whole path.
+    '''
+    if chunk_size is None:
+        width = solutions.shape[1]
+        chunk_size = 2 ** 16 // max(width * width, 1)
+    chunk_size = max(int(chunk_size), 1)
+    for lo in range(0, len(solutions) - 1, chunk_size):
+        yield lo, min(lo + chunk_size, len(solutions) - 1)
+
+
+# widest solution axis for which select_min_travel uses the prefix scan
+_SCAN_MAX_WIDTH = 8
+
+
+def _scan(values, combine):
+    '''Inclusive scan of an associative operation along the first axis
+
+    Neighboring pairs are combined, the pairs are scanned recursively and
+    the even entries are filled in from them, so that the work is done in
+    O(log N) vectorized steps rather than N sequential ones.
+    '''
+    num = len(values)
+    if num < 2:
+        return values
+
+    sub = _scan(combine(values[0:num - 1:2], values[1:num:2]), combine)
+    out = np.empty_like(values)
+    out[0] = values[0]
+    out[1::2] = sub
+    out[2::2] = combine(sub[:(num - 1) // 2], values[2::2])
+    return out
+
+
+def _compose(first, second):
+    '''Apply the index maps `first` then `second`, shape (N, S)'''
+    rows = np.arange(len(first))[:, np.newaxis]
+    return second[rows, first]
+
+
+def _min_plus(first, second):
+    '''Min-plus matrix products of cost matrices, shape (N, S, S)'''
+    # accumulated over the inner index, to avoid an (N, S, S, S) temporary
+    out = first[:, :, :1] + second[:, :1, :]
+    term = np.empty_like(out)
+    for inner in range(1, first.shape[2]):
+        np.add(first[:, :, inner:inner + 1], second[:, inner:inner + 1, :],
+               out=term)
+        np.minimum(out, term, out=out)
+    return out
+
+
+def _start_index(solutions, valid, start, weights, metric):
+    '''Index of the solution of the first point'''
+    if start is None:
+        return 0
+    cost = _distance(solutions[0] - np.asarray(start, dtype=float), weights,
+                     metric)
+    cost[~valid[0]] = np.inf
+    return int(np.argmin(cost))
+
+
+def _solved(fcn):
+    '''Run a selection over the solved points only
+
+    Points without solutions are dropped before calling the selection, and
+    are given an index of -1 afterward.
+    '''
+    def wrapped(solutions, num_solutions, **kwargs):
+        solutions = np.asarray(solutions, dtype=float)
+        num_solutions = np.asarray(num_solutions, dtype=int)
+        solved = num_solutions > 0
+        index = np.full(len(solutions), -1, dtype=int)
+        if solved.any():
+            index[solved] = fcn(solutions[solved], num_solutions[solved],
+                                **kwargs)
+        return index
+
+    wrapped.__name__ = fcn.__name__
+    wrapped.__doc__ = fcn.__doc__
+    return wrapped
+
+
+@_solved
+def select_first(solutions, num_solutions):
+    '''Select the first solution of every point'''
+    return np.zeros(len(solutions), dtype=int)
+
+
+@_solved
+def select_weighted(solutions, num_solutions, weights=None, reference=None,
+                    metric='sum'):
+    '''Select the solution closest to a reference position at every point
+
+    Parameters
+    ----------
+    weights : array_like, optional
+        Per-axis cost weights, shape (num_real, )
+    reference : array_like, optional
+        Preferred real position, shape (num_real, ). Defaults to zero.
+    metric : {'sum', 'max'}, optional
+        Combine the weighted per-axis cost by sum or maximum
+    '''
+    if reference is None:
+        reference = np.zeros(solutions.shape[2])
+    cost = _distance(solutions - np.asarray(reference, dtype=float), weights,
+                     metric)
+    cost[~_valid_mask(solutions, num_solutions)] = np.inf
+    return np.argmin(cost, axis=1)
+
+
+@_solved
+def select_nearest(solutions, num_solutions, start=None, weights=None,
+                   metric='sum', chunk_size=None):
+    '''Select the solution nearest to that of the previous point
+
+    The choice at each point depends only on the choice at the previous one.
+    For each chunk of points, the nearest next solution from every solution
+    is found at once, and the resulting index maps are composed with a
+    parallel prefix scan.
+
+    Parameters
+    ----------
+    start : array_like, optional
+        Real position before the first point, used to select its solution.
+        Defaults to the first solution.
+    weights : array_like, optional
+        Per-axis weight of the motion, shape (num_real, )
+    metric : {'sum', 'max'}, optional
+        Combine the weighted per-axis motion by sum or maximum
+    chunk_size : int, optional
+        Number of transitions costed at once (defaults to a size bounding the
+        memory used)
+    '''
+    valid = _valid_mask(solutions, num_solutions)
+    index = np.empty(len(solutions), dtype=int)
+    current = _start_index(solutions, valid, start, weights, metric)
+    index[0] = current
+
+    for lo, hi in _chunk_bounds(solutions, chunk_size):
+        # step[n, t]: the solution chosen at point lo + n + 1 after t at the
+        # point before; composed, the choice after t at point lo
+        step = np.argmin(transition_costs(solutions[lo:hi + 1],
+                                          weights=weights, metric=metric),
+                         axis=2)
+        choices = _scan(step, _compose)
+        index[lo + 1:hi + 1] = choices[:, current]
+        current = index[hi]
+
+    return index
+
+
+@_solved
+def select_min_travel(solutions, num_solutions, start=None, weights=None,
+                      metric='sum', chunk_size=None):
+    '''Select solutions minimizing the total motion along the path
+
+    Solves for the globally optimal sequence (Viterbi). The best total cost
+    of reaching each solution of every point is found per chunk with a
+    parallel prefix scan of min-plus transition matrix products, along with
+    a backpointer per solution; the best sequence is then traced back by
+    composing the backpointers. As the scan does S ** 3 work per point for
+    S solutions, points with more than eight solutions use a sequential
+    forward pass instead.
+
+    Parameters
+    ----------
+    start : array_like, optional
+        Real position before the first point. The motion from it to the first
+        point is included in the total.
+    weights : array_like, optional
+        Per-axis weight of the motion, shape (num_real, )
+    metric : {'sum', 'max'}, optional
+        Combine the weighted per-axis motion by sum or maximum
+    chunk_size : int, optional
+        Number of transitions costed at once (defaults to a size bounding the
+        memory used)
+    '''
+    valid = _valid_mask(solutions, num_solutions)
+    if start is None:
+        cost = np.zeros(solutions.shape[1])
+    else:
+        cost = _distance(solutions[0] - np.asarray(start, dtype=float),
+                         weights, metric)
+    cost[~valid[0]] = np.inf
+
+    # back[n, s]: the best solution at point n - 1 given s at point n
+    back = np.zeros(solutions.shape[:2], dtype=int)
+    for lo, hi in _chunk_bounds(solutions, chunk_size):
+        # indexed by [point, from, to]
+        trans = transition_costs(solutions[lo:hi + 1], weights=weights,
+                                 metric=metric)
+        # best cost of reaching each solution of the points in the chunk
+        if trans.shape[1] <= _SCAN_MAX_WIDTH:
+            # from the min-plus products of the transitions leading there
+            reach = np.min(cost[:, np.newaxis] + _scan(trans, _min_plus),
+                           axis=1)
+        else:
+            # the scan does S times the work of a sequential pass, which is
+            # faster for many solutions per point
+            reach = np.empty(trans.shape[:2])
+            previous = cost
+            for n, step in enumerate(trans):
+                previous = reach[n] = np.min(previous[:, np.newaxis] + step,
+                                             axis=0)
+        before = np.concatenate((cost[np.newaxis], reach[:-1]))
+        back[lo + 1:hi + 1] = np.argmin(before[:, :, np.newaxis] + trans,
+                                        axis=1)
+        cost = reach[-1]
+
+    index = np.empty(len(solutions), dtype=int)
+    current = int(np.argmin(cost))
+    index[-1] = current
+    if len(solutions) > 1:
+        # trace[k, s]: the solution at point N - 2 - k given s at the last
+        trace = _scan(back[:0:-1], _compose)
+        index[-2::-1] = trace[:, current]
+    return index
+
+
+selection_strategies = {
+    'first': select_first,
+    'nearest': select_nearest,
+    'min_travel': select_min_travel,
+    'weighted': select_weighted,
+}
+
+
+def select_solutions(solutions, num_solutions, strategy='nearest', **kwargs):
+    '''Select one real position per point of batched forward results
+
+    Parameters
+    ----------
+    solutions : array_like
+        Solutions from `CalcRecip.forward_many`, shape (N, S, num_real)
+    num_solutions : array_like
+        Number of valid solutions for each point, shape (N, )
+    strategy : str or callable, optional
+        One of `selection_strategies`, or a function with the same signature
+        returning the selected index per point (-1 where unsolved)
+
+    Keyword arguments are passed to the strategy.
+
+    Returns
+    -------
+    real : ndarray
+        Selected real positions, shape (N, num_real). NaN where unsolved.
+    index : ndarray
+        Selected solution index, shape (N, ). -1 where unsolved.
+    '''
+    if callable(strategy):
+        fcn = strategy
+    else:
+        try:
+            fcn = selection_strategies[strategy]
+        except KeyError:
+            choices = ', '.join(sorted(selection_strategies))
+            raise ValueError('Unknown strategy {!r}; choose from: {}'
+                             ''.format(strategy, choices))
+
+    solutions = np.asarray(solutions, dtype=float)
+    index = np.asarray(fcn(solutions, num_solutions, **kwargs), dtype=int)
+    real = np.full((len(solutions), solutions.shape[2]), np.nan)
+    solved = index >= 0
+    real[solved] = solutions[solved, index[solved]]
+    return real, index
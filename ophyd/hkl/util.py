@@ -1,22 +1,115 @@
 from __future__ import print_function
 import logging
 import sys
+import threading
 from collections import namedtuple
+try:
+    from collections.abc import (Mapping, Sequence)
+except ImportError:
+    from collections import (Mapping, Sequence)
 
 import numpy as np
 
-try:
-    from gi.repository import Hkl as hkl_module
-    from gi.repository import GLib
-except ImportError as ex:
-    hkl_module = None
-    GLib = None
 
-    print('[!!] Failed to import Hkl library; diffractometer support '
-          'disabled ({})'.format(ex), file=sys.stderr)
+logger = logging.getLogger(__name__)
 
 
-logger = logging.getLogger(__name__)
+_gi_lock = threading.RLock()
+_gi_modules = {}
+
+
+def _load_gi():
+    '''Import the Hkl and GLib GObject introspection modules, once
+
+    Returns
+    -------
+    dict
+        Module name to module, empty if the Hkl library is unavailable
+    '''
+    if 'loaded' in _gi_modules:
+        # set only once the modules are in place
+        return _gi_modules
+
+    with _gi_lock:
+        if 'loaded' not in _gi_modules:
+            try:
+                from gi.repository import Hkl
+                from gi.repository import GLib
+            except ImportError as ex:
+                print('[!!] Failed to import Hkl library; diffractometer '
+                      'support disabled ({})'.format(ex), file=sys.stderr)
+            else:
+                _gi_modules['Hkl'] = Hkl
+                _gi_modules['GLib'] = GLib
+            _gi_modules['loaded'] = True
+
+    return _gi_modules
+
+
+class _LazyModule(object):
+    '''A GObject introspection module, imported on first attribute access
+
+    Evaluates as False if the module is unavailable. Unlike the module
+    attributes this replaces, which were None without the Hkl library, the
+    proxy is never None: test for availability with ``bool(hkl_module)``.
+    Accessing an attribute of an unavailable module raises AttributeError.
+    '''
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            # not forwarded, so that copying and pickling do not import
+            raise AttributeError(attr)
+
+        try:
+            module = _load_gi()[self._name]
+        except KeyError:
+            raise AttributeError('{} library is unavailable (accessing {!r})'
+                                 ''.format(self._name, attr))
+
+        value = getattr(module, attr)
+        # stored on the proxy, so that later lookups skip the import lock
+        self.__dict__[attr] = value
+        return value
+
+    def __bool__(self):
+        return self._name in _load_gi()
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self._name)
+
+
+hkl_module = _LazyModule('Hkl')
+GLib = _LazyModule('GLib')
+
+
+_factories = None
+
+
+def factories():
+    '''Diffractometer factories by type name, loaded once per process'''
+    global _factories
+
+    with _gi_lock:
+        if _factories is None:
+            _factories = dict(hkl_module.factories()) if hkl_module else {}
+    return _factories
+
+
+_geometry_templates = {}
+
+
+def new_geometry(dtype):
+    '''Create a new geometry, copied from a template per diffractometer type'''
+    with _gi_lock:
+        template = _geometry_templates.get(dtype)
+        if template is None:
+            template = factories()[dtype].create_new_geometry()
+            _geometry_templates[dtype] = template
+        return template.copy()
 
 
 def new_detector(dtype=0):
@@ -24,17 +117,57 @@ def new_detector(dtype=0):
     return hkl_module.Detector.factory_new(hkl_module.DetectorType(dtype))
 
 
-if hkl_module:
-    diffractometer_types = tuple(sorted(hkl_module.factories().keys()))
-    UserUnits = hkl_module.UnitEnum.USER
-    DefaultUnits = hkl_module.UnitEnum.DEFAULT
+class _LazyTypes(Sequence):
+    '''Sorted diffractometer type names, loaded on first use'''
+    def __init__(self):
+        self._value = None
+
+    def _types(self):
+        # built once; a concurrent first use at worst builds it twice
+        if self._value is None:
+            self._value = tuple(sorted(factories().keys()))
+        return self._value
+
+    def __getitem__(self, index):
+        return self._types()[index]
+
+    def __len__(self):
+        return len(self._types())
 
-    units = {'user': UserUnits,
-             'default': DefaultUnits
-             }
-else:
-    diffractometer_types = ()
-    units = {}
+    def __repr__(self):
+        return repr(self._types())
+
+
+class _LazyUnits(Mapping):
+    '''Unit name to Hkl.UnitEnum, loaded on first use'''
+    def __init__(self):
+        self._value = None
+
+    def _units(self):
+        if self._value is None:
+            if not hkl_module:
+                self._value = {}
+            else:
+                self._value = {'user': hkl_module.UnitEnum.USER,
+                               'default': hkl_module.UnitEnum.DEFAULT,
+                               }
+        return self._value
+
+    def __getitem__(self, key):
+        return self._units()[key]
+
+    def __iter__(self):
+        return iter(self._units())
+
+    def __len__(self):
+        return len(self._units())
+
+    def __repr__(self):
+        return repr(self._units())
+
+
+diffractometer_types = _LazyTypes()
+units = _LazyUnits()
 
 
 def to_numpy(mat):
@@ -51,12 +184,11 @@ def to_numpy(mat):
     if isinstance(mat, np.ndarray):
         return mat
 
-    ret = np.zeros((3, 3))
-    for i in range(3):
-        for j in range(3):
-            ret[i, j] = mat.get(i, j)
-
-    return ret
+    # the library only exposes single elements, so this takes nine calls;
+    # HklSample caches the converted matrices
+    get = mat.get
+    return np.fromiter((get(i, j) for i in range(3) for j in range(3)),
+                       dtype=float, count=9).reshape(3, 3)
 
 
 def to_hkl(arr):
@@ -111,8 +243,9 @@ _position_tuples = {}
 def get_position_tuple(axis_names, class_name='Position'):
     global _position_tuples
 
-    key = frozenset(axis_names)
+    # field order matters, so key on the ordered names
+    key = (class_name, tuple(axis_names))
     if key not in _position_tuples:
-        _position_tuples[key] = namedtuple(class_name, tuple(axis_names))
+        _position_tuples[key] = namedtuple(class_name, key[1])
 
     return _position_tuples[key]
@@ -379,3 +379,117 @@ class PseudoPositioner(Device, Positioner):
     def inverse(self, real_pos):
         '''Override me'''
         return self.PseudoPosition()
+
+    def forward_many(self, pseudo):
+        '''Forward-calculate an array of pseudo positions
+
+        The default implementation calls `forward` for each position.
+        Subclasses may override it with a vectorized calculation, which can be
+        checked against `forward` with `check_many`.
+
+        Parameters
+        ----------
+        pseudo : array_like
+            Pseudo positions, shape (N, num_pseudo)
+
+        Returns
+        -------
+        real : ndarray
+            Real positions, shape (N, num_real)
+        '''
+        pseudo = self._as_position_array(pseudo, len(self._pseudo))
+        return np.array([tuple(self.forward(self.PseudoPosition(*pos)))
+                         for pos in pseudo.tolist()],
+                        dtype=float).reshape(len(pseudo), len(self._real))
+
+    def inverse_many(self, real):
+        '''Inverse-calculate an array of real positions
+
+        The default implementation calls `inverse` for each position.
+        Subclasses may override it with a vectorized calculation, which can be
+        checked against `inverse` with `check_many`.
+
+        Parameters
+        ----------
+        real : array_like
+            Real positions, shape (N, num_real)
+
+        Returns
+        -------
+        pseudo : ndarray
+            Pseudo positions, shape (N, num_pseudo)
+        '''
+        real = self._as_position_array(real, len(self._real))
+        return np.array([tuple(self.inverse(self.RealPosition(*pos)))
+                         for pos in real.tolist()],
+                        dtype=float).reshape(len(real), len(self._pseudo))
+
+    @staticmethod
+    def _as_position_array(positions, num_axes):
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim == 1:
+            positions = positions.reshape(-1, num_axes)
+        if positions.ndim != 2 or positions.shape[1] != num_axes:
+            raise ValueError('Expected positions of shape (N, {})'
+                             ''.format(num_axes))
+        return positions
+
+    def check_many(self, pseudo=None, real=None, atol=1e-9, rtol=1e-9):
+        '''Check forward_many and inverse_many against the scalar methods
+
+        Both are called with their default arguments, so an override of
+        forward_many has to select the same solution as `forward` by
+        default for the check to apply.
+
+        Parameters
+        ----------
+        pseudo : array_like, optional
+            Pseudo positions to check forward_many with, shape
+            (N, num_pseudo)
+        real : array_like, optional
+            Real positions to check inverse_many with, shape (N, num_real)
+        atol : float, optional
+            Absolute tolerance
+        rtol : float, optional
+            Relative tolerance
+
+        Returns
+        -------
+        deviation : float
+            The maximum absolute deviation found
+
+        Raises
+        ------
+        ValueError
+            If the results differ by more than the tolerance
+        '''
+        deviation = 0.0
+        checks = []
+        if pseudo is not None:
+            checks.append(('forward', self.forward_many,
+                           PseudoPositioner.forward_many, pseudo))
+        if real is not None:
+            checks.append(('inverse', self.inverse_many,
+                           PseudoPositioner.inverse_many, real))
+
+        for name, many, scalar, positions in checks:
+            expected = scalar(self, positions)
+            result = np.asarray(many(positions), dtype=float)
+            if result.shape != expected.shape:
+                raise ValueError('{}_many returned shape {}, expected {}'
+                                 ''.format(name, result.shape, expected.shape))
+
+            if not np.allclose(result, expected, atol=atol, rtol=rtol,
+                               equal_nan=True):
+                bad = ~np.isclose(result, expected, atol=atol, rtol=rtol,
+                                  equal_nan=True)
+                num_bad = bad.any(axis=1).sum()
+                raise ValueError('{0}_many differs from {0} at {1} of {2} '
+                                 'positions'.format(name, num_bad,
+                                                    len(expected)))
+
+            diff = np.abs(result - expected)
+            if np.any(~np.isnan(diff)):
+                deviation = max(deviation, float(np.nanmax(diff)))
+
+        return deviation
@@ -0,0 +1,61 @@
+import logging
+import unittest
+
+from ophyd.hkl.cache import ForwardCache
+
+logger = logging.getLogger(__name__)
+
+
+class ForwardCacheTest(unittest.TestCase):
+    def test_lru(self):
+        cache = ForwardCache(maxsize=2)
+        cache.put('ctx', (1, 0, 0), 'a')
+        cache.put('ctx', (0, 1, 0), 'b')
+        self.assertEqual(cache.get('ctx', (1, 0, 0)), 'a')
+
+        # (0, 1, 0) is now the least recently used
+        cache.put('ctx', (0, 0, 1), 'c')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('ctx', (0, 1, 0)))
+        self.assertEqual(cache.get('ctx', (1, 0, 0)), 'a')
+        self.assertEqual(cache.get('ctx', (0, 0, 1)), 'c')
+
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses), (3, 1))
+        self.assertEqual((info.maxsize, info.currsize), (2, 2))
+
+    def test_resolution(self):
+        cache = ForwardCache(resolution=1e-6)
+        cache.put('ctx', (1, 0, 0), 'a')
+        self.assertEqual(cache.get('ctx', (1 + 1e-8, 0, 0)), 'a')
+        self.assertIsNone(cache.get('ctx', (1 + 1e-4, 0, 0)))
+
+    def test_context_change(self):
+        cache = ForwardCache()
+        cache.put('ctx1', (1, 0, 0), 'a')
+        self.assertIsNone(cache.get('ctx2', (1, 0, 0)))
+        self.assertEqual(len(cache), 0)
+        # the old context is gone for good
+        self.assertIsNone(cache.get('ctx1', (1, 0, 0)))
+
+    def test_origin(self):
+        cache = ForwardCache(origin_resolution=1e-3)
+        cache.put('ctx', (1, 0, 0), 'a', origin=(10.0, 20.0))
+        self.assertEqual(cache.get('ctx', (1, 0, 0), origin=(10.0001, 20.0)),
+                         'a')
+        self.assertIsNone(cache.get('ctx', (1, 0, 0), origin=(-10.0, 20.0)))
+        self.assertIsNone(cache.get('ctx', (1, 0, 0)))
+
+    def test_clear(self):
+        cache = ForwardCache()
+        cache.put('ctx', (1, 0, 0), 'a')
+        cache.get('ctx', (1, 0, 0))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.info().hits, 0)
+        self.assertRaises(ValueError, ForwardCache, maxsize=0)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,166 @@
+import json
+import logging
+import pickle
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import util
+
+logger = logging.getLogger(__name__)
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class CalcRecipTest(unittest.TestCase):
+    lattice = (0.4, 0.5, 0.6, 90., 90., 90.)
+
+    def setUp(self):
+        from ophyd.hkl.calc import CalcE4CV
+
+        self.calc = CalcE4CV(lattice=self.lattice)
+        self.calc.energy = 8.0
+
+        rs = np.random.RandomState(0)
+        self.real = np.column_stack([rs.uniform(10, 40, 20),
+                                     rs.uniform(-10, 10, 20),
+                                     rs.uniform(-10, 10, 20),
+                                     rs.uniform(20, 80, 20)])
+
+    def other_mode(self):
+        engine = self.calc.engine
+        return [mode for mode in engine.modes if mode != engine.mode][0]
+
+    def test_forward_many(self):
+        calc = self.calc
+        # the last point is out of reach at this wavelength
+        pseudo = [[1., 0., 0.], [0., 1., 1.], [10., 10., 10.]]
+        solutions, num_solutions = calc.forward_many(pseudo, max_solutions=2)
+        self.assertEqual(solutions.shape, (3, 2, 4))
+        self.assertEqual(num_solutions[2], 0)
+        self.assertTrue(np.all(num_solutions[:2] > 0))
+
+        valid = np.arange(2) < num_solutions[:, None]
+        self.assertTrue(np.all(np.isnan(solutions[~valid])))
+        self.assertFalse(np.any(np.isnan(solutions[valid])))
+
+        for point, real, count in zip(pseudo, solutions, num_solutions):
+            for position in real[:count]:
+                assert_allclose(calc.inverse(position), point, atol=1e-6)
+
+        # without a limit, the solution axis grows to fit
+        solutions, num_solutions = calc.forward_many(pseudo)
+        self.assertEqual(solutions.shape[1], max(num_solutions))
+
+    def test_inverse_many(self):
+        calc = self.calc
+        initial = calc.physical_positions
+        pseudo = calc.inverse_many(self.real)
+        self.assertEqual(pseudo.shape, (20, 3))
+        assert_allclose(calc.physical_positions, initial)
+
+        chunks = (self.real[i:i + 7] for i in range(0, 20, 7))
+        chunked = list(calc.iter_inverse_many(chunks))
+        self.assertEqual([len(chunk) for chunk in chunked], [7, 7, 6])
+        assert_allclose(np.concatenate(chunked), pseudo)
+
+        for real, expected in zip(self.real[:3], pseudo):
+            assert_allclose(calc.inverse(real), expected, atol=1e-10)
+
+    def check_same(self, restored, calc):
+        self.assertIsNot(restored, calc)
+        self.assertEqual(restored.sample_name, calc.sample_name)
+        self.assertEqual(sorted(restored._samples), sorted(calc._samples))
+        assert_allclose(restored.sample.lattice, calc.sample.lattice)
+        assert_allclose(restored.sample.UB, calc.sample.UB, atol=1e-12)
+        self.assertAlmostEqual(restored.wavelength, calc.wavelength)
+        self.assertEqual(restored.engine.mode, calc.engine.mode)
+        assert_allclose(restored.physical_positions, calc.physical_positions)
+        assert_allclose(restored.inverse(self.real[1]),
+                        calc.inverse(self.real[1]), atol=1e-10)
+
+    def test_state(self):
+        from ophyd.hkl.calc import CalcE4CV
+
+        calc = self.calc
+        calc.new_sample('other', lattice=(0.3, 0.3, 0.3, 90., 90., 90.),
+                        select=False)
+        angle = np.radians(30)
+        calc.sample.U = [[np.cos(angle), -np.sin(angle), 0],
+                         [np.sin(angle), np.cos(angle), 0],
+                         [0, 0, 1]]
+        calc.energy = 10.0
+        calc.engine.mode = self.other_mode()
+        calc.physical_positions = self.real[0]
+
+        state = json.loads(json.dumps(calc.get_state()))
+        self.check_same(CalcE4CV.from_state(state), calc)
+        self.check_same(pickle.loads(pickle.dumps(calc)), calc)
+
+    def test_engine_list_per_sample(self):
+        calc = self.calc
+        real = self.real[0]
+        main_list = calc._engine_list
+        main = np.asarray(calc.inverse(real))
+
+        # hkl scales with the lattice constants at fixed angles
+        other = calc.new_sample('other',
+                                lattice=(0.3, 0.3, 0.3, 90., 90., 90.))
+        other_list = calc._engine_list
+        self.assertIsNot(other_list, main_list)
+        assert_allclose(calc.inverse(real), main * 0.3 / self.lattice[:3],
+                        rtol=1e-6)
+
+        # the mode carries over to the engine list of the selected sample
+        mode = self.other_mode()
+        calc.engine.mode = mode
+        calc.sample = 'main'
+        self.assertIs(calc._engine_list, main_list)
+        self.assertEqual(calc.engine.mode, mode)
+        assert_allclose(calc.inverse(real), main, rtol=1e-6)
+
+        # changes to a sample apply once it is selected again
+        other.lattice = (0.35, 0.35, 0.35, 90., 90., 90.)
+        calc.sample = 'other'
+        self.assertIs(calc._engine_list, other_list)
+        assert_allclose(calc.inverse(real), main * 0.35 / self.lattice[:3],
+                        rtol=1e-6)
+        self.assertEqual(len(calc._engine_lists), 2)
+
+    def test_copy(self):
+        calc = self.calc
+        calc.physical_positions = self.real[0]
+        clone = calc.copy()
+        self.assertIsNot(clone, calc)
+        self.assertAlmostEqual(clone.wavelength, calc.wavelength)
+        assert_allclose(clone.physical_positions, calc.physical_positions)
+        assert_allclose(clone.sample.UB, calc.sample.UB)
+
+        clone.energy = 12.0
+        self.assertAlmostEqual(calc.energy, 8.0)
+
+    def test_forward_energies(self):
+        from ophyd.hkl.calc import NM_KEV
+
+        calc = self.calc
+        calc.physical_positions = self.real[0]
+        positions = calc.physical_positions
+
+        energies = np.array([8., 10., 12.])
+        solutions, num_solutions = calc.forward_energies([1., 0., 0.],
+                                                         energies,
+                                                         max_solutions=1)
+        self.assertEqual(solutions.shape, (3, 1, 4))
+        self.assertEqual(num_solutions.tolist(), [1, 1, 1])
+
+        # Bragg's law, with d = a for (1, 0, 0)
+        tth = 2 * np.degrees(np.arcsin(NM_KEV / energies / 0.8))
+        assert_allclose(np.abs(solutions[:, 0, 3]), tth, rtol=1e-6)
+
+        self.assertAlmostEqual(calc.energy, 8.0)
+        assert_allclose(calc.physical_positions, positions)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,73 @@
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import geometry
+from ophyd.hkl.detector import PixelMapper
+
+logger = logging.getLogger(__name__)
+
+
+class PixelMapperTest(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.UB = 2 * np.pi * np.eye(3) / 4.0 + 0.05 * rs.randn(3, 3)
+        self.wavelength = 1.54
+        self.rs = rs
+
+    def test_center_pixel(self):
+        # the center pixel is along the detector arm, as in inverse_hkl
+        for dtype, axes in geometry.geometries.items():
+            mapper = PixelMapper(dtype, (5, 7), distance=1000.,
+                                 pixel_size=0.1)
+            real = self.rs.uniform(-90, 90, (3, len(axes)))
+            h, k, l = mapper.hkl(real, self.UB, self.wavelength)
+            self.assertEqual(h.shape, (3, 5, 7))
+
+            center = np.column_stack((h[:, 2, 3], k[:, 2, 3], l[:, 2, 3]))
+            assert_allclose(center, geometry.inverse_hkl(
+                dtype, real, self.UB, self.wavelength), atol=1e-12)
+
+    def test_row_offset(self):
+        # E4CV: rows run down, against increasing two theta
+        distance, pixel_size = 500., 0.2
+        mapper = PixelMapper('E4CV', (3, 3), distance=distance,
+                             pixel_size=pixel_size)
+        real = np.array([20., 10., 30., 40.])
+        h, k, l = mapper.hkl(real, self.UB, self.wavelength)
+        self.assertEqual(h.shape, (3, 3))
+
+        offset = np.degrees(np.arctan(pixel_size / distance))
+        for row, sign in ((0, 1), (2, -1)):
+            moved = real + [0, 0, 0, sign * offset]
+            expected = geometry.inverse_hkl('E4CV', moved, self.UB,
+                                            self.wavelength)[0]
+            assert_allclose((h[row, 1], k[row, 1], l[row, 1]), expected,
+                            atol=1e-12)
+
+    def test_batch(self):
+        mapper = PixelMapper('E6C', (4, 6), distance=800.,
+                             pixel_size=(0.1, 0.2), center=(1.0, 2.5))
+        real = self.rs.uniform(-90, 90, (4, 6))
+        wavelength = [1.0, 1.2, 1.4, 1.6]
+        batch = mapper.hkl(real, self.UB, wavelength)
+        for i in range(len(real)):
+            single = mapper.hkl(real[i], self.UB, wavelength[i])
+            for b, s in zip(batch, single):
+                assert_allclose(b[i], s, atol=1e-12)
+
+        rad = mapper.hkl(np.radians(real), self.UB, wavelength,
+                         degrees=False)
+        for b, r in zip(batch, rad):
+            assert_allclose(b, r, atol=1e-12)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, PixelMapper, 'unknown', (3, 3), 1., 1.)
+        self.assertRaises(ValueError, PixelMapper, 'E4CV', (3, 3, 3), 1., 1.)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,110 @@
+import logging
+import time
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd import (Positioner, PseudoSingle)
+from ophyd import (Component as Cpt)
+from ophyd.hkl import util
+
+logger = logging.getLogger(__name__)
+
+
+def make_e4cv(**kwargs):
+    from ophyd.hkl.diffract import E4CV
+
+    class MyE4CV(E4CV):
+        h = Cpt(PseudoSingle, '')
+        k = Cpt(PseudoSingle, '')
+        l = Cpt(PseudoSingle, '')
+
+        omega = Cpt(Positioner)
+        chi = Cpt(Positioner)
+        phi = Cpt(Positioner)
+        tth = Cpt(Positioner)
+
+    diffr = MyE4CV('', name='e4cv',
+                   calc_kw=dict(lattice=(0.4, 0.5, 0.6, 90., 90., 90.)),
+                   **kwargs)
+    for positioner, value in zip(diffr.real_positioners,
+                                 (30., 0., 0., 60.)):
+        positioner._set_position(value)
+    return diffr
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class EnergyUpdateTest(unittest.TestCase):
+    def test_immediate(self):
+        diffr = make_e4cv()
+        diffr.energy = 12.0
+        self.assertAlmostEqual(diffr.calc.energy, 12.0)
+
+    def test_coalesce(self):
+        # long enough for the timer not to fire during the test
+        diffr = make_e4cv(energy_update_interval=60.)
+        calc = diffr.calc
+        # the initial energy is applied with the first full position
+        self.assertAlmostEqual(calc.energy, 8.0)
+
+        diffr.energy = 10.0
+        diffr.energy = 12.0
+        self.assertEqual(diffr._pending_energy, 12.0)
+        self.assertAlmostEqual(calc.energy, 8.0)
+
+        # applied before calculations
+        position = diffr.inverse(diffr.real_position)
+        self.assertAlmostEqual(calc.energy, 12.0)
+        self.assertIsNone(diffr._pending_energy)
+
+        diffr.energy = 10.0
+        diffr.forward(position)
+        self.assertAlmostEqual(calc.energy, 10.0)
+        self.assertIsNone(diffr._pending_energy)
+
+    def test_timer(self):
+        diffr = make_e4cv(energy_update_interval=0.05)
+        initial = np.asarray(diffr.position)
+
+        diffr.energy = 9.0
+        diffr.energy = 12.0
+        self.assertTrue(wait_for(
+            lambda: not np.allclose(diffr.position, initial)))
+        self.assertAlmostEqual(diffr.calc.energy, 12.0)
+        # hkl scales with the energy at fixed angles
+        assert_allclose(diffr.position, initial * 12.0 / 8.0, rtol=1e-6,
+                        atol=1e-12)
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class EnergyScanTest(unittest.TestCase):
+    def test_plan_energy_scan(self):
+        diffr = make_e4cv()
+        calc = diffr.calc
+        positions = calc.physical_positions
+
+        # (1, 0, 0) is out of reach at 0.5 keV
+        real, reachable = diffr.plan_energy_scan((1., 0., 0.),
+                                                 [8., 12., 0.5])
+        self.assertEqual(real.shape, (3, 4))
+        self.assertEqual(reachable.tolist(), [True, True, False])
+        self.assertTrue(np.all(np.isnan(real[2])))
+        self.assertFalse(np.any(np.isnan(real[:2])))
+
+        # neither the energy nor the positions change
+        self.assertAlmostEqual(diffr.energy, 8.0)
+        self.assertAlmostEqual(calc.energy, 8.0)
+        assert_allclose(calc.physical_positions, positions)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
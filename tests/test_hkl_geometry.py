@@ -0,0 +1,95 @@
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import (geometry, util)
+
+logger = logging.getLogger(__name__)
+
+
+class GeometryTest(unittest.TestCase):
+    def test_rotation_matrices(self):
+        angles = np.radians([0, 30, 90, -135])
+        rot = geometry.rotation_matrices((0, 0, 2), angles)
+        self.assertEqual(rot.shape, (4, 3, 3))
+
+        # right-handed: x rotates toward y about z
+        assert_allclose(np.dot(rot[2], [1, 0, 0]), [0, 1, 0], atol=1e-15)
+        for mat in rot:
+            assert_allclose(np.dot(mat, mat.T), np.eye(3), atol=1e-15)
+            self.assertAlmostEqual(np.linalg.det(mat), 1.0)
+
+        # rotations about the same axis compose by adding angles
+        rs = np.random.RandomState(0)
+        axis = rs.randn(3)
+        a, b = rs.uniform(-np.pi, np.pi, 2)
+        rot = geometry.rotation_matrices(axis, [a, b, a + b])
+        assert_allclose(np.dot(rot[0], rot[1]), rot[2], atol=1e-14)
+
+    def test_sample_q(self):
+        # symmetric reflection: Q along +z, |Q| = 4 pi sin(theta) / lambda
+        q = geometry.sample_q('E4CV', [[30, 0, 0, 60]], 1.0)
+        assert_allclose(q, [[0, 0, 4 * np.pi * np.sin(np.radians(30))]],
+                        atol=1e-12)
+        q = geometry.sample_q('E6C', [[0, 30, 0, 0, 0, 60]], 1.0)
+        assert_allclose(q, [[0, 0, 4 * np.pi * np.sin(np.radians(30))]],
+                        atol=1e-12)
+
+        # per-point wavelengths
+        real = [[30, 0, 0, 60], [30, 0, 0, 60]]
+        q = geometry.sample_q('E4CV', real, [1.0, 2.0])
+        assert_allclose(q[0], 2 * q[1])
+
+    def test_inverse_hkl(self):
+        rs = np.random.RandomState(1)
+        UB = 2 * np.pi * np.eye(3) / 4.0 + 0.1 * rs.randn(3, 3)
+        wavelength = 1.54
+
+        for dtype, axes in geometry.geometries.items():
+            real = rs.uniform(-180, 180, (10, len(axes)))
+            hkl = geometry.inverse_hkl(dtype, real, UB, wavelength)
+            self.assertEqual(hkl.shape, (10, 3))
+
+            q = geometry.sample_q(dtype, real, wavelength)
+            assert_allclose(np.dot(hkl, UB.T), q, atol=1e-12)
+
+            # elastic scattering: |Q| is at most 2 k
+            self.assertTrue(np.all(np.linalg.norm(q, axis=1) <=
+                                   4 * np.pi / wavelength + 1e-12))
+
+            assert_allclose(geometry.inverse_hkl(dtype, np.radians(real), UB,
+                                                 wavelength, degrees=False),
+                            hkl, atol=1e-12)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, geometry.sample_q, 'unknown',
+                          [[0, 0, 0, 0]], 1.0)
+        self.assertRaises(ValueError, geometry.sample_q, 'E4CV',
+                          [[0, 0, 0]], 1.0)
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class NumpyInverseTest(unittest.TestCase):
+    def test_engine_switch(self):
+        from ophyd.hkl.calc import CalcE4CV
+
+        calc = CalcE4CV(lattice=(0.4, 0.5, 0.6, 90., 90., 90.))
+        calc.enable_numpy_inverse()
+        real = [30., 10., 20., 60.]
+        hkl = calc.inverse(real)
+        self.assertEqual(len(hkl), 3)
+
+        # other engines use the hkl library
+        calc.engine = 'q'
+        self.assertEqual(len(calc.inverse(real)), 1)
+        self.assertEqual(calc.inverse_many([real]).shape, (1, 1))
+
+        calc.engine = 'hkl'
+        assert_allclose(calc.inverse(real), hkl)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
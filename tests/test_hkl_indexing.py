@@ -0,0 +1,68 @@
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import indexing
+from ophyd.hkl.geometry import rotation_matrices
+from ophyd.hkl.refine import lattice_B
+
+logger = logging.getLogger(__name__)
+
+
+class IndexingTest(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(3)
+        self.B = lattice_B([3.78, 4.5, 13.28, 90, 90, 90])
+        self.UB = np.dot(rotation_matrices(rs.randn(3), [1.1])[0], self.B)
+        hkl = rs.randint(-3, 4, (20, 3)).astype(float)
+        self.hkl = hkl[np.abs(hkl).sum(axis=1) > 0]
+        self.q = np.dot(self.hkl, self.UB.T)
+        self.rs = rs
+
+    def test_busing_levy(self):
+        UB = indexing.busing_levy_UB(self.B, self.hkl[:2], self.hkl[2:4],
+                                     self.q[:2], self.q[2:4])
+        self.assertEqual(UB.shape, (2, 3, 3))
+        for ub in UB:
+            assert_allclose(ub, self.UB, atol=1e-12)
+
+    def test_score_ub(self):
+        wrong = np.dot(rotation_matrices((0, 0, 1), [0.3])[0], self.UB)
+        num_indexed, rms = indexing.score_ub([self.UB, wrong], self.q)
+        self.assertEqual(num_indexed[0], len(self.q))
+        self.assertLess(num_indexed[1], len(self.q))
+        self.assertLess(rms[0], 1e-12)
+
+    def test_auto_index(self):
+        q = self.q + self.rs.randn(*self.q.shape) * 1e-3
+        result = indexing.auto_index(q, self.B)
+        self.assertEqual(result.quality, 1.0)
+        self.assertTrue(result.indexed.all())
+        self.assertGreater(result.num_candidates, 0)
+
+        # equivalent orientations may permute or invert the indices, but
+        # must reproduce the measured peaks
+        hkl = np.round(result.hkl)
+        assert_allclose(np.dot(hkl, result.UB.T), q, atol=1e-2)
+        assert_allclose(np.abs(np.linalg.det(result.UB)),
+                        np.abs(np.linalg.det(self.UB)), rtol=1e-9)
+
+    def test_auto_index_chunked(self):
+        full = indexing.auto_index(self.q, self.B)
+        chunked = indexing.auto_index(self.q, self.B, chunk_size=3)
+        self.assertEqual(full.num_candidates, chunked.num_candidates)
+        assert_allclose(full.UB, chunked.UB)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, indexing.auto_index, self.q[:1],
+                          self.B)
+        # no reflections to match the peaks against
+        self.assertRaises(ValueError, indexing.auto_index, self.q, self.B,
+                          table=np.zeros((0, 3)))
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
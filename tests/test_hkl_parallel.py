@@ -0,0 +1,71 @@
+import logging
+import unittest
+from concurrent.futures import CancelledError
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import util
+
+logger = logging.getLogger(__name__)
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class ParallelCalcTest(unittest.TestCase):
+    def setUp(self):
+        from ophyd.hkl.calc import CalcE4CV
+        from ophyd.hkl.parallel import ParallelCalc
+
+        self.calc = CalcE4CV(lattice=(0.4, 0.5, 0.6, 90., 90., 90.))
+        self.calc.energy = 8.0
+        self.parallel = ParallelCalc(self.calc, processes=2, chunk_size=4)
+
+        rs = np.random.RandomState(0)
+        self.real = np.column_stack([rs.uniform(10, 40, 25),
+                                     rs.uniform(-10, 10, 25),
+                                     rs.uniform(-10, 10, 25),
+                                     rs.uniform(20, 80, 25)])
+
+    def tearDown(self):
+        self.parallel.close()
+
+    def test_ordered(self):
+        progress = []
+
+        def report(done, total):
+            progress.append((done, total))
+
+        pseudo = self.parallel.inverse_many(self.real, progress=report)
+        assert_allclose(pseudo, self.calc.inverse_many(self.real),
+                        atol=1e-10)
+        self.assertEqual(progress[-1], (25, 25))
+        self.assertEqual(len(progress), 7)
+
+        # an unreachable point part-way through stays in place
+        pseudo = np.array([[1., 0., 0.]] * 10)
+        pseudo[5] = [10., 10., 10.]
+        solutions, num_solutions = self.parallel.forward_many(
+            pseudo, max_solutions=2)
+        self.assertEqual(solutions.shape, (10, 2, 4))
+        self.assertEqual(np.nonzero(num_solutions == 0)[0].tolist(), [5])
+        self.assertTrue(np.all(np.isnan(solutions[5])))
+
+    def test_cancel(self):
+        progress = []
+
+        def cancel(done, total):
+            progress.append(done)
+            self.parallel.cancel()
+
+        self.assertRaises(CancelledError, self.parallel.inverse_many,
+                          self.real, progress=cancel)
+        self.assertEqual(progress, [4])
+
+        # a new pool is started for the next calculation
+        self.assertEqual(self.parallel.inverse_many(self.real).shape,
+                         (25, 3))
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,104 @@
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import (assert_allclose, assert_array_equal)
+
+from ophyd.hkl import paths
+
+logger = logging.getLogger(__name__)
+
+
+def collect(path_type, num_params=3, chunk_size=1000, **kwargs):
+    chunks = list(paths.iter_path(path_type, num_params,
+                                  chunk_size=chunk_size, **kwargs))
+    for chunk in chunks:
+        assert len(chunk) <= max(chunk_size, 1)
+    return chunks, np.concatenate(chunks)
+
+
+class PathsTest(unittest.TestCase):
+    def test_linear(self):
+        chunks, points = collect('linear', chunk_size=4, start=(0, 0, 1),
+                                 end=(1, 2, 1), n=10)
+        self.assertEqual(len(chunks), 3)
+        assert_allclose(points, np.linspace((0, 0, 1), (1, 2, 1), 11))
+
+    def test_mesh(self):
+        shape = (3, 4, 2)
+        chunks, points = collect('mesh', chunk_size=5, start=(0, 0, 0),
+                                 end=(2, 3, 1), shape=shape)
+        self.assertEqual(len(points), 24)
+        # every grid point is visited once
+        self.assertEqual(len(set(map(tuple, points.tolist()))), 24)
+        # consecutive points differ by one step along one axis
+        steps = np.abs(np.diff(points, axis=0))
+        assert_allclose(steps.sum(axis=1), 1.0)
+        assert_array_equal(np.count_nonzero(steps, axis=1), 1)
+
+        _, raster = collect('mesh', start=(0, 0, 0), end=(2, 3, 1),
+                            shape=shape, snake=False)
+        assert_allclose(raster[:2], [[0, 0, 0], [0, 0, 1]])
+        assert_allclose(raster[2], [0, 1, 0])
+
+        # an axis of shape 1 stays at start
+        _, points = collect('mesh', start=(0, 5, 0), end=(1, 9, 1),
+                            shape=(2, 1, 2))
+        assert_allclose(points[:, 1], 5)
+
+        self.assertRaises(ValueError, collect, 'mesh', start=(0, 0, 0),
+                          end=(1, 1, 1), shape=(2, 0, 2))
+
+    def test_arc(self):
+        B = np.array([[1., 0.2, 0.], [0., 1.5, 0.], [0., 0., 0.8]])
+        start = np.array([1., 0., 2.])
+        _, points = collect('arc', chunk_size=7, start=start,
+                            axis=(0, 0, 1), angle=90, n=20, metric=B)
+        self.assertEqual(len(points), 21)
+        assert_allclose(points[0], start)
+        # the Cartesian length is preserved
+        lengths = np.linalg.norm(np.dot(points, B.T), axis=1)
+        assert_allclose(lengths, np.linalg.norm(np.dot(B, start)))
+
+        self.assertRaises(ValueError, collect, 'arc', num_params=2,
+                          start=(1, 0), axis=(0, 1), angle=90)
+
+    def test_radial(self):
+        _, points = collect('radial', direction=(1, 1, 0), start=1.0,
+                            end=2.0, n=4)
+        assert_allclose(np.linalg.norm(points, axis=1),
+                        np.linspace(1.0, 2.0, 5))
+        assert_allclose(points[:, 0], points[:, 1])
+
+    def test_array(self):
+        positions = np.arange(30, dtype=float).reshape(10, 3)
+        for chunk_size in (-1, 0, 1, 3, 4, 100):
+            _, points = collect('array', chunk_size=chunk_size,
+                                positions=positions)
+            assert_array_equal(points, positions)
+
+            # streamed from an iterable of positions and arrays
+            stream = iter([positions[0], positions[1:4], positions[4:]])
+            chunks, points = collect('array', chunk_size=chunk_size,
+                                     positions=stream)
+            assert_array_equal(points, positions)
+            self.assertEqual(len(chunks),
+                             -(-len(positions) // max(chunk_size, 1)))
+
+    def test_custom(self):
+        def constant(num_params, chunk_size, value=0.0, n=5):
+            yield np.full((n, num_params), value)
+
+        _, points = collect(constant, num_params=2, value=1.5)
+        assert_array_equal(points, np.full((5, 2), 1.5))
+
+        def bad_shape(num_params, chunk_size):
+            yield np.zeros((2, num_params + 1))
+
+        self.assertRaises(ValueError, collect, bad_shape)
+        self.assertRaises(ValueError, collect, 'unknown')
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,118 @@
+import logging
+import threading
+import unittest
+
+from ophyd.hkl.cache import ForwardCache
+from ophyd.hkl.pool import CalcPool
+
+logger = logging.getLogger(__name__)
+
+
+class StubGeometry(object):
+    def __init__(self, positions):
+        self.positions = list(positions)
+
+    def axis_values_set(self, positions, units):
+        self.positions = list(positions)
+
+
+class StubCalc(object):
+    '''Stand-in for CalcRecip, counting copies'''
+    _units = None
+
+    def __init__(self, positions=(0.0, 0.0)):
+        self._lock = threading.RLock()
+        self._geometry = StubGeometry(positions)
+        self._state_version = 0
+        self._wavelength = 0.15
+        self.forward_cache = None
+        self.numpy_inverse = None
+        self.num_copies = 0
+
+    @property
+    def state_version(self):
+        return self._state_version
+
+    @property
+    def wavelength(self):
+        return self._wavelength
+
+    @wavelength.setter
+    def wavelength(self, wavelength):
+        self._wavelength = wavelength
+
+    def copy(self):
+        self.num_copies += 1
+        clone = StubCalc(self._geometry.positions)
+        clone.wavelength = self.wavelength
+        return clone
+
+    def enable_forward_cache(self, **kwargs):
+        self.forward_cache = ForwardCache(**kwargs)
+        return self.forward_cache
+
+
+class CalcPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.calc = StubCalc()
+        self.pool = CalcPool(self.calc)
+
+    def test_reuse(self):
+        clone = self.pool.get()
+        self.assertIsNot(clone, self.calc)
+        self.assertIs(self.pool.get(), clone)
+        self.assertEqual(self.calc.num_copies, 1)
+
+        self.calc._state_version += 1
+        self.assertIsNot(self.pool.get(), clone)
+        self.assertEqual(self.calc.num_copies, 2)
+
+        self.pool.invalidate()
+        self.pool.get()
+        self.assertEqual(self.calc.num_copies, 3)
+
+    def test_real_positions(self):
+        clone = self.pool.get(real=(1.0, 2.0))
+        self.assertEqual(clone._geometry.positions, [1.0, 2.0])
+        # the original is untouched, and no new copy is needed
+        self.assertEqual(self.calc._geometry.positions, [0.0, 0.0])
+        self.assertIs(self.pool.get(real=(3.0, 4.0)), clone)
+        self.assertEqual(clone._geometry.positions, [3.0, 4.0])
+
+    def test_wavelength(self):
+        clone = self.pool.get()
+        self.calc.wavelength = 0.1
+        # synced into the existing copy
+        self.assertIs(self.pool.get(), clone)
+        self.assertEqual(clone.wavelength, 0.1)
+        self.assertEqual(self.calc.num_copies, 1)
+
+    def test_forward_cache(self):
+        self.calc.enable_forward_cache(maxsize=7, resolution=0.5,
+                                       origin_resolution=0.25)
+        clone = self.pool.get()
+        cache = clone.forward_cache
+        self.assertIsNot(cache, self.calc.forward_cache)
+        self.assertEqual((cache.maxsize, cache.resolution,
+                          cache.origin_resolution), (7, 0.5, 0.25))
+
+    def test_threads(self):
+        clones = {}
+
+        def run(name):
+            clones[name] = self.pool.get()
+
+        threads = [threading.Thread(target=run, args=(i, ))
+                   for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        clones['main'] = self.pool.get()
+        self.assertEqual(len(set(map(id, clones.values()))), 4)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
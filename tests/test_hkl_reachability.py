@@ -0,0 +1,137 @@
+import logging
+import unittest
+
+import numpy as np
+
+from ophyd.hkl.reachability import ReachabilityMap
+
+logger = logging.getLogger(__name__)
+
+
+class StubCalc(object):
+    '''Points within the unit circle have two solutions, (x, y) and
+    (-x, y + 10)'''
+    pseudo_axis_names = ['h', 'k']
+    physical_axis_names = ['a', 'b']
+
+    def __init__(self):
+        self.version = 0
+        self.num_calls = 0
+
+    def context_fingerprint(self):
+        return self.version
+
+    def forward_many(self, pseudo, max_solutions=None):
+        self.num_calls += 1
+        pseudo = np.asarray(pseudo, dtype=float)
+        solutions = np.full((len(pseudo), 2, 2), np.nan)
+        solved = (pseudo ** 2).sum(axis=1) <= 1.0 + 1e-9
+        solutions[solved, 0] = pseudo[solved]
+        solutions[solved, 1] = pseudo[solved] * [-1, 1] + [0, 10]
+        num_solutions = np.where(solved, 2, 0)
+        if max_solutions is not None:
+            solutions = solutions[:, :max_solutions]
+            num_solutions = np.minimum(num_solutions, max_solutions)
+        return solutions, num_solutions
+
+
+class ReachabilityTest(unittest.TestCase):
+    def setUp(self):
+        self.calc = StubCalc()
+
+    def test_query(self):
+        reach = ReachabilityMap(self.calc, (-2, -2), (2, 2), 41)
+        self.assertEqual(reach.shape, (41, 41))
+        self.assertEqual(reach.reachable.sum(), np.sum(
+            (reach.grid ** 2).sum(axis=1) <= 1.0 + 1e-9))
+
+        self.assertTrue(reach.query((0, 0)))
+        self.assertFalse(reach.query((1.5, 0)))
+        # outside of the grid
+        self.assertFalse(reach.query((0, 3)))
+
+        points = [[0, 0], [0.96, 0.0], [1.5, 1.5]]
+        np.testing.assert_array_equal(reach.query(points),
+                                      [True, True, False])
+        np.testing.assert_array_equal(reach.query(points, method='all'),
+                                      [True, False, False])
+        np.testing.assert_array_equal(reach.query(points, method='any'),
+                                      [True, True, False])
+        self.assertRaises(ValueError, reach.query, points, method='unknown')
+
+    def test_check_path(self):
+        reach = ReachabilityMap(self.calc, (-2, -2), (2, 2), 41)
+        inside = np.column_stack((np.linspace(-0.5, 0.5, 20),
+                                  np.zeros(20)))
+        self.assertTrue(reach.check_path(inside))
+        self.assertFalse(reach.check_path(inside * 3))
+
+    def test_real_limits(self):
+        # the first solution has a >= 0, the second a <= 0
+        reach = ReachabilityMap(self.calc, (-1, -1), (1, 1), 21,
+                                real_limits={'a': (0, 1)})
+        self.assertTrue(reach.query((-0.5, 0)))
+        self.assertTrue(reach.query((0.5, 0)))
+
+        # the second solution is always excluded by the limits on b
+        reach = ReachabilityMap(self.calc, (-1, -1), (1, 1), 21,
+                                real_limits={'a': (0.1, 1), 'b': (-5, 5)})
+        self.assertFalse(reach.query((-0.5, 0)))
+        self.assertTrue(reach.query((0.5, 0)))
+
+        # limits in physical axis order, unlimited where low == high
+        reach = ReachabilityMap(self.calc, (-1, -1), (1, 1), 21,
+                                real_limits=[(0, 0), (9, 11)])
+        self.assertTrue(reach.query((-0.5, 0)))
+        self.assertTrue(reach.query((0.5, 0)))
+
+        self.assertRaises(ValueError, ReachabilityMap, self.calc, (-1, -1),
+                          (1, 1), 21, real_limits={'c': (0, 1)})
+        self.assertRaises(ValueError, ReachabilityMap, self.calc, (-1, -1),
+                          (1, 1), 21, real_limits=[(0, 1)])
+
+    def test_limits_callable(self):
+        limits = {'a': (0.1, 1), 'b': (-5, 5)}
+        reach = ReachabilityMap(self.calc, (-1, -1), (1, 1), 21,
+                                real_limits=lambda: limits)
+        self.assertFalse(reach.query((-0.5, 0)))
+        self.assertFalse(reach.stale)
+
+        # changed limits, such as motor soft limits, make the map stale
+        limits['b'] = (-5, 15)
+        self.assertTrue(reach.stale)
+        self.assertTrue(reach.query((-0.5, 0)))
+        self.assertEqual(self.calc.num_calls, 2)
+
+        def unknown():
+            return {'c': (0, 1)}
+
+        self.assertRaises(ValueError, ReachabilityMap, self.calc, (-1, -1),
+                          (1, 1), 21, real_limits=unknown)
+
+    def test_stale(self):
+        reach = ReachabilityMap(self.calc, (-1, -1), (1, 1), 5)
+        self.assertTrue(reach.stale)
+        reach.query((0, 0))
+        self.assertFalse(reach.stale)
+        reach.query((0, 0))
+        self.assertEqual(self.calc.num_calls, 1)
+
+        self.calc.version += 1
+        self.assertTrue(reach.stale)
+        reach.query((0, 0))
+        self.assertEqual(self.calc.num_calls, 2)
+
+        reach.auto_rebuild = False
+        reach.invalidate()
+        self.assertRaises(RuntimeError, reach.query, (0, 0))
+        reach.build()
+        self.assertTrue(reach.query((0, 0)))
+
+        self.assertRaises(ValueError, ReachabilityMap, self.calc, (-1, -1),
+                          (1, 1), 1)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
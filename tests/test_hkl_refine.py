@@ -0,0 +1,69 @@
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ophyd.hkl import refine
+from ophyd.hkl.geometry import rotation_matrices
+
+logger = logging.getLogger(__name__)
+
+
+class RefineTest(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(1)
+        self.lattice = np.array([3.1, 4.2, 5.3, 85., 95., 100.])
+        self.B = refine.lattice_B(self.lattice)
+        self.U = rotation_matrices(rs.randn(3), [0.7])[0]
+        self.hkl = rs.randint(-5, 6, (50, 3)).astype(float)
+        self.q = np.dot(self.hkl, np.dot(self.U, self.B).T)
+        self.rs = rs
+
+    def test_lattice_B(self):
+        # cubic: B is 2 pi / a times the identity
+        assert_allclose(refine.lattice_B([2., 2., 2., 90., 90., 90.]),
+                        np.pi * np.eye(3), atol=1e-14)
+
+    def test_recover_lattice(self):
+        start = self.lattice * [1.01, 0.99, 1.02, 1, 1.01, 0.99]
+        result = refine.refine_ub(self.hkl, self.q, start)
+        self.assertTrue(result.converged)
+        self.assertEqual(result.status, 'converged')
+        assert_allclose(result.lattice, self.lattice, rtol=1e-10)
+        assert_allclose(result.UB, np.dot(self.U, self.B), atol=1e-10)
+        self.assertLess(result.rms, 1e-10)
+
+    def test_noisy(self):
+        q = self.q + self.rs.randn(*self.q.shape) * 1e-4
+        result = refine.refine_ub(self.hkl, q, self.lattice * 1.01)
+        self.assertTrue(result.converged)
+        assert_allclose(result.lattice, self.lattice, rtol=1e-4)
+
+    def test_partial(self):
+        # angles fixed at their true values, lengths refined
+        start = self.lattice * [1.01, 0.99, 1.02, 1, 1, 1]
+        result = refine.refine_ub(self.hkl, self.q, start, U=self.U,
+                                  refine=('a', 'b', 'c'))
+        assert_allclose(result.lattice, self.lattice, rtol=1e-10)
+        assert_allclose(result.U, self.U, atol=1e-14)
+
+    def test_not_converged(self):
+        q = self.q + self.rs.randn(*self.q.shape) * 1e-4
+        result = refine.refine_ub(self.hkl, q, self.lattice * 1.01,
+                                  max_iter=1)
+        self.assertFalse(result.converged)
+        self.assertEqual(result.status, 'max_iter')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, refine.refine_ub, self.hkl, self.q[:3],
+                          self.lattice)
+        self.assertRaises(ValueError, refine.refine_ub, self.hkl, self.q,
+                          self.lattice, refine=('U', 'delta'))
+        self.assertRaises(ValueError, refine.refine_ub, self.hkl[:1],
+                          self.q[:1], self.lattice)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
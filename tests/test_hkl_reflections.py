@@ -0,0 +1,194 @@
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from ophyd.hkl import reflections
+from ophyd.hkl.refine import lattice_B
+
+logger = logging.getLogger(__name__)
+
+
+def brute_force(B, q_max, span=10):
+    hkl = np.array(list(itertools.product(range(-span, span + 1),
+                                          repeat=3)), dtype=float)
+    q_len = np.linalg.norm(np.dot(hkl, B.T), axis=1)
+    return hkl[(q_len > 0) & (q_len <= q_max)]
+
+
+def as_set(hkl):
+    return set(map(tuple, np.asarray(hkl).astype(int).tolist()))
+
+
+class ReflectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.B = lattice_B([3.1, 4.2, 5.3, 85., 95., 100.])
+
+    def test_iter_reflections(self):
+        q_max = 4.0
+        expected = as_set(brute_force(self.B, q_max))
+
+        chunks = list(reflections.iter_reflections(self.B, q_max=q_max,
+                                                   chunk_size=10))
+        self.assertGreater(len(chunks), 1)
+        found = np.concatenate(chunks)
+        self.assertEqual(len(found), len(expected))
+        self.assertEqual(as_set(reflections.hkl_array(found)), expected)
+        self.assertTrue(np.all(found['q'] <= q_max))
+        assert_allclose(found['d'], 2 * np.pi / found['q'])
+        self.assertTrue(np.isnan(found['two_theta']).all())
+
+    def test_two_theta(self):
+        wavelength = 1.54
+        table = reflections.reflection_table(self.B, wavelength=wavelength,
+                                             two_theta_max=60.0)
+        self.assertTrue(np.all(np.diff(table['q']) >= 0))
+        self.assertTrue(np.all(table['two_theta'] <= 60.0 + 1e-9))
+        # Bragg's law
+        theta = np.radians(table['two_theta'] / 2)
+        assert_allclose(2 * table['d'] * np.sin(theta), wavelength)
+
+        q_max = 4 * np.pi * np.sin(np.radians(30.0)) / wavelength
+        self.assertEqual(as_set(reflections.hkl_array(table)),
+                         as_set(brute_force(self.B, q_max)))
+
+    def test_centering(self):
+        table = reflections.reflection_table(self.B, q_max=4.0,
+                                             centering='I')
+        hkl = reflections.hkl_array(table).astype(int)
+        assert_allclose(table['allowed'], hkl.sum(axis=1) % 2 == 0)
+
+        extinct = reflections.reflection_table(self.B, q_max=4.0,
+                                               centering='I',
+                                               remove_extinct=True)
+        self.assertEqual(len(extinct), table['allowed'].sum())
+        self.assertTrue(extinct['allowed'].all())
+
+        self.assertRaises(ValueError, reflections.centering_allowed,
+                          hkl, 'X')
+
+    def test_oriented(self):
+        rot = np.array([[0., -1., 0.], [1., 0., 0.], [0., 0., 1.]])
+        UB = np.dot(rot, self.B)
+        table = reflections.reflection_table(self.B, q_max=3.0, UB=UB)
+        q = np.column_stack((table['qx'], table['qy'], table['qz']))
+        assert_allclose(q, np.dot(reflections.hkl_array(table), UB.T))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, reflections.reflection_table, self.B)
+        self.assertRaises(ValueError, reflections.reflection_table, self.B,
+                          two_theta_max=60.0)
+
+
+class ReadReflectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.hkl = np.array([[1., 0., 0.], [0., 1., 1.], [2., -1., 0.]])
+        self.omega = np.array([10.5, 20.25, 30.])
+        self.tth = np.array([21., 40.5, 60.])
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, fname, text):
+        fname = os.path.join(self.path, fname)
+        with open(fname, 'wt') as f:
+            f.write(text)
+        return fname
+
+    def check(self, hkl, positions, names=('omega', 'tth')):
+        assert_allclose(hkl, self.hkl)
+        self.assertEqual(list(positions.keys()), list(names))
+        assert_allclose(positions[names[0]], self.omega)
+        assert_allclose(positions[names[1]], self.tth)
+
+    def test_text(self):
+        lines = ['# measured peaks', 'H K L omega tth']
+        lines.extend('{} {} {} {} {}'.format(*(tuple(hkl) + (om, tth)))
+                     for hkl, om, tth in zip(self.hkl, self.omega, self.tth))
+        fname = self.write('peaks.txt', '\n'.join(lines) + '\n\n')
+        hkl, positions, wavelength = reflections.read_reflections(fname)
+        self.check(hkl, positions)
+        self.assertIs(wavelength, None)
+
+    def test_csv(self):
+        lines = ['h,omega,k,tth,l,wavelength']
+        lines.extend('{},{},{},{},{},1.5'.format(hkl[0], om, hkl[1], tth,
+                                                 hkl[2])
+                     for hkl, om, tth in zip(self.hkl, self.omega, self.tth))
+        for fname in ('peaks.csv', 'peaks.dat'):
+            fname = self.write(fname, '\n'.join(lines))
+            hkl, positions, wavelength = reflections.read_reflections(fname)
+            self.check(hkl, positions)
+            assert_array_equal(wavelength, [1.5] * 3)
+
+    def test_npz(self):
+        fname = os.path.join(self.path, 'peaks.npz')
+        np.savez(fname, hkl=self.hkl,
+                 positions=np.column_stack((self.omega, self.tth)),
+                 axis_names=['omega', 'tth'], wavelength=1.2)
+        hkl, positions, wavelength = reflections.read_reflections(fname)
+        self.check(hkl, positions)
+        assert_array_equal(wavelength, [1.2] * 3)
+
+        np.savez(fname, hkl=self.hkl,
+                 positions=np.column_stack((self.omega, self.tth)))
+        hkl, positions, wavelength = reflections.read_reflections(fname)
+        self.check(hkl, positions, names=('axis0', 'axis1'))
+        self.assertIs(wavelength, None)
+
+    def test_spec(self):
+        rows = ['{} {} {} 1000.5 {} {} 0'.format(*(tuple(hkl) + (om, tth)))
+                for hkl, om, tth in zip(self.hkl, self.omega, self.tth)]
+        lines = ['#F peaks', '#E 1000',
+                 '#S 1  ascan  th 0 1 2 1', '#L H  K  L  Epoch  omega  tth  '
+                 'Detector', '0 0 0 1 2 3 4',
+                 '#S 2  reflections', '#G4 1 0 0 0.154',
+                 '#L H  K  L  Epoch  Theta Angle  Two Theta  Detector']
+        lines.extend(rows[:2])
+        lines.append('#C interrupted')
+        lines.extend(rows[2:])
+        fname = self.write('peaks.spec', '\n'.join(lines) + '\n')
+
+        names = ('Theta Angle', 'Two Theta')
+        for scan in (None, 2):
+            hkl, positions, wavelength = reflections.read_reflections(
+                fname, scan=scan)
+            self.assertEqual(list(positions.keys()),
+                             ['Epoch', 'Theta Angle', 'Two Theta',
+                              'Detector'])
+            assert_allclose(hkl, self.hkl)
+            assert_allclose(positions[names[0]], self.omega)
+            assert_allclose(positions[names[1]], self.tth)
+            self.assertIs(wavelength, None)
+
+        hkl, positions, _ = reflections.read_reflections(fname, scan=1)
+        assert_allclose(hkl, [[0, 0, 0]])
+        self.assertRaises(ValueError, reflections.read_reflections, fname,
+                          scan=3)
+
+    def test_session(self):
+        hkl_lines = ['H K L'] + ['{} {} {}'.format(*hkl) for hkl in self.hkl]
+        motor_lines = ['omega tth'] + ['{} {}'.format(om, tth) for om, tth
+                                       in zip(self.omega, self.tth)]
+        self.write('hkl.txt', '\n'.join(hkl_lines))
+        self.write('motors.txt', '\n'.join(motor_lines))
+        hkl, positions, wavelength = reflections.read_reflections(self.path)
+        self.check(hkl, positions)
+        self.assertIs(wavelength, None)
+
+    def test_invalid(self):
+        fname = self.write('empty.txt', '# nothing\n')
+        self.assertRaises(ValueError, reflections.read_reflections, fname)
+        fname = self.write('nol.txt', 'h k omega\n1 0 10\n')
+        self.assertRaises(ValueError, reflections.read_reflections, fname)
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,44 @@
+import logging
+import unittest
+
+from ophyd.hkl import util
+
+logger = logging.getLogger(__name__)
+
+
+@unittest.skipIf(not util.hkl_module, 'Hkl library unavailable')
+class SampleCacheTest(unittest.TestCase):
+    def setUp(self):
+        from ophyd.hkl.calc import CalcE4CV
+
+        self.calc = CalcE4CV(lattice=(0.4, 0.5, 0.6, 90., 90., 90.))
+        self.sample = self.calc.sample
+
+    def test_cached_matrices(self):
+        sample = self.sample
+        for name in ('UB', 'U', 'B'):
+            mat = getattr(sample, name)
+            self.assertIs(getattr(sample, name), mat)
+            self.assertFalse(mat.flags.writeable)
+            self.assertRaises(ValueError, mat.__setitem__, (0, 0), 1.0)
+
+        version = sample.version
+        UB = sample.UB
+        sample._invalidate()
+        self.assertGreater(sample.version, version)
+        self.assertIsNot(sample.UB, UB)
+        self.assertEqual(sample.UB.tolist(), UB.tolist())
+
+    def test_lattice_change(self):
+        sample = self.sample
+        B = sample.B
+        version = sample.version
+        sample.lattice = (0.5, 0.5, 0.5, 90., 90., 90.)
+        self.assertGreater(sample.version, version)
+        self.assertIsNot(sample.B, B)
+        self.assertNotEqual(sample.B.tolist(), B.tolist())
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -0,0 +1,194 @@
+import itertools
+import logging
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ophyd.hkl import selection
+
+logger = logging.getLogger(__name__)
+
+
+def random_solutions(rs, num, width, num_real=3):
+    solutions = rs.randn(num, width, num_real)
+    num_solutions = rs.randint(0, width + 1, size=num)
+    for n, count in enumerate(num_solutions):
+        solutions[n, count:] = np.nan
+    return solutions, num_solutions
+
+
+def move_cost(diff, weights=None, metric='sum'):
+    diff = np.abs(diff)
+    if weights is not None:
+        diff = diff * weights
+    return diff.sum() if metric == 'sum' else diff.max()
+
+
+def brute_nearest(solutions, num_solutions, start, **kwargs):
+    index = []
+    previous = start
+    for sols, count in zip(solutions, num_solutions):
+        if not count:
+            index.append(-1)
+            continue
+        if previous is None:
+            best = 0
+        else:
+            best = int(np.argmin([move_cost(sol - previous, **kwargs)
+                                  for sol in sols[:count]]))
+        index.append(best)
+        previous = sols[best]
+    return np.array(index)
+
+
+def path_cost(solutions, index, start, **kwargs):
+    total = 0.0
+    previous = start
+    for sols, idx in zip(solutions, index):
+        if idx < 0:
+            continue
+        if previous is not None:
+            total += move_cost(sols[idx] - previous, **kwargs)
+        previous = sols[idx]
+    return total
+
+
+def brute_min_travel(solutions, num_solutions, start, **kwargs):
+    solved = [n for n, count in enumerate(num_solutions) if count]
+    best = None
+    for combo in itertools.product(*[range(num_solutions[n])
+                                     for n in solved]):
+        index = np.full(len(solutions), -1)
+        index[solved] = combo
+        cost = path_cost(solutions, index, start, **kwargs)
+        if best is None or cost < best:
+            best = cost
+    return best
+
+
+def dp_min_travel(solutions, num_solutions, start, **kwargs):
+    solved = [n for n, count in enumerate(num_solutions) if count]
+    previous = None
+    for n in solved:
+        sols = solutions[n, :num_solutions[n]]
+        if previous is None:
+            if start is None:
+                cost = [0.0] * len(sols)
+            else:
+                cost = [move_cost(sol - start, **kwargs) for sol in sols]
+        else:
+            cost = [min(c + move_cost(sol - prev, **kwargs)
+                        for c, prev in zip(cost, previous))
+                    for sol in sols]
+        previous = sols
+    return min(cost)
+
+
+class SelectionTest(unittest.TestCase):
+    def setUp(self):
+        self.rs = np.random.RandomState(1)
+
+    def test_brute_force(self):
+        rs = self.rs
+        for trial in range(200):
+            num, width = rs.randint(1, 7), rs.randint(1, 4)
+            solutions, num_solutions = random_solutions(rs, num, width)
+            start = None if trial % 2 else rs.randn(3)
+            kwargs = {}
+            if trial % 3 == 0:
+                kwargs = dict(weights=rs.rand(3), metric='max')
+
+            index = selection.select_nearest(solutions, num_solutions,
+                                             start=start, chunk_size=2,
+                                             **kwargs)
+            assert_array_equal(index, brute_nearest(
+                solutions, num_solutions, start, **kwargs))
+
+            if not num_solutions.any():
+                continue
+            index = selection.select_min_travel(solutions, num_solutions,
+                                                start=start, chunk_size=2,
+                                                **kwargs)
+            assert_array_equal(index < 0, num_solutions == 0)
+            self.assertAlmostEqual(
+                path_cost(solutions, index, start, **kwargs),
+                brute_min_travel(solutions, num_solutions, start, **kwargs))
+
+    def test_min_travel_wide(self):
+        # both the prefix scan and, with many solutions per point, the
+        # sequential pass
+        for width in (3, 12):
+            solutions, num_solutions = random_solutions(self.rs, 60, width)
+            solutions[0] = self.rs.randn(width, 3)
+            num_solutions[0] = width
+            start = self.rs.randn(3)
+            index = selection.select_min_travel(solutions, num_solutions,
+                                                start=start, chunk_size=16)
+            self.assertAlmostEqual(
+                path_cost(solutions, index, start),
+                dp_min_travel(solutions, num_solutions, start))
+
+    def test_chunk_size(self):
+        solutions, num_solutions = random_solutions(self.rs, 500, 4)
+        for fcn in (selection.select_nearest, selection.select_min_travel):
+            expected = fcn(solutions, num_solutions)
+            for chunk_size in (1, 7, 1000):
+                assert_array_equal(fcn(solutions, num_solutions,
+                                       chunk_size=chunk_size), expected)
+
+    def test_min_travel_avoids_jumps(self):
+        # two branches, one of which has a single excursion
+        t = np.linspace(0, 1, 20)
+        upper = np.column_stack((t, t + 10))
+        lower = np.column_stack((t, t))
+        lower[10] = 50
+        solutions = np.stack((lower, upper), axis=1)
+        num_solutions = np.full(len(t), 2)
+        index = selection.select_min_travel(solutions, num_solutions)
+        assert_array_equal(index, np.ones(len(t)))
+
+        index = selection.select_nearest(solutions, num_solutions,
+                                         start=(0, 0))
+        self.assertEqual(index[0], 0)
+
+    def test_first_weighted(self):
+        solutions, num_solutions = random_solutions(self.rs, 50, 3)
+        index = selection.select_first(solutions, num_solutions)
+        assert_array_equal(index, np.where(num_solutions > 0, 0, -1))
+
+        reference = np.array([1.0, -1.0, 0.5])
+        index = selection.select_weighted(solutions, num_solutions,
+                                          reference=reference)
+        for n, count in enumerate(num_solutions):
+            if count:
+                cost = np.abs(solutions[n, :count] - reference).sum(axis=1)
+                self.assertEqual(index[n], np.argmin(cost))
+
+    def test_select_solutions(self):
+        solutions, num_solutions = random_solutions(self.rs, 50, 3)
+        num_solutions[0] = 0
+        real, index = selection.select_solutions(solutions, num_solutions,
+                                                 strategy='min_travel')
+        self.assertEqual(real.shape, (50, 3))
+        self.assertTrue(np.isnan(real[0]).all())
+        solved = index >= 0
+        assert_array_equal(real[solved],
+                           solutions[solved, index[solved]])
+
+        def last(solutions, num_solutions):
+            return np.asarray(num_solutions) - 1
+
+        real, index = selection.select_solutions(solutions, num_solutions,
+                                                 strategy=last)
+        assert_array_equal(index, num_solutions - 1)
+
+        self.assertRaises(ValueError, selection.select_solutions, solutions,
+                          num_solutions, strategy='unknown')
+        self.assertRaises(ValueError, selection.transition_costs, solutions,
+                          metric='unknown')
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
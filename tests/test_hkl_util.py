@@ -0,0 +1,44 @@
+import logging
+import types
+import unittest
+
+from ophyd.hkl import util
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModuleTest(unittest.TestCase):
+    def setUp(self):
+        util._load_gi()
+        util._gi_modules['Fake'] = types.SimpleNamespace(value=1)
+
+    def tearDown(self):
+        del util._gi_modules['Fake']
+
+    def test_available(self):
+        module = util._LazyModule('Fake')
+        self.assertTrue(module)
+        self.assertEqual(module.value, 1)
+        # stored on the proxy after the first lookup
+        self.assertEqual(module.__dict__['value'], 1)
+        self.assertFalse(hasattr(module, 'missing'))
+        self.assertIsNotNone(module)
+
+    def test_unavailable(self):
+        module = util._LazyModule('Missing')
+        self.assertFalse(module)
+        self.assertFalse(hasattr(module, 'value'))
+        self.assertIsNone(getattr(module, 'value', None))
+        self.assertRaises(AttributeError, getattr, module, 'value')
+
+    def test_lazy_units(self):
+        units = util.units
+        self.assertIs(units._units(), units._units())
+        self.assertEqual(len(units), 2 if util.hkl_module else 0)
+        self.assertIs(util.diffractometer_types._types(),
+                      util.diffractometer_types._types())
+
+
+from . import main
+is_main = (__name__ == '__main__')
+main(is_main)
@@ -6,6 +6,7 @@ import unittest
 from copy import copy
 
 import epics
+import numpy as np
 from ophyd import (PseudoPositioner, PseudoSingle, EpicsMotor)
 from ophyd import (Component as C)
 
@@ -88,6 +89,47 @@ class PseudoPosTests(unittest.TestCase):
         pseudo.real3.move(0, wait=True)
         # raise
 
+    def test_forward_inverse_many(self):
+        class MyPseudo(PseudoPositioner):
+            pseudo1 = C(PseudoSingle, '', limits=(-10, 10))
+            pseudo2 = C(PseudoSingle, '', limits=(-10, 10))
+            real1 = C(EpicsMotor, self.motor_recs[0])
+            real2 = C(EpicsMotor, self.motor_recs[1])
+
+            def forward(self, pseudo_pos):
+                return self.RealPosition(real1=-pseudo_pos.pseudo1,
+                                         real2=pseudo_pos.pseudo1 +
+                                         pseudo_pos.pseudo2)
+
+            def inverse(self, real_pos):
+                return self.PseudoPosition(pseudo1=-real_pos.real1,
+                                           pseudo2=real_pos.real1 +
+                                           real_pos.real2)
+
+        class MyVectorizedPseudo(MyPseudo):
+            def forward_many(self, pseudo):
+                pseudo = np.asarray(pseudo, dtype=float)
+                return np.column_stack((-pseudo[:, 0],
+                                        pseudo[:, 0] + pseudo[:, 1]))
+
+            def inverse_many(self, real):
+                real = np.asarray(real, dtype=float)
+                # deliberately inconsistent with inverse()
+                return np.column_stack((real[:, 0], real[:, 0] + real[:, 1]))
+
+        pseudo_pos = np.array([[0, 0], [1, 2], [-3.5, 4]])
+        real_pos = np.array([[0, 0], [-1, 3], [3.5, 0.5]])
+
+        pseudo = MyPseudo('', name='mypseudo')
+        np.testing.assert_allclose(pseudo.forward_many(pseudo_pos), real_pos)
+        np.testing.assert_allclose(pseudo.inverse_many(real_pos), pseudo_pos)
+        self.assertEqual(pseudo.forward_many(np.zeros((0, 2))).shape, (0, 2))
+        self.assertRaises(ValueError, pseudo.forward_many, [[1, 2, 3]])
+
+        vectorized = MyVectorizedPseudo('', name='myvectorized')
+        self.assertEqual(vectorized.check_many(pseudo=pseudo_pos), 0.0)
+        self.assertRaises(ValueError, vectorized.check_many, real=real_pos)
+
 #         logger.info('------- Sequential pseudo positioner')
 #         pos = PseudoPositioner('',
 #                                real=[real0, real1, real2],